@@ -1,13 +1,25 @@
 import os
-import anthropic
 import json
 import time
 import threading
 import sys
-from dotenv import load_dotenv
+import functools
+import uuid
+import contextvars
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 # Import tool modules
-from .tools import read_file, list_files, edit_file, run_shell_command
+from .tools import list_files, read_output, run_shell_command
+from .scheduler import READ_ONLY, MUTATING, INTERACTIVE, ConflictTracker, ToolScheduler, plan_batches
+from .history import HistoryManager
+from .shell_session import ShellSession
+from .tool_cache import ToolResultCache
+from .file_views import FileViewTracker, unified_diff
+from .spool import OutputSpool
+from .prefetch import Prefetcher
+from .tracing import Tracer
+from .resilience import ResilientCaller, is_api_error
+from . import prompt_cache, search_index, tool_registry
 
 class LoadingIndicator:
     """A simple loading indicator class that shows an animation while waiting."""
@@ -46,34 +58,60 @@ class LoadingIndicator:
 
 
 class Agent:
-    def __init__(self):
+    def __init__(self, client=None, workspace: str = None, tracer: Tracer = None, tool_workers: int = None,
+                 token_budget: int = None, cache_bytes: int = None):
+        from dotenv import load_dotenv # Imported here so that importing the agent stays cheap
         load_dotenv() # Load environment variables from .env
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in environment variables. Please set it in your .env file or system environment.")
-
-        self.client = anthropic.Anthropic(api_key=api_key)
+        # A client can be passed in to share one connection pool between several agents
+        self.client = client
+        if client is None:
+            api_key = os.getenv("ANTHROPIC_API_KEY")
+            if not api_key:
+                raise ValueError("ANTHROPIC_API_KEY not found in environment variables. Please set it in your .env file or system environment.")
+            # Importing the SDK takes most of a second: do it while the user types the first message
+            self._client_future = self._create_client_in_background(api_key)
         self.model_name = os.getenv("ANTHROPIC_DEFAULT_MODEL", "claude-3-sonnet-20240229") 
+        # Streaming mode prints text as it arrives and starts tools as soon as their block closes
+        self.streaming = os.getenv("AGENT_STREAMING", "").lower() in ("1", "true", "yes")
+        # Opt-in: mark the system prompt, tools and history prefix as cacheable
+        self.prompt_caching = os.getenv("AGENT_PROMPT_CACHING", "").lower() in ("1", "true", "yes")
+        self.usage_totals = prompt_cache.usage_summary(None)
+        # Spans for turns, model calls and tools (see AGENT_TRACE_FILE); a tracer can be shared between agents
+        self.tracer = tracer or Tracer()
+        self.owns_tracer = tracer is None # A shared tracer is summarized and closed by whoever shares it
+        self.session_id = uuid.uuid4().hex[:12]
+        self.turn_span = None # Parent of the spans of the turn in progress
+        self.retry_count = 0 # Model requests that had to be retried
+        # Retries transient API failures with backoff; optionally limits and hedges requests
+        self.resilience = ResilientCaller()
+        # Directory that relative tool paths and shell commands resolve against (None: the process's cwd)
+        self.workspace = os.path.abspath(workspace) if workspace else None
+        # Opt-in: one long-lived shell, so cd/export/venv activation carry over between commands
+        self.shell_session = ShellSession(cwd=self.workspace) if os.getenv("AGENT_PERSISTENT_SHELL", "").lower() in ("1", "true", "yes") else None
+        # Runs independent tool calls from the same assistant turn concurrently
+        self.scheduler = ToolScheduler(tool_workers)
+        # Reads and listings of unchanged paths, so repeats skip the disk and, if possible, the prompt
+        self.tool_cache = ToolResultCache(cache_bytes)
+        # Reads the files the model is likely to ask for next into that cache while it thinks
+        self.prefetcher = Prefetcher(self.tool_cache, self.workspace)
+        # The file contents the model has been sent, so re-reads can be answered with a diff
+        self.file_views = FileViewTracker()
+        # Tool output too large for the history is kept on disk, for the model to page through
+        self.spool = OutputSpool()
         
-        self.tools = {
-            read_file.get_tool_schema()["name"]: {
-                "schema": read_file.get_tool_schema(),
-                "execute": read_file.execute
-            },
-            list_files.get_tool_schema()["name"]: {
-                "schema": list_files.get_tool_schema(),
-                "execute": list_files.execute
-            },
-            edit_file.get_tool_schema()["name"]: {
-                "schema": edit_file.get_tool_schema(),
-                "execute": edit_file.execute
-            },
-            run_shell_command.get_tool_schema()["name"]: {
-                "schema": run_shell_command.get_tool_schema(),
-                "execute": run_shell_command.execute
-            }
-        }
+        # Tools by name, from the registry; each is a copy of its shared spec with this agent's bindings
+        self.tools = {}
+        # The tool list in the Messages API format, built once since every request sends the same one
+        self.tool_schemas = []
+        for spec in tool_registry.discover_tools():
+            self._add_tool(spec)
+        # Tools of installed packages are looked up in the background and added before the first request
+        self._plugin_tools = tool_registry.entry_point_tools_in_background()
         self.conversation_history = []
+        # Records the history on disk as it grows, so the session can be resumed (see use_journal)
+        self.journal = None
+        # Keeps the history under a token budget without splitting tool_use/tool_result pairs
+        self.history_manager = HistoryManager(token_budget)
         self.system_prompt = """
         You are a helpful AI assistant. You have access to a set of tools to interact with the user's file system and run commands.
         
@@ -86,20 +124,215 @@ class Agent:
         
         Always try to be helpful and complete the user's request. When a tool provides structured output (like JSON or a dictionary), present the key information from that output to the user in a readable way, rather than just showing the raw data structure, unless the user specifically asks for the raw data. If a command is declined by the user, simply state that and ask what to do next."""
 
-    def _execute_tool(self, tool_name: str, tool_input: dict):
+    @property
+    def client(self):
+        """The Messages API client, waiting for it if it is still being created in the background."""
+        if self._client is None and self._client_future is not None:
+            self._client = self._client_future.result()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+        self._client_future = None
+
+    def _create_client(self, api_key: str):
+        import anthropic
+        return anthropic.Anthropic(api_key=api_key, max_retries=0) # Retries go through self.resilience
+
+    def _create_client_in_background(self, api_key: str) -> Future:
+        future = Future()
+
+        def create():
+            try:
+                future.set_result(self._create_client(api_key))
+            except BaseException as e: # Raised to whoever first uses the client
+                future.set_exception(e)
+
+        threading.Thread(target=create, name="client-init", daemon=True).start()
+        return future
+
+    def _add_tool(self, spec: dict) -> bool:
+        """Make a registry tool available to this agent. Returns False if another tool already has its name."""
+        if spec["name"] in self.tools:
+            print(f"⚠️ Skipping tool '{spec['name']}' from {spec['module']}: a tool with that name is already loaded.", file=sys.stderr)
+            return False
+        tool = dict(spec)
+        if spec["module"] == run_shell_command.__name__:
+            tool["schema"] = self._shell_tool_schema(spec["schema"])
+            tool["api_schema"] = self._api_tool_schema(tool["schema"])
+            tool["execute"] = functools.partial(run_shell_command.execute, session=self.shell_session, cwd=self.workspace)
+        elif spec["module"] == read_output.__name__:
+            tool["execute"] = functools.partial(read_output.execute, spool=self.spool)
+        self.tools[tool["name"]] = tool
+        self.tool_schemas.append(tool["api_schema"])
+        return True
+
+    def _shell_tool_schema(self, schema: dict) -> dict:
+        schema = dict(schema)
+        if self.shell_session is not None:
+            schema["description"] += (" Commands run in one persistent shell session: the working directory, exported "
+                                      "variables and activated virtualenvs carry over to later commands.")
+        return schema
+
+    def _tool_kind(self, tool_name: str) -> str:
+        # Unknown tools only produce an error result, which is safe to produce concurrently
+        return self.tools.get(tool_name, {}).get("kind", READ_ONLY)
+
+    def _in_workspace(self, tool_name: str, tool_input: dict) -> dict:
+        """Resolve the call's path against the workspace, if the agent has one. Absolute paths are kept."""
+        if self.workspace is None or "path" not in self.tools[tool_name]["schema"]["parameters"].get("properties", {}):
+            return tool_input
+        return {**tool_input, "path": os.path.join(self.workspace, tool_input.get("path") or ".")}
+
+    def _invoke_tool(self, tool_name: str, tool_input: dict):
+        """Run a tool without any terminal output, as a traced span. Safe to call from worker threads for non-interactive tools."""
+        with self.tracer.span(f"tool:{tool_name}", parent=self.turn_span, tool=tool_name, kind=self._tool_kind(tool_name)) as span:
+            result = self._run_tool(tool_name, tool_input)
+            if self.tracer.enabled:
+                span.set(status=result.get("status") if isinstance(result, dict) else None,
+                         input_bytes=len(json.dumps(tool_input, default=str)),
+                         result_bytes=len(json.dumps(result, default=str)))
+            return result
+
+    def _run_tool(self, tool_name: str, tool_input: dict):
         if tool_name not in self.tools:
             return {"status": "error", "error": f"Tool '{tool_name}' not found."}
-        
-        tool_executor = self.tools[tool_name]["execute"]
-        print("\n" + "─" * 80)
-        print(f"🤖 EXECUTING TOOL: {tool_name}")
-        
+        # Rejected before anything runs, with the precise problem, so the model can fix the call
+        error = self.tools[tool_name]["validate"](tool_input)
+        if error:
+            return {"status": "error", "error": f"Invalid input for {tool_name}: {error}"}
+        tool_input = self._in_workspace(tool_name, tool_input)
+        fingerprint = self.tool_cache.fingerprint(tool_name, tool_input)
+        cached = self.tool_cache.get(tool_name, tool_input, fingerprint)
+        if cached is not None:
+            if cached["tool_use_id"] and self._result_in_history(cached["tool_use_id"], cached["content"]):
+                return self._unchanged_result(cached["tool_use_id"])
+            return self._as_file_view(tool_name, tool_input, cached["result"])
+
+        result = self._call_tool(self.tools[tool_name], tool_input)
+        self.tool_cache.put(tool_name, tool_input, fingerprint, result)
+        # Listings, the search index and the result cache hold file state; drop what this call may have changed
+        kind = self._tool_kind(tool_name)
+        if kind == MUTATING:
+            list_files.invalidate(os.path.dirname(tool_input.get("path") or ""))
+            search_index.invalidate()
+            self.tool_cache.invalidate(tool_input.get("path") or ".")
+        elif kind == INTERACTIVE:
+            list_files.invalidate()
+            search_index.invalidate()
+            self.tool_cache.invalidate()
+        return self._as_file_view(tool_name, tool_input, result)
+
+    @staticmethod
+    def _call_tool(tool: dict, tool_input: dict):
+        """Run a tool, giving up on it after the timeout it declares, if any."""
+        if not tool["timeout"]:
+            return tool["execute"](**tool_input)
+        future = Future()
+
+        def call():
+            try:
+                future.set_result(tool["execute"](**tool_input))
+            except BaseException as e:
+                future.set_exception(e)
+
+        # A thread can't be stopped from outside: a tool that overruns finishes in the background, unheard
+        threading.Thread(target=contextvars.copy_context().run, args=(call,), name=f"tool:{tool['name']}", daemon=True).start()
+        try:
+            return future.result(timeout=tool["timeout"])
+        except FutureTimeoutError:
+            return {"status": "error", "error": f"Tool '{tool['name']}' did not finish within {tool['timeout']} seconds."}
+
+    def _unchanged_result(self, tool_use_id: str) -> dict:
+        return {
+            "status": "success",
+            "unchanged_since": tool_use_id,
+            "note": f"Nothing has changed since tool_use {tool_use_id}; its result above is still current."
+        }
+
+    @staticmethod
+    def _is_full_read(tool_name: str, result) -> bool:
+        # Whole-file reads that fit in one result carry nothing but the content
+        return tool_name == "read_file" and isinstance(result, dict) and set(result) == {"status", "content"}
+
+    def _as_file_view(self, tool_name: str, tool_input: dict, result):
+        """
+        If the model still has an earlier full read of this file in its history, answer a full re-read
+        with a diff against that version when the diff is smaller than the content.
+        """
+        if not self._is_full_read(tool_name, result):
+            return result
+        view = self.file_views.view(tool_input["path"])
+        if view is None or not self._result_in_history(view["tool_use_id"], view["sent"]):
+            return result
+        if view["content"] == result["content"]:
+            return self._unchanged_result(view["tool_use_id"])
+        diff = unified_diff(view["content"], result["content"], f"{tool_input['path']} (as of tool_use {view['tool_use_id']})", tool_input["path"])
+        if not diff or len(diff) >= len(result["content"]):
+            return result
+        return {
+            "status": "success",
+            "diff_since": view["tool_use_id"],
+            "diff": diff,
+            "note": f"Unified diff of the file against its content in the result of tool_use {view['tool_use_id']}."
+        }
+
+    def _result_in_history(self, tool_use_id: str, content: str) -> bool:
+        """Whether the history still holds this tool_result with exactly this content (not elided or dropped)."""
+        for message in reversed(self.conversation_history):
+            if message.get("role") != "user" or isinstance(message.get("content"), str):
+                continue
+            for block in message["content"]:
+                if isinstance(block, dict) and block.get("tool_use_id") == tool_use_id:
+                    return block.get("content") == content
+        return False
+
+    def _print_tool_call(self, tool_name: str, tool_input: dict):
         # Only display the file path for relevant operations
         if 'path' in tool_input:
             print(f"📄 File: {tool_input['path']}")
         # For shell commands, show the command being run
         elif 'command' in tool_input:
             print(f"🔄 Command: {tool_input['command']}")
+
+    def _print_tool_result(self, tool_name: str, result):
+        print("\n" + "─" * 80)
+        print(f"⚙️ TOOL RESULT: {tool_name}")
+        
+        # Format the result for better readability
+        if isinstance(result, dict):
+            if "status" in result:
+                status_emoji = "✅" if result["status"] == "success" else "❌"
+                print(f"{status_emoji} Status: {result['status']}")
+            
+            for key, value in result.items():
+                if key != "status":
+                    # Skip printing file content for read_file tool
+                    if key == "content" and tool_name == "read_file":
+                        print(f"• {key}: [content available but not displayed]")
+                    # Shell output has already been streamed live
+                    elif key in ["stdout", "stderr"] and tool_name == "run_shell_command":
+                        continue
+                    elif key in ["stdout", "stderr", "diff"] and value:
+                        print(f"\n📄 {key.upper()}:")
+                        print("```")
+                        print(value.rstrip())
+                        print("```")
+                    elif value:
+                        print(f"• {key}: {value}")
+        else:
+            print(result)
+            
+        print("─" * 80)
+
+    def _execute_tool(self, tool_name: str, tool_input: dict):
+        if tool_name not in self.tools:
+            return {"status": "error", "error": f"Tool '{tool_name}' not found."}
+        
+        print("\n" + "─" * 80)
+        print(f"🤖 EXECUTING TOOL: {tool_name}")
+        self._print_tool_call(tool_name, tool_input)
         print("─" * 80)
         
         # Start loading indicator for tool execution
@@ -113,53 +346,452 @@ class Agent:
                 original_write = sys.stdout.write
                 
                 def write_monitor(text):
-                    # When the confirmation prompt appears, pause the loading indicator
+                    # When the confirmation prompt appears, pause the loading indicator.
+                    # It stays off afterwards: the command's output is streamed live to the terminal.
                     if "🔍 CONFIRMATION REQUIRED" in text:
                         loading.stop()
-                    # When command execution starts after confirmation, restart the indicator
-                    elif "⚙️ EXECUTING COMMAND..." in text:
-                        loading.start()
                     return original_write(text)
                 
                 # Replace stdout.write with our monitored version
                 sys.stdout.write = write_monitor
                 try:
-                    result = tool_executor(**tool_input)
+                    result = self._invoke_tool(tool_name, tool_input)
                 finally:
                     # Restore the original stdout.write
                     sys.stdout.write = original_write
             else:
                 # For all other tools, normal execution
-                result = tool_executor(**tool_input)
+                result = self._invoke_tool(tool_name, tool_input)
         finally:
             loading.stop() # Always stop the loading indicator
-            print("\n" + "─" * 80)
-            print(f"⚙️ TOOL RESULT: {tool_name}")
-            
-            # Format the result for better readability
-            if isinstance(result, dict):
-                if "status" in result:
-                    status_emoji = "✅" if result["status"] == "success" else "❌"
-                    print(f"{status_emoji} Status: {result['status']}")
-                
-                for key, value in result.items():
-                    if key != "status":
-                        # Skip printing file content for read_file tool
-                        if key == "content" and tool_name == "read_file":
-                            print(f"• {key}: [content available but not displayed]")
-                        elif key in ["stdout", "stderr"] and value:
-                            print(f"\n📄 {key.upper()}:")
-                            print("```")
-                            print(value.rstrip())
-                            print("```")
-                        elif value:
-                            print(f"• {key}: {value}")
+            self._print_tool_result(tool_name, result)
+            return result
+
+    def _execute_tool_batch(self, tool_calls: list, early_results: dict) -> list:
+        """
+        Run a batch of mutually independent tool calls concurrently.
+        Calls already started while streaming are awaited instead of being run again.
+        Results are printed and returned in the original call order.
+        """
+        print("\n" + "─" * 80)
+        print(f"🤖 EXECUTING {len(tool_calls)} TOOLS IN PARALLEL")
+        for tool_call in tool_calls:
+            print(f"• {tool_call['name']}")
+            self._print_tool_call(tool_call['name'], tool_call['input'])
+        print("─" * 80)
+
+        loading = LoadingIndicator(f"Executing {len(tool_calls)} tools")
+        loading.start()
+        try:
+            results = [future.result() for future in self._submit_batch(tool_calls, early_results)]
+        finally:
+            loading.stop()
+
+        for tool_call, result in zip(tool_calls, results):
+            self._print_tool_result(tool_call['name'], result)
+        return results
+
+    def _submit_batch(self, tool_calls: list, early_results: dict) -> list:
+        """
+        Submit a batch of independent calls to the scheduler, the costliest first so the long ones
+        don't start last. Calls already started while streaming are reused. Returns futures in call order.
+        """
+        futures = {tool_call['id']: early_results[tool_call['id']] for tool_call in tool_calls if tool_call['id'] in early_results}
+        for tool_call in sorted(tool_calls, key=lambda tool_call: -self.tools.get(tool_call['name'], {}).get("cost", 0)):
+            if tool_call['id'] not in futures:
+                futures[tool_call['id']] = self.scheduler.submit(self._invoke_tool, tool_call)
+        return [futures[tool_call['id']] for tool_call in tool_calls]
+
+    def _run_tool_calls(self, tool_calls: list, early_results: dict) -> list:
+        """
+        Execute the tool calls of one assistant turn and return their results in call order.
+        Independent calls run concurrently; conflicting and interactive calls stay serialized.
+        """
+        # Calls started while streaming never conflict with any call before them, so
+        # awaiting them inside their batch keeps every dependent pair in order.
+        results_by_id = {}
+        for batch in plan_batches(tool_calls, self._tool_kind):
+            if len(batch) == 1:
+                tool_call = batch[0]
+                if tool_call['id'] in early_results:
+                    result = early_results[tool_call['id']].result()
+                    self._print_tool_result(tool_call['name'], result)
+                else:
+                    result = self._execute_tool(tool_call['name'], tool_call['input'])
+                results_by_id[tool_call['id']] = result
             else:
-                print(result)
+                for tool_call, result in zip(batch, self._execute_tool_batch(batch, early_results)):
+                    results_by_id[tool_call['id']] = result
+        return [results_by_id[tool_call['id']] for tool_call in tool_calls]
+
+    def _request_params(self, messages_to_send, tool_schemas) -> dict:
+        """Keyword arguments for a Messages API request, with cache breakpoints when prompt caching is on."""
+        system = self.system_prompt
+        if self.prompt_caching:
+            system = prompt_cache.cached_system(system)
+            tool_schemas = prompt_cache.cached_tools(tool_schemas)
+            messages_to_send = prompt_cache.cached_messages(messages_to_send)
+        return {
+            "model": self.model_name,
+            "max_tokens": 2048,
+            "system": system,
+            "messages": messages_to_send,
+            "tools": tool_schemas, # Always provide tools
+            "tool_choice": {"type": "auto"}  # Always allow auto tool choice
+        }
+
+    def _record_usage(self, api_response_obj):
+        """Add a response's token usage to the session totals and, with prompt caching on, report it."""
+        usage = prompt_cache.usage_summary(getattr(api_response_obj, "usage", None))
+        for key, value in usage.items():
+            self.usage_totals[key] += value
+        if self.prompt_caching:
+            print(f"\n📊 Tokens: {usage['input_tokens']} in, {usage['output_tokens']} out, "
+                  f"{usage['cache_read_input_tokens']} cache read, {usage['cache_creation_input_tokens']} cache write")
+        return usage
+
+    def _on_retry(self, attempt: int, delay: float, error: Exception):
+        self.retry_count += 1
+        print(f"\n⏳ Model request failed ({type(error).__name__}: {error}); "
+              f"retry {attempt}/{self.resilience.retries} in {delay:.1f}s")
+
+    def _create_response(self, messages_to_send, tool_schemas):
+        """Request a complete response from the model, blocking until it has fully arrived."""
+        params = self._request_params(messages_to_send, tool_schemas)
+        loading = LoadingIndicator("Model thinking")
+        loading.start()
+        try:
+            return self.resilience.call(lambda: self.client.messages.create(**params), on_retry=self._on_retry)
+        finally:
+            # Stop loading indicator regardless of success or failure
+            loading.stop()
+
+    def _new_stream_state(self) -> dict:
+        return {
+            "early_results": {},
+            "tracker": ConflictTracker(),
+            "blocks": {}, # Content block index -> {"type", "id", "name", "json"} while the block is open
+            "printing_text": False,
+            "content_started": False # After this, a failed stream can't be retried: output was shown
+        }
+
+    def _handle_stream_event(self, event, state: dict, loading):
+        """
+        Apply one stream event: print text deltas, collect partial tool input JSON, and hand each
+        completed read-only tool_use block to the scheduler unless it conflicts with an earlier call.
+        """
+        if event.type == "content_block_start":
+            loading.stop() # First content has arrived
+            state["content_started"] = True
+            block = event.content_block
+            state["blocks"][event.index] = {
+                "type": block.type,
+                "id": getattr(block, "id", None),
+                "name": getattr(block, "name", None),
+                "json": []
+            }
+        elif event.type == "content_block_delta":
+            if event.delta.type == "text_delta":
+                if not state["printing_text"]:
+                    print("\n" + "═" * 80)
+                    print("🤖 ASSISTANT RESPONSE:")
+                    print("═" * 80)
+                    state["printing_text"] = True
+                sys.stdout.write(event.delta.text)
+                sys.stdout.flush()
+            elif event.delta.type == "input_json_delta":
+                state["blocks"][event.index]["json"].append(event.delta.partial_json)
+        elif event.type == "content_block_stop":
+            block = state["blocks"].pop(event.index, None)
+            if not block or block["type"] != "tool_use":
+                return
+            partial_json = "".join(block["json"])
+            tool_call = {
+                "id": block["id"],
+                "name": block["name"],
+                "input": json.loads(partial_json) if partial_json else {}
+            }
+            kind = self._tool_kind(tool_call["name"])
+            # Anything that changes state waits for the complete response: the stream may still fail
+            if kind == READ_ONLY and not state["tracker"].conflicts(kind, tool_call["input"]):
+                state["early_results"][tool_call["id"]] = self.scheduler.submit(self._invoke_tool, tool_call)
+            # Later calls must also respect the ones left for after the stream
+            state["tracker"].add(kind, tool_call["input"])
+
+    def _stream_response(self, messages_to_send, tool_schemas):
+        """
+        Stream a response from the model.
+        Text deltas are printed as they arrive. Each tool_use block is assembled from its
+        partial JSON deltas; read-only calls are handed to the scheduler as soon as the block
+        closes, as long as they don't conflict with any earlier call in the response (see
+        ConflictTracker). Mutating and interactive calls run only once the whole response is in.
+        A stream that fails before any content arrived is retried like any other request.
+        Returns the final message and a dict of tool_use_id -> Future for dispatched tools.
+        """
+        params = self._request_params(messages_to_send, tool_schemas)
+        state = self._new_stream_state()
+        loading = LoadingIndicator("Model thinking")
+
+        def attempt():
+            state.update(self._new_stream_state())
+            loading.start()
+            with self.client.messages.stream(**params) as stream:
+                for event in stream:
+                    self._handle_stream_event(event, state, loading)
+                return stream.get_final_message()
+
+        try:
+            final_message = self.resilience.call(attempt, on_retry=self._on_retry, hedge=False,
+                                                 retryable=lambda error: not state["content_started"])
+        finally:
+            loading.stop()
+
+        if state["printing_text"]:
+            print("\n" + "═" * 80, end="")
+        return final_message, state["early_results"]
+
+    @staticmethod
+    def _api_tool_schema(schema: dict) -> dict:
+        """A tool's schema in the Messages API format, which calls the parameters input_schema."""
+        schema = dict(schema)
+        if "parameters" in schema:
+            schema["input_schema"] = schema.pop("parameters")
+        return schema
+
+    def _tool_schemas(self) -> list:
+        """Tool schemas in the Messages API format. The first call adds the tools of installed packages."""
+        if self._plugin_tools is not None:
+            plugin_tools, self._plugin_tools = self._plugin_tools, None
+            for spec in plugin_tools.result():
+                self._add_tool(spec)
+        return self.tool_schemas
+
+    def _messages_to_send(self) -> list:
+        """Compact the history and return the messages for the next request."""
+        self.conversation_history = self.history_manager.compact(self.conversation_history)
+        return [msg for msg in self.conversation_history if msg.get('content')]
+
+    def _handle_response(self, api_response_obj) -> list:
+        """
+        Add a model response to the history and print its text (unless it was streamed).
+        Returns the tool calls it asks for; an empty list means the assistant's turn is over.
+        """
+        assistant_turn_content_blocks = [] # Content blocks for this turn of assistant (text and tool_use)
+        text_response_parts = []
+        tool_calls = []
+
+        if api_response_obj.content:
+            for block in api_response_obj.content:
+                # Store raw block for history, using model_dump() if it's a Pydantic model
+                if hasattr(block, 'model_dump'):
+                    assistant_turn_content_blocks.append(block.model_dump())
+                else: # Fallback if it's not a Pydantic model (should not happen with current SDK)
+                    assistant_turn_content_blocks.append(block) 
                 
-            print("─" * 80)
+                if block.type == 'text':
+                    text_response_parts.append(block.text)
+                elif block.type == 'tool_use':
+                    tool_calls.append({
+                        "id": block.id,
+                        "name": block.name,
+                        "input": block.input
+                    })
+        
+        if text_response_parts and not self.streaming: # Streamed text has already been printed
+            full_text_response = "".join(text_response_parts)
+            print("\n" + "═" * 80)
+            print("🤖 ASSISTANT RESPONSE:")
+            print("═" * 80)
+            print(f"{full_text_response}")
+            print("═" * 80, end="")
+        
+        if not assistant_turn_content_blocks:
+            # Handle cases where the model might return no content blocks
+            # (e.g., if only stop_reason is 'max_tokens' or an error state not caught by APIError)
+            if api_response_obj.stop_reason not in ['tool_use', 'end_turn', 'stop_sequence']:
+                 print(f"\n🤖 Assistant response ended unexpectedly or with no content. Reason: {api_response_obj.stop_reason}")
+            print() # Ensure newline if nothing else printed this iteration
+            return []
+
+        self.conversation_history.append({
+            "role": "assistant", 
+            "content": assistant_turn_content_blocks
+        })
+        if not tool_calls:
+            print() # Ensure newline if text was printed without one, and no tools follow.
+        return tool_calls
+
+    def _append_tool_results(self, tool_calls: list, tool_results: list):
+        tool_result_blocks = []
+        for tool_call, tool_result_data in zip(tool_calls, tool_results):
+            # Pages of spooled output and file reads are already bounded; anything else too large goes to the spool
+            sent = tool_result_data if tool_call['name'] in ("read_output", "read_file") else self._spool(tool_result_data)
+            content = json.dumps(sent)
+            tool_result_blocks.append({
+                "type": "tool_result",
+                "tool_use_id": tool_call['id'],
+                "content": content
+            })
+            if tool_call['name'] in self.tools:
+                tool_input = self._in_workspace(tool_call['name'], tool_call['input'])
+                self.prefetcher.observe_result(tool_call['name'], tool_input, tool_result_data)
+                if sent is not tool_result_data:
+                    continue # The model saw only a preview: a later call must not point back at it
+                # Later identical reads can point back at this result while it stays in the history
+                self.tool_cache.remember(tool_call['name'], tool_input, tool_call['id'], tool_result_data, content)
+                if self._is_full_read(tool_call['name'], tool_result_data):
+                    self.file_views.record(tool_input["path"], tool_result_data["content"], tool_call['id'], content)
+        self.conversation_history.append({
+            "role": "user",
+            "content": tool_result_blocks
+        })
+
+    def _spool(self, result):
+        try:
+            return self.spool.spool(result)
+        except OSError as e:
+            print(f"⚠️ Could not spool a large tool result ({e}); it is kept in full.", file=sys.stderr)
             return result
 
+    def _trace_model_call(self, span, messages_to_send: list, api_response_obj, usage: dict, retries: int):
+        span.set(stop_reason=getattr(api_response_obj, "stop_reason", None), messages=len(messages_to_send), retries=retries, **usage)
+        if self.tracer.enabled: # Sizes cost a serialization of the whole request
+            span.set(
+                bytes_sent=len(json.dumps(messages_to_send, default=str)),
+                bytes_received=len(json.dumps([block.model_dump() if hasattr(block, 'model_dump') else block
+                                               for block in api_response_obj.content or []], default=str)),
+                history_tokens=self.history_manager.total_tokens(messages_to_send)
+            )
+
+    def _add_user_message(self, user_input: str):
+        """
+        Append the user's message to the history. If the last turn stopped before the model answered
+        (e.g. the API kept failing), its tool results are still at the end of the history: the
+        message joins them, so the completed tool work is kept and the model picks up from there.
+        """
+        self.prefetcher.observe_message(user_input)
+        last = self.conversation_history[-1] if self.conversation_history else None
+        if last is None or last["role"] != "user":
+            self.conversation_history.append({"role": "user", "content": user_input})
+            return
+        content = last["content"]
+        blocks = [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+        self.conversation_history[-1] = {"role": "user", "content": blocks + [{"type": "text", "text": user_input}]}
+
+    def _note_kept_tool_work(self):
+        """After a failed model call, say that the turn's finished tool calls weren't thrown away."""
+        last = self.conversation_history[-1] if self.conversation_history else None
+        if last and last["role"] == "user" and isinstance(last["content"], list) and \
+                any(block.get("type") == "tool_result" for block in last["content"]):
+            print("💾 The results of this turn's tool calls are kept. Send another message (e.g. 'continue') to resume.")
+
+    def _drop_unanswered_tool_use(self):
+        """
+        After an unexpected error, drop a final assistant message whose tool calls got no results:
+        the API rejects a tool_use without its tool_result, so neither the next request nor a
+        resumed session could use the history as it is.
+        """
+        last = self.conversation_history[-1] if self.conversation_history else None
+        if last and last["role"] == "assistant" and isinstance(last["content"], list) and \
+                any(block.get("type") == "tool_use" for block in last["content"]):
+            self.conversation_history.pop()
+
+    def final_reply(self) -> str:
+        """Text of the last assistant message."""
+        for message in reversed(self.conversation_history):
+            if message["role"] == "assistant" and isinstance(message["content"], list):
+                return "".join(block.get("text", "") for block in message["content"] if block.get("type") == "text")
+        return ""
+
+    def use_journal(self, journal):
+        """
+        Record this session in journal from now on. A journal opened to resume a saved session
+        brings its history along, which replaces this agent's. Call it before the first turn.
+        """
+        self.journal = journal
+        self.session_id = journal.session_id
+        self.conversation_history = list(journal.history)
+        # The history refers to spooled output by handle, so it is kept with the journal
+        self.spool.keep_in(os.path.join(os.path.dirname(os.path.abspath(journal.path)), "spool", journal.session_id))
+
+    def _save_history(self, history: list = None):
+        """Bring the journal up to date with history (by default the current one). Only called where it is valid to resume from."""
+        if self.journal is None:
+            return
+        try:
+            self.journal.sync(self.conversation_history if history is None else history)
+        except OSError as e:
+            print(f"⚠️ Could not save the session ({e}); it will not be resumable.", file=sys.stderr)
+            self.journal = None
+
+    def end_session(self):
+        """Release the session's resources and, with tracing on and a tracer of its own, print the trace summary."""
+        if self.shell_session is not None:
+            self.shell_session.close()
+        self.prefetcher.close()
+        self.spool.close()
+        self.scheduler.pool.shutdown(wait=False)
+        if self.journal is not None:
+            self.journal.close()
+            if self.journal.records_written:
+                print(f"💾 Session saved. Continue it with: python run.py --resume {self.session_id}")
+        if not self.owns_tracer:
+            return
+        if self.tracer.enabled:
+            print("\n" + self.tracer.format_summary())
+        self.tracer.close()
+
+    def _print_error(self, title: str, error: Exception):
+        print("\n" + "─" * 80)
+        print(f"❌ {title}")
+        print(f"🔴 {error}")
+        print("─" * 80)
+
+    def run_turn(self, user_input: str):
+        """Handle one user message: call the model and run the tools it asks for until it is done."""
+        with self.tracer.span("turn", session=self.session_id) as self.turn_span:
+            self._add_user_message(user_input)
+            self._save_history()
+            tool_schemas = self._tool_schemas() # They don't change during a turn
+
+            try:
+                # Handle a sequence of assistant responses and tool uses for a single user query
+                while True:
+                    messages_to_send = self._messages_to_send()
+                    if not messages_to_send:
+                        print("\n🤖 Error: No messages to send to API. This should not happen after user input.")
+                        break
+
+                    self.prefetcher.start() # Runs while the request is in flight
+                    retries_before = self.retry_count
+                    with self.tracer.span("model_call", parent=self.turn_span, model=self.model_name, streaming=self.streaming) as span:
+                        if self.streaming:
+                            api_response_obj, early_results = self._stream_response(messages_to_send, tool_schemas)
+                        else:
+                            api_response_obj = self._create_response(messages_to_send, tool_schemas)
+                            early_results = {}
+                        usage = self._record_usage(api_response_obj)
+                        self._trace_model_call(span, messages_to_send, api_response_obj, usage, self.retry_count - retries_before)
+
+                    tool_calls = self._handle_response(api_response_obj)
+                    if not tool_calls:
+                        break # The assistant's turn for this user input is over
+
+                    # The history now ends with the tool results; the next iteration sends them to the model
+                    self._append_tool_results(tool_calls, self._run_tool_calls(tool_calls, early_results))
+                    self._save_history() # Each tool_use has its tool_result, so this is a point to resume from
+
+            except Exception as e:
+                if is_api_error(e):
+                    self._print_error("API ERROR", e)
+                    self._note_kept_tool_work()
+                else:
+                    self._print_error("UNEXPECTED ERROR", e)
+                    self._drop_unanswered_tool_use()
+            
+            self.conversation_history = self.history_manager.compact(self.conversation_history)
+            self._save_history()
+
     def run(self):
         print("\n" + "═" * 80)
         print("🤖 AGENT INITIALIZED")
@@ -171,133 +803,10 @@ class Agent:
             user_input = input("👤 YOUR INPUT > ")
             if user_input.lower() == "exit":
                 print("🤖 Exiting agent.")
+                self.end_session()
                 break
             
             if not user_input.strip(): # Skip empty input
                 continue
 
-            self.conversation_history.append({"role": "user", "content": user_input})
-
-            # Pre-calculate tool schemas once per user turn, as they don't change
-            current_tool_schemas = []
-            for _tool_name, tool_data in self.tools.items():
-                schema_copy = tool_data["schema"].copy() # Make a copy to modify
-                if "parameters" in schema_copy:
-                    schema_copy["input_schema"] = schema_copy.pop("parameters")
-                current_tool_schemas.append(schema_copy)
-
-            try:
-                # Inner loop to handle a sequence of assistant responses and tool uses for a single user query
-                while True:
-                    messages_to_send = [msg for msg in self.conversation_history if msg.get('content')]
-                    if not messages_to_send:
-                        print("\n🤖 Error: No messages to send to API. This should not happen after user input.")
-                        break # Break inner loop, go to next user input
-
-                    # Start loading indicator
-                    loading = LoadingIndicator("Model thinking")
-                    loading.start()
-                    
-                    try:
-                        api_response_obj = self.client.messages.create(
-                            model=self.model_name,
-                            max_tokens=2048,
-                            system=self.system_prompt,
-                            messages=messages_to_send,
-                            tools=current_tool_schemas, # Always provide tools
-                            tool_choice={"type": "auto"}  # Always allow auto tool choice
-                        )
-                    finally:
-                        # Stop loading indicator regardless of success or failure
-                        loading.stop()
-
-                    assistant_turn_content_blocks = [] # Content blocks for this turn of assistant (text and tool_use)
-                    text_response_parts = []
-                    tool_calls_to_execute_this_turn = []
-
-                    if api_response_obj.content:
-                        for block in api_response_obj.content:
-                            # Store raw block for history, using model_dump() if it's a Pydantic model
-                            if hasattr(block, 'model_dump'):
-                                assistant_turn_content_blocks.append(block.model_dump())
-                            else: # Fallback if it's not a Pydantic model (should not happen with current SDK)
-                                assistant_turn_content_blocks.append(block) 
-                            
-                            if block.type == 'text':
-                                text_response_parts.append(block.text)
-                            elif block.type == 'tool_use':
-                                tool_calls_to_execute_this_turn.append({
-                                    "id": block.id,
-                                    "name": block.name,
-                                    "input": block.input
-                                })
-                    
-                    if text_response_parts:
-                        full_text_response = "".join(text_response_parts)
-                        print("\n" + "═" * 80)
-                        print("🤖 ASSISTANT RESPONSE:")
-                        print("═" * 80)
-                        print(f"{full_text_response}")
-                        print("═" * 80, end="")
-                    
-                    if assistant_turn_content_blocks:
-                        self.conversation_history.append({
-                            "role": "assistant", 
-                            "content": assistant_turn_content_blocks
-                        })
-                    else:
-                        # Handle cases where the model might return no content blocks
-                        # (e.g., if only stop_reason is 'max_tokens' or an error state not caught by APIError)
-                        if api_response_obj.stop_reason not in ['tool_use', 'end_turn', 'stop_sequence']:
-                             print(f"\n🤖 Assistant response ended unexpectedly or with no content. Reason: {api_response_obj.stop_reason}")
-                        print() # Ensure newline if nothing else printed this iteration
-                        break # Break inner loop, as there's no actionable content
-
-                    if not tool_calls_to_execute_this_turn:
-                        print() # Ensure newline if text was printed without one, and no tools follow.
-                        break # No tools to call, assistant's turn for this user input is over. Break inner loop.
-
-                    # We have tools to execute for this turn
-                    tool_results_for_next_user_message = []
-                    for tool_call in tool_calls_to_execute_this_turn:
-                        tool_name = tool_call['name']
-                        tool_input = tool_call['input']
-                        tool_use_id = tool_call['id']
-                        
-                        tool_result_data = self._execute_tool(tool_name, tool_input)
-                        
-                        tool_results_for_next_user_message.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_id,
-                            "content": json.dumps(tool_result_data)
-                        })
-
-                    if tool_results_for_next_user_message:
-                        self.conversation_history.append({
-                            "role": "user", 
-                            "content": tool_results_for_next_user_message
-                        })
-                    else:
-                        # This case should ideally not be reached if tool_calls_to_execute_this_turn was non-empty
-                        print("\n🤖 Error: Tools were scheduled but no results were generated.")
-                        break # Break inner loop to avoid potential infinite loop
-
-                    # Implicitly continue inner loop: the history now contains tool results,
-                    # and the next iteration will make an API call with this updated history.
-
-            except anthropic.APIError as e:
-                print("\n" + "─" * 80)
-                print("❌ API ERROR")
-                print(f"🔴 {e}")
-                print("─" * 80)
-            except Exception as e:
-                print("\n" + "─" * 80)
-                print("❌ UNEXPECTED ERROR")
-                print(f"🔴 {e}")
-                print("─" * 80)
-            
-            if len(self.conversation_history) > 30: # Keep last 30 message objects (user or assistant)
-                # This simple slicing might be too aggressive if one turn has many blocks.
-                # A more nuanced pruning might count "turns" (user + assistant sequence).
-                # For now, this is a basic safeguard.
-                self.conversation_history = self.conversation_history[-30:]
\ No newline at end of file
+            self.run_turn(user_input)
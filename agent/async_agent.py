@@ -0,0 +1,361 @@
+import sys
+import signal
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, CancelledError as FutureCancelledError
+
+from .agent import Agent
+from .tracing import Tracer
+from .resilience import is_api_error
+from .scheduler import INTERACTIVE, plan_batches
+from .tools import run_shell_command
+
+
+class AsyncLoadingIndicator:
+    """The loading animation as an asyncio task, so it needs no thread and never blocks the event loop."""
+    spinner_chars = ["⣾", "⣽", "⣻", "⢿", "⡿", "⣟", "⣯", "⣷"]
+
+    def __init__(self, message="Thinking"):
+        self.message = message
+        self.task = None
+
+    def start(self):
+        # Only animate on a terminal; redirected output (logs, batch runs) would fill with frames
+        if self.task is None and sys.stdout.isatty():
+            self.task = asyncio.ensure_future(self._spin())
+
+    def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
+        # Clear the line
+        sys.stdout.write("\r" + " " * (len(self.message) + 10) + "\r")
+        sys.stdout.flush()
+
+    async def _spin(self):
+        idx = 0
+        while True:
+            sys.stdout.write(f"\r{self.spinner_chars[idx]} {self.message}... ")
+            sys.stdout.flush()
+            await asyncio.sleep(0.1)
+            idx = (idx + 1) % len(self.spinner_chars)
+
+
+class StdinReader:
+    """
+    Lines of the terminal, read by one daemon thread and handed to coroutines in the order they ask.
+    A coroutine waiting for a line can be cancelled: the next line then goes to the next reader
+    instead of to a blocked input() left behind.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream # None: sys.stdin, looked up when the thread starts
+        self.lock = threading.Lock()
+        self.lines = deque() # Lines read that no coroutine has taken yet; "" is end of file and stays
+        self.waiters = deque() # (loop, future) of coroutines waiting for a line
+        self.thread = None
+
+    def _read(self):
+        stream = self.stream or sys.stdin
+        while True:
+            line = stream.readline()
+            with self.lock:
+                self.lines.append(line)
+                self._hand_out()
+            if not line:
+                return
+
+    def _hand_out(self):
+        # Called with the lock held
+        while self.lines and self.waiters:
+            loop, future = self.waiters.popleft()
+            if future.done() or loop.is_closed():
+                continue # Cancelled while waiting
+            line = self.lines[0] if self.lines[0] == "" else self.lines.popleft()
+            loop.call_soon_threadsafe(self._deliver, future, line)
+
+    def _deliver(self, future, line: str):
+        if not future.done():
+            future.set_result(line)
+        elif line: # Cancelled since it was chosen: the line goes to the next reader
+            with self.lock:
+                self.lines.appendleft(line)
+                self._hand_out()
+
+    async def readline(self, prompt: str = "") -> str:
+        """The next line, without its newline. Raises EOFError at the end of input, like input()."""
+        if prompt:
+            print(prompt, end="", flush=True)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._read, name="stdin", daemon=True)
+                self.thread.start()
+            self.waiters.append((loop, future))
+            self._hand_out()
+        line = await future
+        if not line:
+            raise EOFError
+        return line.rstrip("\r\n")
+
+
+# The one reader of the process's stdin, shared by the prompt and shell confirmations
+stdin_reader = StdinReader()
+# The turn whose tool calls a worker thread is running: worker threads run in a copy of the turn's context
+_current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+class AsyncAgent(Agent):
+    """
+    The agent on an asyncio event loop. Model calls go through AsyncAnthropic; the spinner, user input
+    and shell confirmations are coroutines. Tools still run on the scheduler's worker threads.
+    Each instance is one session with its own history, so many sessions can share a loop and a client.
+    A turn runs as a task: cancelling it abandons the in-flight request and restores the history
+    to what it was before the turn.
+    """
+    def __init__(self, client=None, workspace: str = None, tracer: Tracer = None, tool_workers: int = None,
+                 token_budget: int = None, cache_bytes: int = None):
+        super().__init__(client, workspace, tracer, tool_workers, token_budget, cache_bytes)
+        self.loop = None # Set when a turn starts; shell confirmations are sent back to it from worker threads
+        self.journal_writer = None # Thread that syncs the journal, so its file writes stay off the event loop
+        # Shell confirmations are only asked for the turn in progress; cancelling it cancels those pending
+        self.confirming_turn = None
+        self.confirmations = set() # Futures that worker threads are waiting on for an answer
+        self.confirmation_lock = threading.Lock()
+        shell_tool = self.tools["run_shell_command"]
+        shell_tool["execute"] = functools.partial(shell_tool["execute"], confirm=self._confirm_from_worker)
+
+    def _create_client(self, api_key: str):
+        import anthropic
+        return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0) # Retries go through self.resilience
+
+    async def read_input(self, prompt: str) -> str:
+        """Read the user's next message. Override to take input from somewhere other than the terminal."""
+        return await stdin_reader.readline(prompt)
+
+    async def confirm_command(self, command: str) -> bool:
+        """Ask whether the model may run command. Override to ask somewhere other than the terminal."""
+        run_shell_command.print_confirmation_request(command)
+        return (await stdin_reader.readline()).strip().lower() == 'y'
+
+    def _confirm_from_worker(self, command: str) -> bool:
+        # Called by run_shell_command on a worker thread, which waits while the loop gets the answer.
+        # On the loop's own thread the wait could never end, so that is refused outright.
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            raise RuntimeError("Shell commands must be confirmed from a tool worker thread, not the event loop.")
+        with self.confirmation_lock:
+            if self.confirming_turn is None or _current_turn.get() is not self.confirming_turn:
+                return False # From a turn that was cancelled
+            future = asyncio.run_coroutine_threadsafe(self.confirm_command(command), self.loop)
+            self.confirmations.add(future)
+        try:
+            return future.result()
+        except FutureCancelledError: # The turn was cancelled while the question was open
+            return False
+        finally:
+            self.confirmations.discard(future)
+
+    def _decline_confirmations(self):
+        """Cancel the confirmations of the turn in progress, and decline any that its tools still ask for."""
+        with self.confirmation_lock:
+            self.confirming_turn = None
+            for future in list(self.confirmations):
+                future.cancel()
+
+    async def _await_background_setup(self):
+        """Wait, without blocking the loop, for the client and the plugin tools that are still being set up on threads."""
+        if self._client is None and self._client_future is not None:
+            await asyncio.wrap_future(self._client_future)
+        if self._plugin_tools is not None:
+            await asyncio.wrap_future(self._plugin_tools)
+
+    def _save_history(self, history: list = None):
+        """
+        Queue a journal sync of history (by default the current one) on the journal thread. Syncs run
+        one at a time in the order queued, on a copy of the list, so the loop can go on changing it.
+        """
+        if self.journal is None:
+            return
+        if self.journal_writer is None:
+            self.journal_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self.journal_writer.submit(super()._save_history, list(self.conversation_history if history is None else history))
+
+    def _flush_journal(self):
+        """Wait for the queued journal syncs to be written."""
+        if self.journal_writer is not None:
+            self.journal_writer.shutdown(wait=True)
+            self.journal_writer = None
+
+    def end_session(self):
+        self._flush_journal()
+        super().end_session()
+
+    async def _send_request(self, params: dict):
+        """One attempt at a complete response. Override to gate every request, hedges and retries included."""
+        return await self.client.messages.create(**params)
+
+    async def _create_response(self, messages_to_send, tool_schemas):
+        """Request a complete response from the model."""
+        params = self._request_params(messages_to_send, tool_schemas)
+        loading = AsyncLoadingIndicator("Model thinking")
+        loading.start()
+        try:
+            return await self.resilience.call_async(lambda: self._send_request(params), on_retry=self._on_retry)
+        finally:
+            loading.stop()
+
+    async def _stream_response(self, messages_to_send, tool_schemas):
+        """Stream a response from the model, dispatching tools early and retrying like Agent._stream_response."""
+        params = self._request_params(messages_to_send, tool_schemas)
+        state = self._new_stream_state()
+        loading = AsyncLoadingIndicator("Model thinking")
+
+        async def attempt():
+            state.update(self._new_stream_state())
+            loading.start()
+            async with self.client.messages.stream(**params) as stream:
+                async for event in stream:
+                    self._handle_stream_event(event, state, loading)
+                return await stream.get_final_message()
+
+        try:
+            final_message = await self.resilience.call_async(attempt, on_retry=self._on_retry, hedge=False,
+                                                             retryable=lambda error: not state["content_started"])
+        finally:
+            loading.stop()
+
+        if state["printing_text"]:
+            print("\n" + "═" * 80, end="")
+        return final_message, state["early_results"]
+
+    async def _run_tool_calls(self, tool_calls: list, early_results: dict) -> list:
+        """
+        Execute the tool calls of one assistant turn and return their results in call order.
+        Batches are planned as in Agent._run_tool_calls; each batch is awaited without blocking the loop.
+        """
+        results_by_id = {}
+        for batch in plan_batches(tool_calls, self._tool_kind):
+            print("\n" + "─" * 80)
+            if len(batch) == 1:
+                print(f"🤖 EXECUTING TOOL: {batch[0]['name']}")
+                self._print_tool_call(batch[0]['name'], batch[0]['input'])
+            else:
+                print(f"🤖 EXECUTING {len(batch)} TOOLS IN PARALLEL")
+                for tool_call in batch:
+                    print(f"• {tool_call['name']}")
+                    self._print_tool_call(tool_call['name'], tool_call['input'])
+            print("─" * 80)
+
+            loading = AsyncLoadingIndicator(f"Executing {len(batch)} tools" if len(batch) > 1 else f"Executing {batch[0]['name']}")
+            # Interactive tools prompt and stream output to the terminal, so they run without the spinner
+            if not any(self._tool_kind(tool_call['name']) == INTERACTIVE for tool_call in batch):
+                loading.start()
+            try:
+                futures = self._submit_batch(batch, early_results)
+                results = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+            finally:
+                loading.stop()
+
+            for tool_call, result in zip(batch, results):
+                self._print_tool_result(tool_call['name'], result)
+                results_by_id[tool_call['id']] = result
+        return [results_by_id[tool_call['id']] for tool_call in tool_calls]
+
+    async def run_turn(self, user_input: str):
+        """Handle one user message: call the model and run the tools it asks for until it is done."""
+        self.loop = asyncio.get_running_loop()
+        with self.tracer.span("turn", session=self.session_id) as self.turn_span:
+            history_before_turn = list(self.conversation_history)
+            self.confirming_turn = object()
+            _current_turn.set(self.confirming_turn) # Inherited by the tool calls this turn submits
+            self._add_user_message(user_input)
+            self._save_history()
+
+            try:
+                await self._await_background_setup()
+                tool_schemas = self._tool_schemas()
+                while True:
+                    messages_to_send = self._messages_to_send()
+                    if not messages_to_send:
+                        print("\n🤖 Error: No messages to send to API. This should not happen after user input.")
+                        break
+
+                    self.prefetcher.start() # Runs while the request is in flight
+                    retries_before = self.retry_count
+                    with self.tracer.span("model_call", parent=self.turn_span, model=self.model_name, streaming=self.streaming) as span:
+                        if self.streaming:
+                            api_response_obj, early_results = await self._stream_response(messages_to_send, tool_schemas)
+                        else:
+                            api_response_obj = await self._create_response(messages_to_send, tool_schemas)
+                            early_results = {}
+                        usage = self._record_usage(api_response_obj)
+                        self._trace_model_call(span, messages_to_send, api_response_obj, usage, self.retry_count - retries_before)
+
+                    tool_calls = self._handle_response(api_response_obj)
+                    if not tool_calls:
+                        break
+
+                    self._append_tool_results(tool_calls, await self._run_tool_calls(tool_calls, early_results))
+                    self._save_history()
+
+            except asyncio.CancelledError:
+                # No answer may reach a tool of the cancelled turn, nor a line meant for the next prompt be taken
+                self._decline_confirmations()
+                # A tool_use without its tool_result would make every later request invalid
+                self.conversation_history = history_before_turn
+                self._save_history()
+                raise
+            except Exception as e:
+                if is_api_error(e):
+                    self._print_error("API ERROR", e)
+                    self._note_kept_tool_work()
+                else:
+                    self._print_error("UNEXPECTED ERROR", e)
+                    self._drop_unanswered_tool_use()
+
+            self.conversation_history = self.history_manager.compact(self.conversation_history)
+            self._save_history()
+
+    async def run(self):
+        print("\n" + "═" * 80)
+        print("🤖 AGENT INITIALIZED")
+        print("Chat with the AI assistant. Type 'exit' to end the session. Press Ctrl+C to cancel a reply.")
+        print("═" * 80)
+
+        loop = asyncio.get_running_loop()
+        while True:
+            print("\n" + "═" * 80)
+            user_input = await self.read_input("👤 YOUR INPUT > ")
+            if user_input.lower() == "exit":
+                print("🤖 Exiting agent.")
+                self.end_session()
+                break
+
+            if not user_input.strip():
+                continue
+
+            turn = asyncio.ensure_future(self.run_turn(user_input))
+            try:
+                loop.add_signal_handler(signal.SIGINT, turn.cancel)
+                handling_interrupt = True
+            except (NotImplementedError, RuntimeError, ValueError): # Not POSIX, or not the main thread
+                handling_interrupt = False
+            try:
+                await asyncio.wait({turn})
+            finally:
+                if handling_interrupt:
+                    loop.remove_signal_handler(signal.SIGINT)
+                turn.cancel() # No-op once the turn is done; stops it if run() itself was cancelled
+
+            if turn.cancelled():
+                print("\n⏹️ Reply cancelled.")
+            else:
+                turn.result() # Re-raise anything run_turn didn't handle
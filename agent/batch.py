@@ -0,0 +1,189 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+
+from .async_agent import AsyncAgent
+from .tracing import Tracer
+from .resilience import ResilientCaller
+
+DEFAULT_WORKERS = 4
+# Extra attempts per model request after a rate limit, overload, 5xx or network error
+DEFAULT_RETRIES = 3
+
+
+class TokenBucket:
+    """
+    Allows rate acquisitions per second on average, in bursts of up to capacity.
+    One bucket is shared by every worker of a batch, so the batch as a whole stays under the limit.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock() # Waiters are served in order
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def parse_task(line: str, line_number: int) -> dict:
+    """
+    A task from one JSONL line. The prompt is the "prompt" field, or "title" and "body" joined
+    (the format of a requests backlog). The id is "id" or "request_id", else the line number.
+    Raises ValueError for a line that isn't a JSON object with a prompt.
+    """
+    task = json.loads(line)
+    if not isinstance(task, dict):
+        raise ValueError("expected a JSON object")
+    prompt = task.get("prompt") or "\n\n".join(part for part in (task.get("title"), task.get("body")) if part)
+    if not prompt:
+        raise ValueError("no prompt (or title/body) field")
+    return {"id": str(task.get("id") or task.get("request_id") or line_number), "line": line_number, "prompt": prompt}
+
+
+class BatchAgent(AsyncAgent):
+    """
+    A headless AsyncAgent for one batch task. Shell commands are approved or declined by policy,
+    model requests wait for the shared token bucket and transient failures are retried a bounded
+    number of times. Errors are collected so the task's result can report them.
+    """
+    def __init__(self, client, workspace: str, bucket: TokenBucket = None, retries: int = DEFAULT_RETRIES,
+                 allow_shell: bool = False, tracer: Tracer = None):
+        super().__init__(client, workspace, tracer)
+        self.streaming = False # Nobody is watching the text arrive
+        self.bucket = bucket
+        self.resilience = ResilientCaller(retries=retries)
+        self.allow_shell = allow_shell
+        self.errors = []
+
+    async def read_input(self, prompt: str) -> str:
+        raise RuntimeError("Batch agents take their input from the task file.")
+
+    async def confirm_command(self, command: str) -> bool:
+        print(f"\n🔍 Shell command {'approved' if self.allow_shell else 'declined'} by batch policy: '{command}'")
+        return self.allow_shell
+
+    async def _send_request(self, params: dict):
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        return await super()._send_request(params)
+
+    def _print_error(self, title: str, error: Exception):
+        self.errors.append(f"{title}: {error}")
+        super()._print_error(title, error)
+
+
+def _prepare_workspace(workdir: str, task: dict, source: str = None) -> str:
+    """Create the task's own directory under workdir, as a copy of source if one is given."""
+    safe_id = re.sub(r"[^A-Za-z0-9._-]", "_", task["id"])
+    workspace = os.path.join(workdir, f"{task['line']:05d}-{safe_id}")
+    if source:
+        shutil.copytree(source, workspace, symlinks=True, ignore=shutil.ignore_patterns(".git"))
+    else:
+        os.makedirs(workspace)
+    return workspace
+
+
+async def run_task(task: dict, client, workdir: str, source: str = None, bucket: TokenBucket = None,
+                   retries: int = DEFAULT_RETRIES, allow_shell: bool = False, tracer: Tracer = None) -> dict:
+    """Run one task to completion in its own workspace and return its result record."""
+    started = time.monotonic()
+    workspace = await asyncio.get_running_loop().run_in_executor(None, _prepare_workspace, workdir, task, source)
+    agent = BatchAgent(client, workspace, bucket=bucket, retries=retries, allow_shell=allow_shell, tracer=tracer)
+    try:
+        await agent.run_turn(task["prompt"])
+    finally:
+        agent.end_session() # The batch's tracer is shared, so this leaves it open
+
+    result = {
+        "id": task["id"],
+        "status": "error" if agent.errors else "success",
+        "reply": agent.final_reply(),
+        "workspace": workspace,
+        "session": agent.session_id, # The session attribute of the task's spans in the trace
+        "duration_seconds": round(time.monotonic() - started, 3),
+        "retries": agent.retry_count,
+        "usage": agent.usage_totals,
+    }
+    if agent.errors:
+        result["error"] = "; ".join(agent.errors)
+    return result
+
+
+async def run_batch(tasks_path: str, output, workers: int = DEFAULT_WORKERS, workdir: str = None, source: str = None,
+                    requests_per_minute: float = None, retries: int = DEFAULT_RETRIES, allow_shell: bool = False,
+                    client=None) -> dict:
+    """
+    Run every task in a JSONL file across a pool of workers, writing one JSON result line to output
+    per task as it completes. Tasks are read as workers free up, so the file can be arbitrarily long.
+    Returns counts of succeeded and failed tasks.
+    """
+    if client is None:
+        import anthropic
+        from dotenv import load_dotenv
+        load_dotenv()
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY not found in environment variables. Please set it in your .env file or system environment.")
+        client = anthropic.AsyncAnthropic(api_key=api_key, max_retries=0) # Retries go through each agent's bounded retry loop
+    workdir = workdir or tempfile.mkdtemp(prefix="codeforge-batch-")
+    os.makedirs(workdir, exist_ok=True)
+    bucket = TokenBucket(requests_per_minute / 60.0) if requests_per_minute else None
+    queue = asyncio.Queue(maxsize=workers * 2)
+    counts = {"success": 0, "error": 0}
+    tracer = Tracer() # One trace file and summary for the whole batch
+
+    def record(result):
+        counts["success" if result["status"] == "success" else "error"] += 1
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        print(f"[{sum(counts.values())}] {result['id']}: {result['status']}", file=sys.stderr)
+
+    async def produce():
+        try:
+            with open(tasks_path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        task = parse_task(line, line_number)
+                    except ValueError as e:
+                        record({"id": f"line {line_number}", "status": "error", "error": f"Invalid task: {e}"})
+                        continue
+                    await queue.put(task)
+        finally:
+            for _ in range(workers):
+                await queue.put(None) # One stop signal per worker
+
+    async def work():
+        while True:
+            task = await queue.get()
+            if task is None:
+                return
+            try:
+                result = await run_task(task, client, workdir, source, bucket, retries, allow_shell, tracer)
+            except Exception as e:
+                result = {"id": task["id"], "status": "error", "error": str(e)}
+            record(result)
+
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(workers)))
+    finally:
+        if tracer.enabled:
+            print(tracer.format_summary(), file=sys.stderr)
+        tracer.close()
+    return counts
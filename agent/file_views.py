@@ -0,0 +1,54 @@
+import os
+import difflib
+import threading
+from collections import OrderedDict
+
+# Upper bound on the file content kept as the model's last views, across all files
+MAX_VIEW_BYTES = 4_000_000
+# Inputs larger than this aren't diffed: SequenceMatcher can get slow on big, heavily changed files
+MAX_DIFF_INPUT_BYTES = 1_000_000
+CONTEXT_LINES = 3
+
+
+def unified_diff(old: str, new: str, from_label: str, to_label: str) -> str:
+    """A unified diff of two texts, or "" if they have the same lines (or are too large to diff)."""
+    if len(old) + len(new) > MAX_DIFF_INPUT_BYTES:
+        return ""
+    return "\n".join(difflib.unified_diff(old.splitlines(), new.splitlines(), fromfile=from_label, tofile=to_label,
+                                          n=CONTEXT_LINES, lineterm=""))
+
+
+class FileViewTracker:
+    """
+    The last full content of each file that was sent to the model, and the tool_use whose result
+    carried it. A later read of the same file can then be answered with a diff against that view.
+    """
+    def __init__(self, max_bytes: int = MAX_VIEW_BYTES):
+        self.max_bytes = max_bytes
+        self.views = OrderedDict() # realpath -> {"content", "tool_use_id", "sent"}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def record(self, path: str, content: str, tool_use_id: str, sent: str):
+        """Remember that content was sent as the tool_result of tool_use_id, serialized as sent."""
+        key = os.path.realpath(path)
+        with self.lock:
+            if key in self.views:
+                self.total_bytes -= len(self.views.pop(key)["content"])
+            if len(content) > self.max_bytes:
+                return
+            self.views[key] = {"content": content, "tool_use_id": tool_use_id, "sent": sent}
+            self.total_bytes += len(content)
+            while self.total_bytes > self.max_bytes:
+                _path, view = self.views.popitem(last=False)
+                self.total_bytes -= len(view["content"])
+
+    def view(self, path: str):
+        """The last recorded view of path, or None."""
+        key = os.path.realpath(path)
+        with self.lock:
+            view = self.views.get(key)
+            if view is None:
+                return None
+            self.views.move_to_end(key)
+            return dict(view)
@@ -0,0 +1,121 @@
+import os
+import json
+
+# Rough characters-per-token ratio for English text and code; good enough for budgeting
+CHARS_PER_TOKEN = 4
+# Fixed per-message overhead (role, separators) the API adds on top of the content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(message: dict) -> int:
+    """Estimate how many input tokens a single history message will cost."""
+    content = message.get("content")
+    if isinstance(content, str):
+        size = len(content)
+    else:
+        size = len(json.dumps(content, ensure_ascii=False, default=str))
+    return size // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def _is_turn_start(message: dict) -> bool:
+    """A turn starts with a user message that isn't carrying tool results."""
+    if message.get("role") != "user":
+        return False
+    content = message.get("content")
+    if isinstance(content, str):
+        return True
+    return not any(isinstance(block, dict) and block.get("type") == "tool_result" for block in content)
+
+
+class HistoryManager:
+    """
+    Keeps the conversation history under a token budget.
+    When the history is over budget it is compacted in three stages, stopping as soon as it fits:
+    1. Large tool results from earlier turns are replaced by a short note, oldest first.
+    2. Whole turns are dropped from the front, so a tool_use is never separated from its tool_result.
+    3. Large tool results from the current turn are replaced too, except for the most recent message.
+    """
+    def __init__(self, token_budget: int = None, min_elided_tokens: int = 200):
+        if token_budget is None:
+            token_budget = int(os.getenv("AGENT_HISTORY_TOKEN_BUDGET", "100000"))
+        self.token_budget = token_budget
+        # Results smaller than this aren't worth replacing with a note
+        self.min_elided_tokens = min_elided_tokens
+
+    def total_tokens(self, history: list) -> int:
+        return sum(estimate_tokens(message) for message in history)
+
+    def compact(self, history: list) -> list:
+        """Return a history that fits the budget (or is as small as it can safely get)."""
+        total = self.total_tokens(history)
+        if total <= self.token_budget:
+            return history
+
+        history = list(history)
+        turn_starts = [i for i, message in enumerate(history) if _is_turn_start(message)]
+        current_turn_start = turn_starts[-1] if turn_starts else 0
+
+        # 1. Elide large tool results from earlier turns
+        total = self._elide_tool_results(history, 0, current_turn_start, total)
+        if total <= self.token_budget:
+            return history
+
+        # 2. Drop whole turns from the front, always keeping the current one
+        while len(turn_starts) > 1 and total > self.token_budget:
+            cut = turn_starts[1]
+            total -= self.total_tokens(history[:cut])
+            history = history[cut:]
+            turn_starts = [turn_start - cut for turn_start in turn_starts[1:]]
+        current_turn_start = turn_starts[-1] if turn_starts else 0
+        if total <= self.token_budget:
+            return history
+
+        # 3. Elide large tool results from the current turn, sparing the newest message
+        self._elide_tool_results(history, current_turn_start, len(history) - 1, total)
+        return history
+
+    def _elide_tool_results(self, history: list, start: int, end: int, total: int) -> int:
+        """Replace large tool results in history[start:end] in place, oldest first. Returns the new total."""
+        tool_names = {}
+        for i in range(start, end):
+            if total <= self.token_budget:
+                break
+            message = history[i]
+            content = message.get("content")
+            if isinstance(content, str):
+                continue
+            if message.get("role") == "assistant":
+                for block in content:
+                    if isinstance(block, dict) and block.get("type") == "tool_use":
+                        tool_names[block.get("id")] = block.get("name")
+                continue
+
+            new_content = []
+            changed = False
+            for block in content:
+                if (isinstance(block, dict) and block.get("type") == "tool_result"
+                        and estimate_tokens(block) >= self.min_elided_tokens):
+                    block = self._elided_block(block, tool_names.get(block.get("tool_use_id"), "tool"))
+                    changed = True
+                new_content.append(block)
+            if changed:
+                old_tokens = estimate_tokens(message)
+                history[i] = dict(message, content=new_content)
+                total += estimate_tokens(history[i]) - old_tokens
+        return total
+
+    def _elided_block(self, block: dict, tool_name: str) -> dict:
+        """A copy of a tool_result block whose content is replaced by a short note."""
+        status = "elided"
+        try:
+            status = json.loads(block.get("content", "")).get("status", status)
+        except (ValueError, AttributeError):
+            pass
+        note = {
+            "status": status,
+            "note": (f"The output of {tool_name} (~{estimate_tokens(block)} tokens) was removed from "
+                     "the conversation to save context. Call the tool again if you need it.")
+        }
+        elided = {key: value for key, value in block.items() if key != "content"}
+        elided["content"] = json.dumps(note)
+        return elided
@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import zlib
+import shutil
+import struct
+import hashlib
+import tempfile
+
+JOURNAL_SUFFIX = ".journal"
+# Strings at least this long (tool results, file contents) are stored once, out of line, by content hash
+BLOB_MIN_CHARS = 2048
+# Each record is its payload's length and CRC-32, then the payload: one JSON object
+RECORD_HEADER = struct.Struct(">II")
+# A journal with this many more records than messages is rewritten when it is resumed
+REWRITE_SLACK = 64
+# Sessions not written to for this many days are deleted, with their spool and the blobs only they used
+SESSION_MAX_AGE_DAYS = float(os.getenv("AGENT_SESSION_MAX_AGE_DAYS", "30"))
+# Saved sessions hold file contents and command output: directories and files are the owner's alone
+PRIVATE_DIR_MODE = 0o700
+PRIVATE_FILE_MODE = 0o600
+
+
+def session_dir() -> str:
+    """Where session journals live: AGENT_SESSION_DIR, or a sessions directory next to the search indexes."""
+    return os.getenv("AGENT_SESSION_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "codeforge", "sessions")
+
+
+def find_session(session: str, directory: str = None) -> str:
+    """
+    The journal path for session: a session id (or a unique prefix of one), "latest" for the most
+    recently written session, or a path to a journal. Only names with a path separator are paths,
+    so a file in the working directory never stands in for a saved session.
+    Raises FileNotFoundError if there is none.
+    """
+    if os.sep in session or (os.altsep and os.altsep in session):
+        if os.path.isfile(session):
+            return session
+        raise FileNotFoundError(f"No session journal at {session}.")
+    directory = directory or session_dir()
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(JOURNAL_SUFFIX)]
+    except FileNotFoundError:
+        names = []
+    paths = [os.path.join(directory, name) for name in names]
+    if session == "latest":
+        if paths:
+            return max(paths, key=os.path.getmtime)
+    else:
+        matches = [path for name, path in zip(names, paths) if name.startswith(session)]
+        exact = os.path.join(directory, session + JOURNAL_SUFFIX)
+        if exact in matches:
+            return exact
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1:
+            raise FileNotFoundError(f"Session '{session}' is ambiguous: it could be any of {len(matches)} sessions.")
+    raise FileNotFoundError(f"No saved session '{session}' in {directory}.")
+
+
+def _make_private_dirs(path: str):
+    """os.makedirs(path, exist_ok=True), with every directory it creates private."""
+    parent = os.path.dirname(path)
+    if parent and parent != path and not os.path.isdir(parent):
+        _make_private_dirs(parent)
+    try:
+        os.mkdir(path, PRIVATE_DIR_MODE)
+    except FileExistsError:
+        pass
+
+
+def _private_opener(path: str, flags: int) -> int:
+    return os.open(path, flags, PRIVATE_FILE_MODE)
+
+
+def _blob_digests(value, found: set):
+    """Add the digests of the blobs that a record refers to to found."""
+    if isinstance(value, dict):
+        if len(value) == 1 and "$blob" in value:
+            found.add(value["$blob"])
+        else:
+            for item in value.values():
+                _blob_digests(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            _blob_digests(item, found)
+
+
+def prune_sessions(directory: str = None, max_age_days: float = None) -> int:
+    """
+    Delete the sessions in directory that were last written more than max_age_days ago, with their
+    spool directories, then the blobs that no remaining session refers to. Blobs younger than the
+    cutoff are kept whatever refers to them, since a running session may not have synced its
+    reference yet. Returns the number of sessions deleted.
+    """
+    directory = directory or session_dir()
+    max_age_days = SESSION_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    if max_age_days <= 0:
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(JOURNAL_SUFFIX)]
+    except FileNotFoundError:
+        return 0
+    pruned, kept = 0, []
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                kept.append(path)
+                continue
+            os.unlink(path)
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(os.path.join(directory, "spool", name[:-len(JOURNAL_SUFFIX)]), ignore_errors=True)
+        pruned += 1
+    if not pruned:
+        return 0 # Nothing can have lost its last reference
+
+    referenced = set()
+    for path in kept:
+        try:
+            records, _end = read_records(path)
+        except FileNotFoundError:
+            continue
+        _blob_digests(records, referenced)
+    blobs = os.path.join(directory, "blobs")
+    for parent, _dirs, files in os.walk(blobs):
+        for name in files:
+            path = os.path.join(parent, name)
+            try:
+                if name not in referenced and os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+    return pruned
+
+
+def read_records(path: str):
+    """
+    The records of a journal and the offset just past the last intact one. A record cut short
+    by a crash, and anything after it, is ignored.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    records, offset = [], 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(json.loads(payload.decode("utf-8")))
+        offset = start + length
+    return records, offset
+
+
+def _frame(record: dict) -> bytes:
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class BlobStore:
+    """
+    Large strings, zlib-compressed, one file per SHA-256 of their content. Shared by all sessions
+    in a directory, so a file that several sessions read is stored once.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.known = set() # Digests already on disk
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, text: str) -> str:
+        data = text.encode("utf-8", "surrogatepass")
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.known:
+            return digest
+        path = self._path(digest)
+        try:
+            os.utime(path) # Reused: pruning keeps blobs this recent whether or not a journal refers to them yet
+        except FileNotFoundError:
+            _make_private_dirs(os.path.dirname(path))
+            # Written under a temporary name first (mkstemp makes it private): a blob file is either complete or absent
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".blob-")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(zlib.compress(data, 1))
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        self.known.add(digest)
+        return digest
+
+    def get(self, digest: str) -> str:
+        with open(self._path(digest), 'rb') as f:
+            text = zlib.decompress(f.read()).decode("utf-8", "surrogatepass")
+        self.known.add(digest)
+        return text
+
+
+class SessionJournal:
+    """
+    An append-only record of one session's conversation history, so a session can be resumed
+    after the process exits or crashes.
+    The journal is a sequence of length-prefixed, checksummed JSON records: "append", "set",
+    "truncate" and "drop" (turns removed from the front), which replay into the history.
+    sync() compares the history with what was last written by message identity, so each call
+    costs only the records for what changed. Strings of BLOB_MIN_CHARS or more are written to
+    the blob store and referenced by hash, which keeps the journal small and lets compaction
+    rewrite messages without rewriting their tool output.
+    """
+    def __init__(self, path: str, session_id: str, meta: dict = None, history: list = None):
+        self.path = path
+        self.session_id = session_id
+        self.meta = meta or {}
+        self.blobs = BlobStore(os.path.join(os.path.dirname(os.path.abspath(path)), "blobs"))
+        # The message objects the journal currently describes, as last synced
+        self.history = list(history or [])
+        self.file = None # Opened on the first write, so a session that never gets a message leaves no file
+        self.records_written = 0
+
+    @classmethod
+    def create(cls, session_id: str, directory: str = None, **meta) -> "SessionJournal":
+        directory = directory or session_dir()
+        meta = dict(meta, type="session", id=session_id, created=time.time())
+        return cls(os.path.join(directory, session_id + JOURNAL_SUFFIX), session_id, meta)
+
+    @classmethod
+    def open(cls, session: str, directory: str = None) -> "SessionJournal":
+        """Load a saved session (see find_session) to continue it. Its history is in .history."""
+        path = find_session(session, directory)
+        records, end = read_records(path)
+        meta, history = {}, []
+        for record in records:
+            kind = record["type"]
+            if kind == "session":
+                meta = record
+            elif kind == "append":
+                history.append(record["message"])
+            elif kind == "set":
+                history[record["index"]] = record["message"]
+            elif kind == "truncate":
+                del history[record["length"]:]
+            elif kind == "drop":
+                del history[:record["count"]]
+        session_id = meta.get("id") or os.path.basename(path)[:-len(JOURNAL_SUFFIX)]
+        journal = cls(path, session_id, meta)
+        loaded = {} # digest -> string, so a blob that several messages share is read once
+        journal.history = [journal._decode(message, loaded) for message in history]
+        if len(records) > 2 * len(history) + REWRITE_SLACK:
+            journal._rewrite()
+        else:
+            journal.file = open(path, 'r+b')
+            journal.file.truncate(end) # Drop a record torn by a crash before appending after it
+            journal.file.seek(end)
+            journal.records_written = len(records)
+        return journal
+
+    def _encode(self, value):
+        if isinstance(value, str):
+            return {"$blob": self.blobs.put(value)} if len(value) >= BLOB_MIN_CHARS else value
+        if isinstance(value, dict):
+            return {key: self._encode(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._encode(item) for item in value]
+        return value
+
+    def _decode(self, value, loaded: dict):
+        if isinstance(value, dict):
+            if len(value) == 1 and "$blob" in value:
+                digest = value["$blob"]
+                if digest not in loaded:
+                    loaded[digest] = self.blobs.get(digest)
+                return loaded[digest]
+            return {key: self._decode(item, loaded) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._decode(item, loaded) for item in value]
+        return value
+
+    def _write(self, records: list):
+        if self.file is None:
+            _make_private_dirs(os.path.dirname(os.path.abspath(self.path)))
+            self.file = open(self.path, 'ab', opener=_private_opener)
+            if self.records_written == 0 and self.meta:
+                records = [self.meta] + records
+        self.file.write(b"".join(_frame(record) for record in records))
+        self.file.flush()
+        self.records_written += len(records)
+
+    def sync(self, history: list):
+        """Write whatever changed in history since the last sync. Call it whenever history is consistent."""
+        old, records = self.history, []
+        if old and history and history[0] is not old[0]:
+            # Compaction drops whole turns from the front
+            dropped = next((i for i, message in enumerate(old) if message is history[0]), None)
+            if dropped is not None:
+                records.append({"type": "drop", "count": dropped})
+                old = old[dropped:]
+        for index in range(min(len(old), len(history))):
+            if history[index] is not old[index]:
+                records.append({"type": "set", "index": index, "message": self._encode(history[index])})
+        if len(old) > len(history):
+            records.append({"type": "truncate", "length": len(history)})
+        for message in history[len(old):]:
+            records.append({"type": "append", "message": self._encode(message)})
+        if records:
+            self._write(records)
+        self.history = list(history)
+
+    def _rewrite(self):
+        """Replace the journal with one that appends the current history, dropping superseded records."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".journal-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                records = [self.meta] if self.meta else []
+                records += [{"type": "append", "message": self._encode(message)} for message in self.history]
+                f.write(b"".join(_frame(record) for record in records))
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.file = open(self.path, 'ab')
+        self.records_written = len(records)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
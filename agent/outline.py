@@ -0,0 +1,297 @@
+import os
+import re
+import ast
+import atexit
+import threading
+from collections import OrderedDict
+
+# Number of files whose outline is kept in memory
+OUTLINE_CACHE_SIZE = 1024
+# Files larger than this are not outlined
+MAX_OUTLINE_BYTES = 2_000_000
+# With at least this many files to parse, the parsing is spread over a process pool
+PARALLEL_MIN_FILES = 32
+
+_outline_cache = OrderedDict() # realpath -> (mtime_ns, size, symbols)
+_outline_cache_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _python_symbols(source: str) -> list:
+    """Classes and functions of a Python module, with methods and nested classes under their class."""
+    tree = ast.parse(source)
+    unparse = getattr(ast, "unparse", None) # Python 3.9+; before that, signatures are the declaration's first line
+    lines = source.splitlines()
+
+    def symbols(body, in_class: bool) -> list:
+        found = []
+        for node in body:
+            start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+            if isinstance(node, ast.ClassDef):
+                if unparse:
+                    bases = [unparse(base) for base in node.bases] + [unparse(keyword) for keyword in node.keywords]
+                    signature = f"class {node.name}" + (f"({', '.join(bases)})" if bases else "")
+                else:
+                    signature = _line_signature(lines[node.lineno - 1])
+                found.append({"kind": "class", "name": node.name, "signature": signature,
+                              "start_line": start, "end_line": node.end_lineno, "children": symbols(node.body, True)})
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if unparse:
+                    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+                    returns = f" -> {unparse(node.returns)}" if node.returns else ""
+                    signature = f"{prefix} {node.name}({unparse(node.args)}){returns}"
+                else:
+                    signature = _line_signature(lines[node.lineno - 1])
+                # Functions nested in functions are implementation details: not listed
+                found.append({"kind": "method" if in_class else "function", "name": node.name, "signature": signature,
+                              "start_line": start, "end_line": node.end_lineno, "children": []})
+        return found
+
+    return symbols(tree.body, False)
+
+
+_PYTHON_DECLARATION = re.compile(r"^([ \t]*)(?:async\s+)?(def|class)\s+(\w+)")
+
+
+def _line_signature(line: str) -> str:
+    return line.strip().rstrip(":").strip()
+
+
+def _indent(line: str) -> int:
+    return len(line.expandtabs()) - len(line.expandtabs().lstrip())
+
+
+def _python_line_symbols(source: str) -> list:
+    """
+    Classes and functions matched line by line, each spanning its indented block: the outline of
+    a module ast can't parse (another Python version's syntax, or a file mid-edit).
+    """
+    lines = source.splitlines()
+    flat = []
+    for number, line in enumerate(lines):
+        match = _PYTHON_DECLARATION.match(line)
+        if not match:
+            continue
+        indent, end = _indent(line), number
+        for following in range(number + 1, len(lines)):
+            if lines[following].strip() and _indent(lines[following]) <= indent:
+                break
+            if lines[following].strip():
+                end = following
+        start = number
+        while start > 0 and lines[start - 1].strip().startswith("@"):
+            start -= 1
+        flat.append({"kind": match.group(2), "name": match.group(3), "signature": _line_signature(line),
+                     "start_line": start + 1, "end_line": end + 1, "children": []})
+    # Declarations inside a class's span are its members; anything inside a function is not listed
+    top, stack = [], []
+    for symbol in flat:
+        while stack and symbol["start_line"] > stack[-1]["end_line"]:
+            stack.pop()
+        if stack and stack[-1]["kind"] != "class":
+            continue
+        if symbol["kind"] == "def":
+            symbol["kind"] = "method" if stack else "function"
+        (stack[-1]["children"] if stack else top).append(symbol)
+        stack.append(symbol)
+    return top
+
+
+# Declarations of brace-delimited languages, matched at the start of a line
+_JS_DECLARATIONS = [
+    re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(class|interface|enum|namespace)\s+([\w$]+)"),
+    re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?(function)\s*\*?\s*([\w$]+)\s*[<(]"),
+    re.compile(r"^\s*(?:export\s+)?(const|let|var)\s+([\w$]+)\s*(?::[^=]+)?=\s*(?:async\s+)?(?:function\b|(?:\([^)]*\)|[\w$]+)\s*(?::[^=]+)?=>)"),
+    # Class members: indented, and the body opens on the same line, so calls aren't taken for methods
+    re.compile(r"^\s+(?:(?:public|private|protected|static|readonly|override|abstract|async|get|set)\s+)*(?!(?:if|for|while|switch|catch|return|function|new|else)\b)()([\w$]+)\s*(?:<[^>]*>)?\([^;]*\)\s*(?::\s*[^{;=]+)?\{\s*$"),
+]
+_GO_DECLARATIONS = [
+    re.compile(r"^(func)\s+(?:\([^)]*\)\s*)?(\w+)"),
+    re.compile(r"^(type)\s+(\w+)\s+(?:struct|interface)\b"),
+]
+_RUST_DECLARATIONS = [
+    re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:const\s+)?(?:async\s+)?(?:unsafe\s+)?(?:extern\s+\"[^\"]*\"\s+)?(fn)\s+(\w+)"),
+    re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(struct|enum|trait|mod|union)\s+(\w+)"),
+    re.compile(r"^\s*(impl)\b(?:<[^>]*>)?\s*([^{]*)"),
+]
+_JAVA_DECLARATIONS = [
+    re.compile(r"^\s*(?:(?:public|private|protected|internal|static|final|abstract|sealed|open|data|partial|inner)\s+)*(class|interface|enum|record|struct|object)\s+(\w+)"),
+    re.compile(r"^\s*(?:(?:public|private|protected|internal|static|final|abstract|synchronized|native|override|virtual|async|open|suspend)\s+)*(fun)\s+(?:<[^>]*>\s*)?(?:[\w.]+\.)?(\w+)\s*\("),
+    re.compile(r"^\s*(?:(?:public|private|protected|internal|static|final|abstract|synchronized|native|override|virtual|async)\s+)+()(?:<[^>]*>\s*)?[\w<>\[\],.? ]+\s+(\w+)\s*\("),
+]
+# File extension -> (declaration patterns, whether ' quotes strings rather than single characters)
+BRACE_LANGUAGES = {
+    ".js": (_JS_DECLARATIONS, True), ".jsx": (_JS_DECLARATIONS, True), ".mjs": (_JS_DECLARATIONS, True), ".cjs": (_JS_DECLARATIONS, True),
+    ".ts": (_JS_DECLARATIONS, True), ".tsx": (_JS_DECLARATIONS, True),
+    ".go": (_GO_DECLARATIONS, False), ".rs": (_RUST_DECLARATIONS, False),
+    ".java": (_JAVA_DECLARATIONS, False), ".kt": (_JAVA_DECLARATIONS, False), ".cs": (_JAVA_DECLARATIONS, False),
+}
+_KINDS = {"fn": "function", "func": "function", "fun": "function", "const": "function", "let": "function", "var": "function", "": "method"}
+
+
+def _brace_depths(lines: list, single_quote_strings: bool):
+    """
+    For each line, the brace depth at its start and the deepest it gets on it, skipping braces in
+    strings and comments. Block comments and backtick strings may span lines.
+    """
+    starts, peaks = [], []
+    depth, in_comment, in_backtick = 0, False, False
+    for line in lines:
+        starts.append(depth)
+        peak, i, quote = depth, 0, None
+        while i < len(line):
+            char = line[i]
+            if in_comment:
+                if line.startswith("*/", i):
+                    in_comment, i = False, i + 1
+            elif in_backtick:
+                if char == "\\":
+                    i += 1
+                elif char == "`":
+                    in_backtick = False
+            elif quote:
+                if char == "\\":
+                    i += 1
+                elif char == quote:
+                    quote = None
+            elif line.startswith("//", i):
+                break
+            elif line.startswith("/*", i):
+                in_comment, i = True, i + 1
+            elif char == '"':
+                quote = char
+            elif char == "'":
+                if single_quote_strings:
+                    quote = char
+                else: # A character literal such as 'x' or '\n'; otherwise a Rust lifetime
+                    close = line.find("'", i + 1, i + 4)
+                    if close != -1:
+                        i = close
+            elif char == "`":
+                in_backtick = True
+            elif char == "{":
+                depth += 1
+                peak = max(peak, depth)
+            elif char == "}":
+                depth = max(0, depth - 1)
+            i += 1
+        peaks.append(peak)
+    return starts, peaks
+
+
+def _brace_symbols(source: str, patterns: list, single_quote_strings: bool) -> list:
+    """Declarations of a brace-delimited language, each spanning to the brace that closes its body."""
+    lines = source.splitlines()
+    starts, peaks = _brace_depths(lines, single_quote_strings)
+    flat = []
+    for number, line in enumerate(lines):
+        for pattern in patterns:
+            match = pattern.match(line)
+            if not match:
+                continue
+            end = number
+            # The body opens on this line or, in some styles, on one of the next few
+            for opening in range(number, min(number + 3, len(lines))):
+                if peaks[opening] > starts[number]:
+                    end = next((j for j in range(opening, len(lines)) if j + 1 == len(lines) or starts[j + 1] <= starts[number]), opening)
+                    break
+                if ";" in lines[opening]:
+                    break
+            kind = _KINDS.get(match.group(1), match.group(1))
+            name = match.group(2).strip()
+            flat.append({"kind": kind, "name": name, "signature": line.strip().rstrip("{").strip(),
+                         "start_line": number + 1, "end_line": end + 1, "children": []})
+            break
+    # Declarations inside another's span are its children
+    top, stack = [], []
+    for symbol in flat:
+        while stack and symbol["start_line"] > stack[-1]["end_line"]:
+            stack.pop()
+        (stack[-1]["children"] if stack else top).append(symbol)
+        stack.append(symbol)
+    return top
+
+
+def supported(path: str) -> bool:
+    return path.endswith(".py") or os.path.splitext(path)[1] in BRACE_LANGUAGES
+
+
+def parse_file(path: str):
+    """The symbols of one file, or an error message. Module-level so that pool workers can run it."""
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            source = f.read()
+        if path.endswith(".py"):
+            try:
+                return _python_symbols(source)
+            except (SyntaxError, ValueError, RecursionError):
+                return _python_line_symbols(source)
+        patterns, single_quote_strings = BRACE_LANGUAGES[os.path.splitext(path)[1]]
+        return _brace_symbols(source, patterns, single_quote_strings)
+    except (OSError, ValueError, RecursionError) as e:
+        return f"could not parse: {e}"
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Imported here: most sessions never parse enough files at once to need the pool
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Forking a process that runs threads can deadlock the child
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context(method))
+            atexit.register(_pool.shutdown) # Before interpreter teardown, which the pool doesn't survive quietly
+        return _pool
+
+
+def outlines(paths: list) -> list:
+    """
+    The symbols (or an error message) of each file in paths, in order. Parses are cached by the
+    file's mtime and size; uncached files are parsed in a process pool when there are many of them.
+    """
+    results, pending = [None] * len(paths), []
+    for index, path in enumerate(paths):
+        try:
+            stat_result = os.stat(path)
+        except OSError as e:
+            results[index] = f"could not read: {e.strerror}"
+            continue
+        if stat_result.st_size > MAX_OUTLINE_BYTES:
+            results[index] = f"not outlined: larger than {MAX_OUTLINE_BYTES} bytes"
+            continue
+        key = os.path.realpath(path)
+        with _outline_cache_lock:
+            cached = _outline_cache.get(key)
+            if cached and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size:
+                _outline_cache.move_to_end(key)
+                results[index] = cached[2]
+                continue
+        pending.append((index, path, key, stat_result))
+
+    pending_paths = [path for _, path, _, _ in pending]
+    if len(pending) >= PARALLEL_MIN_FILES:
+        parsed = list(_get_pool().map(parse_file, pending_paths, chunksize=8))
+    else:
+        parsed = [parse_file(path) for path in pending_paths]
+
+    with _outline_cache_lock:
+        for (index, _path, key, stat_result), symbols in zip(pending, parsed):
+            results[index] = symbols
+            _outline_cache[key] = (stat_result.st_mtime_ns, stat_result.st_size, symbols)
+            _outline_cache.move_to_end(key)
+        while len(_outline_cache) > OUTLINE_CACHE_SIZE:
+            _outline_cache.popitem(last=False)
+    return results
+
+
+def format_outline(symbols: list, depth: int = 0) -> str:
+    """An indented text outline, one symbol per line with its line span: compact enough to send whole."""
+    lines = []
+    for symbol in symbols:
+        lines.append(f"{'    ' * depth}{symbol['signature']}  [{symbol['start_line']}-{symbol['end_line']}]")
+        if symbol["children"]:
+            lines.append(format_outline(symbol["children"], depth + 1))
+    return "\n".join(lines)
@@ -0,0 +1,149 @@
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .tools import read_file
+
+# Files read ahead while each model request is in flight; 0 turns prefetching off
+PREFETCH_FILES = int(os.getenv("AGENT_PREFETCH_FILES", "8"))
+# Listed files remembered as candidates, and messages and reads remembered as sources of them
+MAX_CANDIDATES = 64
+MAX_SIGNALS = 8
+
+# A path-like word: a file name with an extension, possibly with directories in front
+_MENTIONED_PATH = re.compile(r"(?<![\w/.-])(/?(?:[\w.-]+/)*[\w-][\w.-]*\.[A-Za-z0-9]+)")
+_PYTHON_IMPORT = re.compile(r"^[ \t]*(?:from[ \t]+(\.*)([\w.]*)[ \t]+import[ \t]+\(?([\w, \t]+)|import[ \t]+([\w., \t]+))", re.MULTILINE)
+_SCRIPT_IMPORT = re.compile(r"""(?:\bfrom|\bimport|\brequire\(|\bimport\()\s*['"](\.{1,2}/[^'"]+)['"]""")
+_SCRIPT_EXTENSIONS = ("", ".ts", ".tsx", ".js", ".jsx", ".mjs", "/index.ts", "/index.js")
+
+
+def _names(text: str) -> list:
+    """The names of an import list such as "a, b as c"."""
+    return [part.split()[0] for part in text.split(",") if part.split()]
+
+
+def python_imports(path: str, content: str, roots: list) -> list:
+    """Files of the modules that a Python file imports, if they are under one of roots or next to the file."""
+    found = []
+
+    def add(base: str, dotted: str) -> bool:
+        module = os.path.join(base, *dotted.split("."))
+        for candidate in (module + ".py", os.path.join(module, "__init__.py")):
+            if os.path.isfile(candidate):
+                found.append(candidate)
+                return True
+        return False
+
+    for dots, module, names, plain in _PYTHON_IMPORT.findall(content):
+        if plain:
+            for dotted in _names(plain):
+                for root in roots:
+                    if add(root, dotted):
+                        break
+            continue
+        base = os.path.dirname(path)
+        for _ in range(len(dots) - 1):
+            base = os.path.dirname(base)
+        # "from package import name" names submodules as often as it names objects
+        targets = ([module] if module else []) + [f"{module}.{name}" if module else name for name in _names(names)]
+        for base in ([base] if dots else roots):
+            if [target for target in targets if add(base, target)]:
+                break
+    return found
+
+
+def script_imports(path: str, content: str) -> list:
+    """Files that a JavaScript or TypeScript file imports by relative path."""
+    found = []
+    for specifier in _SCRIPT_IMPORT.findall(content):
+        module = os.path.normpath(os.path.join(os.path.dirname(path), specifier))
+        for extension in _SCRIPT_EXTENSIONS:
+            if os.path.isfile(module + extension):
+                found.append(module + extension)
+                break
+    return found
+
+
+class Prefetcher:
+    """
+    Guesses which files the model will read next and reads them into the tool result cache while
+    a model request is in flight, so a later read_file of one of them is served from memory.
+    Candidates, most likely first: paths named in the user's messages, modules imported by files
+    the model just read, and files in listings it just got. Observing only records these signals;
+    resolving them touches the disk, so it happens in the background along with the reads.
+    A prefetched result only fills free room in the cache; it never evicts one the model asked for.
+    """
+    def __init__(self, tool_cache, workspace: str = None, max_files: int = None):
+        self.tool_cache = tool_cache
+        self.workspace = workspace
+        self.max_files = PREFETCH_FILES if max_files is None else max_files
+        self.messages = deque(maxlen=MAX_SIGNALS) # User message texts
+        self.reads = deque(maxlen=MAX_SIGNALS) # (path, content) of files the model read
+        self.listed = deque(maxlen=MAX_CANDIDATES) # Paths of listed files
+        self.executor = None # Started on first use
+        self.prefetched = 0 # Files read ahead and cached
+
+    def observe_message(self, text: str):
+        self.messages.append(text)
+
+    def observe_result(self, tool_name: str, tool_input: dict, result):
+        """Note what a tool result points at: the imports of a file just read, the files of a listing."""
+        if not isinstance(result, dict) or result.get("status") != "success":
+            return
+        if tool_name == "read_file" and isinstance(result.get("content"), str):
+            self.reads.append((tool_input["path"], result["content"]))
+        elif tool_name == "list_files":
+            listed = result.get("files") or [entry["path"] for entry in result.get("entries", []) if entry.get("type") == "file"]
+            self.listed.extend(path for path in listed[:MAX_CANDIDATES] if not path.endswith(os.sep))
+
+    def start(self):
+        """Read the likeliest next files in the background. Returns at once."""
+        if self.max_files <= 0 or not (self.messages or self.reads or self.listed):
+            return
+        # Guesses the model didn't act on by its next request are stale
+        signals = (list(self.messages), list(self.reads), list(self.listed))
+        for signal in (self.messages, self.reads, self.listed):
+            signal.clear()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.executor.submit(self._prefetch, *signals)
+
+    def _candidates(self, messages: list, reads: list, listed: list):
+        """Candidate paths, most telling signal first and most recent first within a signal."""
+        root = self.workspace or os.getcwd()
+        for text in reversed(messages):
+            for name in _MENTIONED_PATH.findall(text):
+                path = os.path.join(root, name)
+                if os.path.isfile(path):
+                    yield path
+        for path, content in reversed(reads):
+            if path.endswith(".py"):
+                yield from python_imports(path, content, [root])
+            elif path.endswith((".js", ".jsx", ".ts", ".tsx", ".mjs")):
+                yield from script_imports(path, content)
+        yield from reversed(listed)
+
+    def _prefetch(self, messages: list, reads: list, listed: list):
+        seen, read = set(), 0
+        for path in self._candidates(messages, reads, listed):
+            if read >= self.max_files:
+                return
+            if path in seen:
+                continue
+            seen.add(path)
+            tool_input = {"path": path}
+            # Taken before reading, like any cached call, so a change made meanwhile is never hidden
+            fingerprint = self.tool_cache.fingerprint("read_file", tool_input)
+            if fingerprint is None or fingerprint[1] > read_file.MAX_BYTES:
+                continue
+            if self.tool_cache.get("read_file", tool_input, fingerprint) is not None:
+                continue
+            read += 1
+            if self.tool_cache.put("read_file", tool_input, fingerprint, read_file.execute(path), evict=False):
+                self.prefetched += 1
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
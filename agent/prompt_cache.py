@@ -0,0 +1,44 @@
+# Helpers that place prompt-cache breakpoints on a Messages API request.
+# The provider caches the request prefix up to each breakpoint, in the order tools -> system -> messages,
+# so marking the end of each of those sections lets every tool-loop iteration reuse the previous prefix.
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def cached_system(system_prompt: str) -> list:
+    """The system prompt as a single text block carrying a cache breakpoint."""
+    return [{"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}]
+
+
+def cached_tools(tool_schemas: list) -> list:
+    """The tool list with a cache breakpoint on its last schema. The input list is not modified."""
+    if not tool_schemas:
+        return tool_schemas
+    return tool_schemas[:-1] + [dict(tool_schemas[-1], cache_control=CACHE_CONTROL)]
+
+
+def cached_messages(messages: list) -> list:
+    """
+    The messages with a cache breakpoint on the last content block of the last message,
+    which caches the whole history prefix for the next request. The input list is not modified.
+    """
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = list(content)
+    blocks[-1] = dict(blocks[-1], cache_control=CACHE_CONTROL)
+    return messages[:-1] + [dict(last, content=blocks)]
+
+
+def usage_summary(usage) -> dict:
+    """Token counts from a response's usage, including cache reads and writes (0 when absent)."""
+    return {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+    }
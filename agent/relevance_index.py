@@ -0,0 +1,124 @@
+import os
+import re
+import math
+import heapq
+from collections import Counter, defaultdict
+
+from .search_index import FileIndex
+
+# Lines per chunk, the unit that queries rank and return
+CHUNK_LINES = 40
+# A chunk this long ends early at a top-level statement, so definitions tend to start their own chunk
+MIN_CHUNK_LINES = 10
+# Characters of a chunk returned as its snippet
+SNIPPET_CHARS = 2000
+# BM25 term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+# In an index of at least this many chunks, query terms found in more than half of them are ignored
+COMMON_TERM_MIN_CHUNKS = 1000
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_SUBWORD = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def terms(text: str) -> list:
+    """
+    The lowercase search terms of text: each identifier, and the words of identifiers written in
+    camelCase or snake_case, so "FileViewTracker" can be found by "file view" and vice versa.
+    """
+    found = []
+    for identifier in _IDENTIFIER.findall(text):
+        words = [word.lower() for word in _SUBWORD.findall(identifier)]
+        if len(words) > 1:
+            found.append(identifier.lower().strip("_"))
+        found.extend(word for word in words if len(word) > 1)
+    return found
+
+
+def chunk_lines(lines: list):
+    """(start, end) line slices of up to CHUNK_LINES lines, cut before top-level statements where possible."""
+    start = 0
+    for i in range(1, len(lines)):
+        size = i - start
+        top_level = lines[i][:1].strip() and not lines[i - 1].strip()
+        if size >= CHUNK_LINES or (size >= MIN_CHUNK_LINES and top_level):
+            yield start, i
+            start = i
+    if start < len(lines):
+        yield start, len(lines)
+
+
+class RelevanceIndex(FileIndex):
+    """
+    A persistent BM25 index of the chunks of the text files under a workspace root, for finding
+    the code most relevant to a description in one call. Each chunk is a run of lines, stored
+    with its term frequencies; the terms of a file's path count towards each of its chunks.
+    """
+    NAME = "relevance"
+
+    def _create_tables(self):
+        self.db.execute("CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, file_id INTEGER, start_line INTEGER, end_line INTEGER, length INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS chunks_by_file ON chunks (file_id)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT, chunk_id INTEGER, tf INTEGER, PRIMARY KEY (term, chunk_id)) WITHOUT ROWID")
+        self.db.execute("CREATE INDEX IF NOT EXISTS terms_by_chunk ON terms (chunk_id)")
+
+    def _add_content(self, file_id: int, relative_path: str, data: bytes):
+        lines = data.decode("utf-8", errors="replace").splitlines()
+        path_terms = Counter(terms(relative_path))
+        for start, end in chunk_lines(lines):
+            counts = Counter(terms("\n".join(lines[start:end])))
+            if not counts:
+                continue
+            counts.update(path_terms)
+            cursor = self.db.execute("INSERT INTO chunks (file_id, start_line, end_line, length) VALUES (?, ?, ?, ?)",
+                                     (file_id, start + 1, end, sum(counts.values())))
+            self.db.executemany("INSERT INTO terms (term, chunk_id, tf) VALUES (?, ?, ?)",
+                                ((term, cursor.lastrowid, tf) for term, tf in counts.items()))
+
+    def _remove_content(self, file_id: int):
+        self.db.execute("DELETE FROM terms WHERE chunk_id IN (SELECT id FROM chunks WHERE file_id = ?)", (file_id,))
+        self.db.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+
+    def _rank(self, query_terms: set, max_results: int) -> list:
+        """The best (score, chunk id) pairs for the query terms, best first."""
+        total, average_length = self.db.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+        if not total:
+            return []
+        frequencies = {term: self.db.execute("SELECT COUNT(*) FROM terms WHERE term = ?", (term,)).fetchone()[0]
+                       for term in query_terms}
+        # Terms in most chunks barely move the ranking but would cost a scan of most of the index
+        selective = [term for term, df in frequencies.items()
+                     if df and (total < COMMON_TERM_MIN_CHUNKS or df <= total / 2)]
+        scores = defaultdict(float)
+        for term in selective or [term for term, df in frequencies.items() if df]:
+            df = frequencies[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for chunk_id, tf, length in self.db.execute(
+                    "SELECT t.chunk_id, t.tf, c.length FROM terms t JOIN chunks c ON c.id = t.chunk_id WHERE t.term = ?", (term,)):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(max_results, ((score, chunk_id) for chunk_id, score in scores.items()))
+
+    def query(self, text: str, max_results: int = 5) -> dict:
+        """The chunks that best match text, best first, each with its path, line range, score and snippet."""
+        query_terms = set(terms(text))
+        with self.lock:
+            ranked = self._rank(query_terms, max_results)
+            chunks = [self.db.execute("SELECT f.path, c.start_line, c.end_line FROM chunks c JOIN files f ON f.id = c.file_id "
+                                      "WHERE c.id = ?", (chunk_id,)).fetchone() + (score,) for score, chunk_id in ranked]
+
+        results = []
+        for relative_path, start_line, end_line, score in chunks:
+            path = os.path.join(self.root, relative_path)
+            try:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    lines = f.read().splitlines()[start_line - 1:end_line]
+            except OSError:
+                continue
+            snippet = "\n".join(lines)
+            if len(snippet) > SNIPPET_CHARS:
+                snippet = snippet[:SNIPPET_CHARS] + "\n[... snippet truncated ...]"
+            results.append({"path": path, "start_line": start_line, "end_line": end_line,
+                            "score": round(score, 3), "snippet": snippet})
+        return {"results": results, "terms": sorted(query_terms)}
@@ -0,0 +1,286 @@
+import os
+import sys
+import time
+import random
+import threading
+import collections
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Extra attempts per model request after a rate limit, overload, 5xx or network error
+DEFAULT_RETRIES = 4
+BASE_DELAY = 0.5
+MAX_DELAY = 30.0
+# A server asking for a longer wait than this gets retried sooner; the attempt may fail again
+MAX_RETRY_AFTER = 60.0
+# Status codes worth retrying besides 5xx: request timeout, conflict, rate limit
+TRANSIENT_STATUS_CODES = (408, 409, 429)
+
+
+def is_api_error(error: Exception) -> bool:
+    """
+    Whether error came from the Anthropic SDK. The SDK is imported lazily (it takes most of a
+    second); if it hasn't been imported yet, nothing can have raised one of its errors.
+    """
+    anthropic = sys.modules.get("anthropic")
+    return anthropic is not None and isinstance(error, anthropic.APIError)
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed model request is worth retrying (overloads, rate limits, 5xx and network errors)."""
+    if not is_api_error(error):
+        return False
+    anthropic = sys.modules["anthropic"]
+    if isinstance(error, (anthropic.RateLimitError, anthropic.APIConnectionError)):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and (
+        error.status_code in TRANSIENT_STATUS_CODES or error.status_code >= 500)
+
+
+def retry_after(error: Exception):
+    """Seconds the server asked to wait before retrying (retry-after-ms or retry-after), or None."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after-ms")) / 1000)
+    except (TypeError, ValueError):
+        pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    import email.utils # Only needed for the rare HTTP-date form
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, error: Exception = None, base_delay: float = BASE_DELAY,
+                  max_delay: float = MAX_DELAY, rng=random) -> float:
+    """
+    Seconds to wait before retry number attempt + 1: "full jitter" exponential backoff, so clients
+    that failed together don't retry together. A retry-after from the server is a lower bound.
+    """
+    delay = rng.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+    hint = retry_after(error) if error is not None else None
+    if hint is not None:
+        delay = max(delay, min(hint, MAX_RETRY_AFTER))
+    return delay
+
+
+class ConcurrencyLimiter:
+    """
+    Allows at most limit model requests in flight at once. Shared by threads and event loops alike,
+    so one limiter can cover every agent in the process. Waiters are served in order.
+    """
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("The concurrency limit must be at least 1.")
+        self.limit = limit
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.waiters = collections.deque() # threading.Event, or (loop, Future) for coroutines
+
+    def acquire(self):
+        event = threading.Event()
+        with self.lock:
+            if self.in_flight < self.limit and not self.waiters:
+                self.in_flight += 1
+                return
+            self.waiters.append(event)
+        event.wait() # release() hands its slot over
+
+    async def acquire_async(self):
+        import asyncio # Already loaded by whoever awaits this; not needed by sync-only agents
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self.lock:
+            if self.in_flight < self.limit and not self.waiters:
+                self.in_flight += 1
+                return
+            self.waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self.lock:
+                queued = waiter in self.waiters
+                if queued:
+                    self.waiters.remove(waiter)
+            if not queued and future.done() and not future.cancelled():
+                self.release() # The slot arrived just as we were cancelled; pass it on
+            raise
+
+    def release(self):
+        with self.lock:
+            if not self.waiters:
+                self.in_flight -= 1
+                return
+            waiter = self.waiters.popleft()
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(self._hand_over, future)
+
+    def _hand_over(self, future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    @contextmanager
+    def hold(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def shared_limiter():
+    """The process-wide limiter configured by AGENT_MAX_CONCURRENT_REQUESTS, or None when unset."""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None and os.getenv("AGENT_MAX_CONCURRENT_REQUESTS"):
+            _shared_limiter = ConcurrencyLimiter(int(os.getenv("AGENT_MAX_CONCURRENT_REQUESTS")))
+        return _shared_limiter
+
+
+class ResilientCaller:
+    """
+    Runs model requests with retries and, optionally, hedging.
+    Transient failures are retried up to retries times with jittered exponential backoff that
+    honors retry-after. Each attempt holds a slot of the concurrency limiter, if there is one.
+    With hedge_after, a request that hasn't answered within that many seconds gets a second,
+    identical request, and whichever answers first wins. This trades extra tokens for tail
+    latency, so it is off by default. A losing async request is cancelled; a losing sync request
+    can't be interrupted, so it finishes in the background and its response is dropped.
+    Configured by AGENT_API_RETRIES, AGENT_HEDGE_AFTER and AGENT_MAX_CONCURRENT_REQUESTS.
+    """
+    def __init__(self, retries: int = None, hedge_after: float = None, limiter: ConcurrencyLimiter = None,
+                 base_delay: float = None, max_delay: float = None, rng=None):
+        if retries is None:
+            retries = int(os.getenv("AGENT_API_RETRIES", str(DEFAULT_RETRIES)))
+        if hedge_after is None:
+            hedge_after = float(os.getenv("AGENT_HEDGE_AFTER") or 0)
+        self.retries = retries
+        self.hedge_after = hedge_after if hedge_after and hedge_after > 0 else None
+        self.limiter = limiter if limiter is not None else shared_limiter()
+        self.base_delay = BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = MAX_DELAY if max_delay is None else max_delay
+        self.rng = rng or random.Random()
+        self.hedged_requests = 0
+        self.executor = None # Threads for sync hedging, created on first use
+        self.executor_lock = threading.Lock()
+
+    def _delay(self, attempt: int, error: Exception) -> float:
+        return backoff_delay(attempt, error, self.base_delay, self.max_delay, self.rng)
+
+    def _should_retry(self, attempt: int, error: Exception, retryable) -> bool:
+        return attempt < self.retries and is_transient(error) and (retryable is None or retryable(error))
+
+    def call(self, request, on_retry=None, hedge: bool = True, retryable=None):
+        """
+        Return request(), retrying transient failures. on_retry(attempt, delay, error) is called
+        before each retry; retryable(error) can veto one (e.g. once output has been shown).
+        """
+        attempt = 0
+        while True:
+            try:
+                if hedge and self.hedge_after:
+                    return self._hedged(request)
+                return self._limited(request)
+            except Exception as e:
+                if not self._should_retry(attempt, e, retryable):
+                    raise
+                delay = self._delay(attempt, e)
+                attempt += 1
+                if on_retry:
+                    on_retry(attempt, delay, e)
+                time.sleep(delay)
+
+    def _limited(self, request):
+        if self.limiter is None:
+            return request()
+        with self.limiter.hold():
+            return request()
+
+    def _hedged(self, request):
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+        first = self.executor.submit(self._limited, request)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self.hedged_requests += 1
+        pending = {first, self.executor.submit(self._limited, request)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def call_async(self, request, on_retry=None, hedge: bool = True, retryable=None):
+        """call() for coroutines: request is a function returning a new awaitable per attempt."""
+        import asyncio
+        attempt = 0
+        while True:
+            try:
+                if hedge and self.hedge_after:
+                    return await self._hedged_async(request)
+                return await self._limited_async(request)
+            except Exception as e:
+                if not self._should_retry(attempt, e, retryable):
+                    raise
+                delay = self._delay(attempt, e)
+                attempt += 1
+                if on_retry:
+                    on_retry(attempt, delay, e)
+                await asyncio.sleep(delay)
+
+    async def _limited_async(self, request):
+        if self.limiter is None:
+            return await request()
+        await self.limiter.acquire_async()
+        try:
+            return await request()
+        finally:
+            self.limiter.release()
+
+    async def _hedged_async(self, request):
+        import asyncio
+        tasks = [asyncio.ensure_future(self._limited_async(request))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if done:
+                return tasks[0].result()
+
+            self.hedged_requests += 1
+            tasks.append(asyncio.ensure_future(self._limited_async(request)))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,91 @@
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Tool kinds, used to decide which calls may overlap
+READ_ONLY = "read_only"      # Only reads the file system; safe to run alongside other reads
+MUTATING = "mutating"        # Changes the file at its 'path'
+INTERACTIVE = "interactive"  # Needs the terminal (e.g. a confirmation prompt); always runs alone
+
+
+def _target_path(tool_input: dict):
+    """The normalized path a tool call touches, or None if it doesn't name one."""
+    path = tool_input.get("path")
+    if path is None:
+        return None
+    return os.path.realpath(path or ".")
+
+
+class ConflictTracker:
+    """
+    Tracks the calls admitted so far and tells whether a new call may run alongside them.
+    A call conflicts when it is interactive, when an interactive call was already admitted,
+    or when it touches the same path as an admitted call and at least one of them mutates it.
+    A mutating call without a path could touch anything, so it conflicts with everything.
+    """
+    def __init__(self):
+        self.read_paths = set()
+        self.mutated_paths = set()
+        self.has_interactive = False
+        self.has_unscoped_mutation = False
+        self.count = 0
+
+    def conflicts(self, kind: str, tool_input: dict) -> bool:
+        if kind == INTERACTIVE or self.has_interactive:
+            return True
+        if self.has_unscoped_mutation:
+            return True
+        path = _target_path(tool_input)
+        if kind == MUTATING:
+            if path is None:
+                return self.count > 0
+            return path in self.read_paths or path in self.mutated_paths
+        return path is not None and path in self.mutated_paths
+
+    def add(self, kind: str, tool_input: dict):
+        self.count += 1
+        path = _target_path(tool_input)
+        if kind == INTERACTIVE:
+            self.has_interactive = True
+        elif kind == MUTATING:
+            if path is None:
+                self.has_unscoped_mutation = True
+            else:
+                self.mutated_paths.add(path)
+        elif path is not None:
+            self.read_paths.add(path)
+
+
+def plan_batches(tool_calls: list, kind_of) -> list:
+    """
+    Split tool calls into consecutive batches whose members may run concurrently.
+    Batches run one after another, so calls that conflict (see ConflictTracker) keep
+    their original relative order. kind_of maps a tool name to its kind.
+    """
+    batches = []
+    current = []
+    tracker = ConflictTracker()
+    for tool_call in tool_calls:
+        kind = kind_of(tool_call["name"])
+        if current and tracker.conflicts(kind, tool_call["input"]):
+            batches.append(current)
+            current = []
+            tracker = ConflictTracker()
+        current.append(tool_call)
+        tracker.add(kind, tool_call["input"])
+    if current:
+        batches.append(current)
+    return batches
+
+
+class ToolScheduler:
+    """Runs batches of independent tool calls on a shared thread pool."""
+    def __init__(self, max_workers: int = None):
+        if max_workers is None:
+            max_workers = int(os.getenv("AGENT_TOOL_WORKERS", "8"))
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+
+    def submit(self, fn, tool_call: dict):
+        """Start a single call in the background, in the caller's context; returns a Future for its result."""
+        return self.pool.submit(contextvars.copy_context().run, fn, tool_call["name"], tool_call["input"])
+
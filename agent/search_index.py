@@ -0,0 +1,207 @@
+import os
+import re
+import abc
+import time
+import hashlib
+import sqlite3
+import threading
+
+from .tools import list_files
+
+# Files larger than this are not indexed (and therefore not searched)
+MAX_INDEXED_BYTES = 1_000_000
+# Bound on the trigrams used to filter candidates, keeping long queries within SQLite's variable limit
+MAX_QUERY_TRIGRAMS = 64
+
+
+def default_index_path(root: str, name: str = "search") -> str:
+    """Where an index for a workspace root lives: one SQLite file per kind of index and root under AGENT_INDEX_DIR."""
+    index_dir = os.getenv("AGENT_INDEX_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "codeforge")
+    digest = hashlib.sha1(os.path.realpath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(index_dir, f"{name}-{digest}.sqlite3")
+
+
+def trigrams(data: bytes) -> set:
+    """The distinct lowercase 3-byte sequences in data."""
+    data = data.lower()
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+
+class FileIndex(abc.ABC):
+    """
+    A persistent index of the text files under a workspace root.
+    Each file is stored with its mtime and size; update() re-indexes only files whose
+    fingerprint changed, so keeping the index current costs one stat per file.
+    Subclasses create their tables in _create_tables() and keep them in step with the files
+    through _add_content() and _remove_content().
+    """
+    NAME = None # Kind of index, which names its file
+
+    def __init__(self, root: str, index_path: str = None):
+        self.root = root
+        self.index_path = index_path or default_index_path(root, self.NAME)
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime_ns INTEGER, size INTEGER)")
+        self._create_tables()
+        self.db.commit()
+
+    @abc.abstractmethod
+    def _create_tables(self):
+        """Create the subclass's tables if they don't exist yet."""
+
+    @abc.abstractmethod
+    def _add_content(self, file_id: int, relative_path: str, data: bytes):
+        """Index data, the content of the file stored as file_id."""
+
+    @abc.abstractmethod
+    def _remove_content(self, file_id: int):
+        """Drop everything indexed for file_id."""
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def update(self) -> dict:
+        """Bring the index in line with the file system. Returns counts of indexed and removed files."""
+        with self.lock:
+            known = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size
+                     in self.db.execute("SELECT id, path, mtime_ns, size FROM files")}
+            seen = set()
+            indexed = 0
+            for relative_path, entry_type, _size in list_files.walk(self.root, list_files.MAX_WALK_DEPTH, sizes=False):
+                if entry_type != "file":
+                    continue
+                try:
+                    stat_result = os.stat(os.path.join(self.root, relative_path))
+                except OSError:
+                    continue
+                if stat_result.st_size > MAX_INDEXED_BYTES:
+                    continue
+                seen.add(relative_path)
+                previous = known.get(relative_path)
+                if previous and previous[1] == stat_result.st_mtime_ns and previous[2] == stat_result.st_size:
+                    continue
+                self._index_file(relative_path, stat_result, previous[0] if previous else None)
+                indexed += 1
+
+            removed = [file_id for path, (file_id, _mtime, _size) in known.items() if path not in seen]
+            for file_id in removed:
+                self._remove_content(file_id)
+                self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            self.db.commit()
+            return {"indexed": indexed, "removed": len(removed)}
+
+    def _index_file(self, relative_path: str, stat_result, file_id):
+        try:
+            with open(os.path.join(self.root, relative_path), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if file_id is None:
+            cursor = self.db.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                                     (relative_path, stat_result.st_mtime_ns, stat_result.st_size))
+            file_id = cursor.lastrowid
+        else:
+            self.db.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                            (stat_result.st_mtime_ns, stat_result.st_size, file_id))
+            self._remove_content(file_id)
+        # Binary files are recorded (so they aren't re-read every update) but get no content
+        if b"\0" not in data[:8192]:
+            self._add_content(file_id, relative_path, data)
+
+
+class SearchIndex(FileIndex):
+    """
+    A persistent trigram index of the text files under a workspace root.
+    A literal query only needs to scan the files that contain all of its trigrams.
+    """
+    NAME = "search"
+
+    def _create_tables(self):
+        self.db.execute("CREATE TABLE IF NOT EXISTS postings (trigram BLOB, file_id INTEGER, PRIMARY KEY (trigram, file_id)) WITHOUT ROWID")
+        self.db.execute("CREATE INDEX IF NOT EXISTS postings_by_file ON postings (file_id)")
+
+    def _add_content(self, file_id: int, relative_path: str, data: bytes):
+        self.db.executemany("INSERT INTO postings (trigram, file_id) VALUES (?, ?)",
+                            ((gram, file_id) for gram in trigrams(data)))
+
+    def _remove_content(self, file_id: int):
+        self.db.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+
+    def candidates(self, literal: str = None) -> list:
+        """Relative paths of indexed files that may contain literal (every text file when literal is None or short)."""
+        with self.lock:
+            # Any subset of the trigrams still yields a superset of the matching files
+            grams = sorted(trigrams(literal.encode("utf-8")))[:MAX_QUERY_TRIGRAMS] if literal else []
+            if not grams:
+                rows = self.db.execute("SELECT path FROM files WHERE id IN (SELECT DISTINCT file_id FROM postings) ORDER BY path")
+            else:
+                placeholders = ",".join("?" * len(grams))
+                rows = self.db.execute(
+                    f"SELECT path FROM files WHERE id IN (SELECT file_id FROM postings WHERE trigram IN ({placeholders}) "
+                    f"GROUP BY file_id HAVING COUNT(*) = ?) ORDER BY path",
+                    (*grams, len(grams)))
+            return [row[0] for row in rows]
+
+    def search(self, query: str, regex: bool = False, case_sensitive: bool = False,
+               max_results: int = 50, context_lines: int = 2) -> dict:
+        """Find lines matching query. Returns up to max_results matches with line numbers and context."""
+        flags = 0 if case_sensitive else re.IGNORECASE
+        pattern = re.compile(query if regex else re.escape(query), flags)
+        # Regular expressions have no guaranteed literal, so they are checked against every file.
+        # The index folds ASCII case only, so case-insensitive non-ASCII queries can't be filtered either.
+        filterable = not regex and (case_sensitive or query.isascii())
+        paths = self.candidates(query if filterable else None)
+
+        matches = []
+        truncated = False
+        for relative_path in paths:
+            try:
+                with open(os.path.join(self.root, relative_path), 'r', encoding='utf-8', errors='replace') as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                continue
+            for i, line in enumerate(lines):
+                if not pattern.search(line):
+                    continue
+                if len(matches) >= max_results:
+                    truncated = True
+                    break
+                first = max(0, i - context_lines)
+                last = min(len(lines), i + context_lines + 1)
+                snippet = "\n".join(f"{n + 1}{':' if n == i else '-'} {lines[n]}" for n in range(first, last))
+                matches.append({"path": os.path.join(self.root, relative_path), "line": i + 1, "snippet": snippet})
+            if truncated:
+                break
+        return {"matches": matches, "truncated": truncated, "candidate_files": len(paths)}
+
+
+_indexes = {} # (kind of index, realpath of root) -> [index, monotonic time of last update]
+_indexes_lock = threading.Lock()
+# An index updated within this many seconds is trusted without re-checking fingerprints
+REFRESH_INTERVAL = 2.0
+
+
+def get_index(root: str, index_class=SearchIndex) -> FileIndex:
+    """The process-wide index of this class for root, brought up to date unless it was refreshed very recently."""
+    key = (index_class.NAME, os.path.realpath(root))
+    with _indexes_lock:
+        entry = _indexes.get(key)
+        if entry is None:
+            entry = [index_class(root), 0.0]
+            _indexes[key] = entry
+    if time.monotonic() - entry[1] > REFRESH_INTERVAL:
+        entry[0].update()
+        entry[1] = time.monotonic()
+    return entry[0]
+
+
+def invalidate():
+    """Force the next use of every index to re-check file fingerprints (after edits or shell commands)."""
+    with _indexes_lock:
+        for entry in _indexes.values():
+            entry[1] = 0.0
@@ -0,0 +1,697 @@
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import uuid
+import base64
+import struct
+import asyncio
+import hashlib
+import contextvars
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+from .async_agent import AsyncAgent
+from .journal import SessionJournal, prune_sessions
+from .tracing import Tracer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_MAX_SESSIONS = 64
+# Tool calls one session may run at once; sessions share the process, so this is well below AGENT_TOOL_WORKERS
+DEFAULT_SESSION_TOOL_WORKERS = 2
+DEFAULT_SESSION_CACHE_BYTES = 1_000_000
+DEFAULT_IDLE_TIMEOUT = 1800.0
+# A shell command nobody approves within this many seconds is declined
+DEFAULT_APPROVAL_TIMEOUT = 300.0
+MAX_HEADER_BYTES = 65536
+MAX_BODY_BYTES = 1_000_000
+# Events a client may fall behind by before it is disconnected, so a stalled client can't hold unbounded memory
+MAX_QUEUED_EVENTS = 10000
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SESSION_ID = re.compile(r"[0-9a-f]{12}")
+
+_current_session = contextvars.ContextVar("current_session", default=None)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SessionOutput:
+    """
+    Stands in for sys.stdout (or stderr) while serving: what a session prints, from its turn or
+    its tool threads, becomes "output" events for that session's clients. Anything else goes to
+    the real stream.
+    """
+    def __init__(self, stream, name: str = "stdout"):
+        self.stream = stream
+        self.name = name
+
+    def write(self, text: str):
+        session = _current_session.get()
+        if session is None:
+            return self.stream.write(text)
+        if text:
+            session.emit({"type": "output", "stream": self.name, "text": text})
+        return len(text)
+
+    def flush(self):
+        if _current_session.get() is None:
+            self.stream.flush()
+
+    def isatty(self) -> bool:
+        return _current_session.get() is None and self.stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class ServerSession(AsyncAgent):
+    """
+    One client conversation in the server. Events (text as it streams, tool calls and results,
+    approval requests, output and the end of each turn) go to every subscribed client. Shell
+    commands wait for an approval message instead of the terminal. One turn runs at a time.
+    Memory is bounded per session by the history token budget, the tool result cache and the
+    number of queued events per client; concurrency by its own small pool of tool workers.
+    """
+    def __init__(self, client, workspace: str = None, tracer: Tracer = None, tool_workers: int = DEFAULT_SESSION_TOOL_WORKERS,
+                 token_budget: int = None, cache_bytes: int = DEFAULT_SESSION_CACHE_BYTES,
+                 approval_timeout: float = DEFAULT_APPROVAL_TIMEOUT):
+        super().__init__(client, workspace, tracer, tool_workers, token_budget, cache_bytes)
+        self.streaming = True # Clients see text as it arrives
+        self.approval_timeout = approval_timeout
+        self.loop = asyncio.get_running_loop()
+        self.subscribers = set() # asyncio.Queue per connected client
+        self.approvals = {} # approval id -> Future of the answer
+        self.taking_approvals = False # Only while a turn runs; a cancelled turn's commands are declined
+        self.turn = None # Task of the turn in progress
+        self.errors = []
+        self.last_active = time.monotonic()
+
+    @property
+    def busy(self) -> bool:
+        return self.turn is not None and not self.turn.done()
+
+    def describe(self) -> dict:
+        return {"session": self.session_id, "workspace": self.workspace, "busy": self.busy,
+                "messages": len(self.conversation_history), "idle_seconds": round(time.monotonic() - self.last_active, 1)}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def emit(self, event: dict):
+        """Send event to the session's clients. Safe to call from tool threads."""
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(event)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: dict):
+        event = dict(event, session=self.session_id)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind: make room for the None that tells the client's writer to give up
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def read_input(self, prompt: str) -> str:
+        raise RuntimeError("Server sessions take their input from clients.")
+
+    async def confirm_command(self, command: str) -> bool:
+        if not self.taking_approvals:
+            return False
+        approval_id = uuid.uuid4().hex[:8]
+        answer = self.loop.create_future()
+        self.approvals[approval_id] = answer
+        self.emit({"type": "approval_request", "id": approval_id, "command": command, "timeout": self.approval_timeout})
+        try:
+            approved = await asyncio.wait_for(answer, self.approval_timeout)
+        except asyncio.TimeoutError:
+            approved = False
+        finally:
+            self.approvals.pop(approval_id, None)
+        self.emit({"type": "approval_result", "id": approval_id, "approved": approved})
+        return approved
+
+    def approve(self, approval_id: str, approved: bool) -> bool:
+        """Answer a pending approval request. Returns False if there is no such request (any more)."""
+        answer = self.approvals.get(approval_id)
+        if answer is None or answer.done() or not self.taking_approvals:
+            return False
+        answer.set_result(bool(approved))
+        return True
+
+    def _handle_stream_event(self, event, state: dict, loading):
+        if event.type == "content_block_delta" and event.delta.type == "text_delta":
+            self.emit({"type": "text", "text": event.delta.text})
+        super()._handle_stream_event(event, state, loading)
+
+    def _print_tool_call(self, tool_name: str, tool_input: dict):
+        self.emit({"type": "tool_call", "name": tool_name, "input": tool_input})
+        super()._print_tool_call(tool_name, tool_input)
+
+    def _print_tool_result(self, tool_name: str, result):
+        self.emit({"type": "tool_result", "name": tool_name, "result": result})
+        super()._print_tool_result(tool_name, result)
+
+    def _print_error(self, title: str, error: Exception):
+        self.errors.append(f"{title}: {error}")
+        self.emit({"type": "error", "title": title, "message": str(error)})
+        super()._print_error(title, error)
+
+    def start_turn(self, user_input: str) -> asyncio.Task:
+        if self.busy:
+            raise HTTPError(409, f"Session {self.session_id} is already running a turn.")
+        self.turn = self.loop.create_task(self._run_turn(user_input))
+        return self.turn
+
+    async def _run_turn(self, user_input: str):
+        _current_session.set(self) # The task's own context: routes its output, and its tools', to this session
+        self.errors = []
+        self.last_active = time.monotonic()
+        self.emit({"type": "turn_started", "message": user_input})
+        self.taking_approvals = True
+        status = "error"
+        try:
+            await self.run_turn(user_input)
+            status = "error" if self.errors else "success"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            self._decline_approvals()
+            raise
+        finally:
+            self.taking_approvals = False
+            self.last_active = time.monotonic()
+            self.emit({"type": "turn_finished", "status": status, "reply": self.final_reply() if status != "cancelled" else "",
+                       "errors": list(self.errors), "usage": dict(self.usage_totals)})
+
+    def cancel_turn(self) -> bool:
+        if not self.busy:
+            return False
+        self._decline_approvals() # Now: the turn may not see its cancellation before a stale approval arrives
+        self.turn.cancel()
+        return True
+
+    def _decline_approvals(self):
+        """Answer every pending approval as declined, and take no more until the next turn."""
+        self.taking_approvals = False
+        for answer in self.approvals.values():
+            if not answer.done():
+                answer.set_result(False)
+        self.approvals.clear()
+
+    def _close_journal(self):
+        self._flush_journal()
+        if self.journal is not None:
+            self.journal.close()
+
+    def close(self):
+        """Stop the session: cancel its turn, decline pending approvals and release its shell, prefetcher, spool, journal and threads."""
+        cancelled = self.cancel_turn()
+        self._decline_approvals()
+        if self.shell_session is not None:
+            self.shell_session.close()
+        self.prefetcher.close()
+        self.spool.close()
+        if cancelled: # The cancelled turn saves the history it restores, then the journal can close
+            self.turn.add_done_callback(lambda turn: self._close_journal())
+        else:
+            self._close_journal()
+        self.scheduler.pool.shutdown(wait=False)
+        self._deliver({"type": "session_closed"})
+        for queue in list(self.subscribers):
+            self.unsubscribe(queue)
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+
+class SessionPool:
+    """
+    The server's sessions. They share one client, and so one pool of keep-alive connections, and
+    one tracer. At most max_sessions are open; idle sessions are closed after idle_timeout seconds,
+    and the oldest idle one makes room for a new session. With journaling on (AGENT_JOURNAL),
+    a closed session comes back from its journal when a client asks for it again.
+    """
+    def __init__(self, client, max_sessions: int = None, tool_workers: int = None, token_budget: int = None,
+                 cache_bytes: int = None, idle_timeout: float = None, approval_timeout: float = None,
+                 journal: bool = None, tracer: Tracer = None):
+        self.client = client
+        self.max_sessions = max_sessions or int(os.getenv("AGENT_SERVER_MAX_SESSIONS", str(DEFAULT_MAX_SESSIONS)))
+        self.session_options = {
+            "tool_workers": tool_workers or int(os.getenv("AGENT_SERVER_SESSION_WORKERS", str(DEFAULT_SESSION_TOOL_WORKERS))),
+            "token_budget": token_budget or (int(os.getenv("AGENT_SERVER_SESSION_TOKENS")) if os.getenv("AGENT_SERVER_SESSION_TOKENS") else None),
+            "cache_bytes": cache_bytes or int(os.getenv("AGENT_SERVER_SESSION_CACHE_BYTES", str(DEFAULT_SESSION_CACHE_BYTES))),
+            "approval_timeout": approval_timeout or float(os.getenv("AGENT_SERVER_APPROVAL_TIMEOUT", str(DEFAULT_APPROVAL_TIMEOUT))),
+        }
+        self.idle_timeout = idle_timeout or float(os.getenv("AGENT_SERVER_IDLE_TIMEOUT", str(DEFAULT_IDLE_TIMEOUT)))
+        if journal is None:
+            journal = os.getenv("AGENT_JOURNAL", "").lower() in ("1", "true", "yes")
+        self.journal = journal
+        if journal:
+            prune_sessions()
+        self.tracer = tracer or Tracer()
+        self.sessions = {}
+
+    def _new_session(self, workspace: str = None) -> ServerSession:
+        if len(self.sessions) >= self.max_sessions and not self._evict_one():
+            raise HTTPError(503, f"All {self.max_sessions} sessions are busy; try again later.")
+        return ServerSession(self.client, workspace, self.tracer, **self.session_options)
+
+    def create(self, workspace: str = None) -> ServerSession:
+        if workspace is not None and not os.path.isdir(workspace):
+            raise HTTPError(400, f"Workspace '{workspace}' is not a directory.")
+        session = self._new_session(workspace)
+        if self.journal:
+            session.use_journal(SessionJournal.create(session.session_id, workspace=session.workspace, model=session.model_name))
+        self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str) -> ServerSession:
+        session = self.sessions.get(session_id)
+        if session is None and self.journal and SESSION_ID.fullmatch(session_id or ""):
+            try:
+                journal = SessionJournal.open(session_id)
+            except FileNotFoundError:
+                journal = None
+            if journal is not None and journal.session_id == session_id:
+                workspace = journal.meta.get("workspace")
+                session = self._new_session(workspace if workspace and os.path.isdir(workspace) else None)
+                session.use_journal(journal)
+                self.sessions[session_id] = session
+        if session is None:
+            raise HTTPError(404, f"No session '{session_id}'.")
+        session.last_active = time.monotonic()
+        return session
+
+    def close(self, session_id: str):
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            raise HTTPError(404, f"No session '{session_id}'.")
+        session.close()
+
+    def _evict_one(self) -> bool:
+        idle = [session for session in self.sessions.values() if not session.busy and not session.subscribers]
+        if not idle:
+            return False
+        self.close(min(idle, key=lambda session: session.last_active).session_id)
+        return True
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for session in list(self.sessions.values()):
+            if not session.busy and not session.approvals and now - session.last_active > self.idle_timeout:
+                self.close(session.session_id)
+
+    async def reap(self):
+        """Close idle sessions periodically, for as long as the server runs."""
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_timeout / 2))
+            self.evict_idle()
+
+    def close_all(self):
+        for session_id in list(self.sessions):
+            self.close(session_id)
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: dict, body: bytes):
+        self.method = method
+        url = urlsplit(target)
+        self.path = url.path.rstrip("/") or "/"
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            payload = json.loads(self.body.decode("utf-8"))
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON body: {e}")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "The JSON body must be an object.")
+        return payload
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """The next request on a connection, or None once the client has closed it."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "Request headers too large.")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line.")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "Chunked request bodies are not supported; send a Content-Length.")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length.")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"Request bodies are limited to {MAX_BODY_BYTES} bytes.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, headers, body)
+
+
+def response_head(status: int, headers: dict) -> bytes:
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"] + [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _encode_event(event: dict) -> bytes:
+    return json.dumps(event, ensure_ascii=False, default=str).encode("utf-8")
+
+
+class WebSocket:
+    """The server end of an RFC 6455 connection: text messages in and out, pings answered, no extensions."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock() # Frames from different tasks must not interleave
+        self.closed = False
+
+    @staticmethod
+    def accept_key(key: str) -> str:
+        return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+
+    @staticmethod
+    def _unmask(payload: bytes, mask: bytes) -> bytes:
+        if not payload:
+            return payload
+        repeated = (mask * (len(payload) // 4 + 1))[:len(payload)]
+        return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+    async def _send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        async with self.lock:
+            self.writer.write(header + payload)
+            await self.writer.drain()
+
+    async def send(self, text: str):
+        await self._send_frame(0x1, text.encode("utf-8"))
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self._send_frame(0x8, struct.pack(">H", code) + reason.encode("utf-8")[:120])
+        except (ConnectionError, RuntimeError):
+            pass
+
+    async def _read_frame(self):
+        first, second = await self.reader.readexactly(2)
+        if not second & 0x80: # RFC 6455 5.1: the server must fail the connection on an unmasked client frame
+            raise HTTPError(400, "Client frames must be masked.")
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", await self.reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", await self.reader.readexactly(8))[0]
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Message too large.")
+        mask = await self.reader.readexactly(4)
+        payload = await self.reader.readexactly(length)
+        return bool(first & 0x80), first & 0x0F, self._unmask(payload, mask)
+
+    async def receive(self):
+        """The next text message, or None once the connection is closed."""
+        message = b""
+        while not self.closed:
+            try:
+                final, opcode, payload = await self._read_frame()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                return None
+            except HTTPError as e:
+                await self.close(1009 if e.status == 413 else 1002, str(e)) # Too large, or a protocol error
+                return None
+            if opcode == 0x8:
+                await self.close()
+                return None
+            if opcode == 0x9:
+                await self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if len(message) > MAX_BODY_BYTES:
+                await self.close(1009, "Message too large.")
+                return None
+            if final:
+                return message.decode("utf-8", errors="replace")
+        return None
+
+
+class AgentServer:
+    """
+    The HTTP and WebSocket API in front of a SessionPool. Plain asyncio streams, so it needs no
+    web framework. With a token, every request must carry it as "Authorization: Bearer <token>"
+    (or ?token=, for browsers opening a WebSocket).
+
+    GET    /health                              status and session counts
+    GET    /sessions                            list sessions
+    POST   /sessions                            {"workspace"?} -> new session
+    DELETE /sessions/<id>                       close a session
+    POST   /sessions/<id>/messages              {"message"} -> the turn's events as NDJSON, until turn_finished
+    POST   /sessions/<id>/approvals/<approval>  {"approve": bool} -> answer a shell command approval
+    POST   /sessions/<id>/cancel                cancel the turn in progress
+    GET    /sessions/<id>/ws                    WebSocket: every event of the session; send
+                                                {"type": "message", "message"}, {"type": "approval", "id", "approve"}
+                                                or {"type": "cancel"}
+    """
+    def __init__(self, pool: SessionPool, token: str = None):
+        self.pool = pool
+        self.token = token
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+
+    def _check_token(self, request: Request):
+        if not self.token:
+            return
+        supplied = request.headers.get("authorization", "")
+        supplied = supplied[len("Bearer "):] if supplied.startswith("Bearer ") else request.query.get("token", "")
+        if not hmac.compare_digest(supplied.encode("utf-8"), self.token.encode("utf-8")):
+            raise HTTPError(401, "Missing or wrong token.")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    self._check_token(request)
+                    keep_alive = await self.dispatch(request, reader, writer)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool = True) -> bool:
+        body = _encode_event(payload)
+        writer.write(response_head(status, {"Content-Type": "application/json", "Content-Length": len(body),
+                                            "Connection": "keep-alive" if keep_alive else "close"}) + body)
+        await writer.drain()
+        return keep_alive
+
+    async def dispatch(self, request: Request, reader, writer) -> bool:
+        """Handle one request; returns whether the connection can take another."""
+        parts = [part for part in request.path.split("/") if part]
+        route = (request.method, len(parts), parts[0] if parts else "", parts[2] if len(parts) > 2 else None)
+        if route[:3] == ("GET", 1, "health"):
+            busy = sum(session.busy for session in self.pool.sessions.values())
+            return await self._send_json(writer, 200, {"status": "ok", "sessions": len(self.pool.sessions), "busy_sessions": busy},
+                                         request.keep_alive)
+        if parts[:1] != ["sessions"]:
+            raise HTTPError(404, f"No route for {request.method} {request.path}.")
+        if route[:2] == ("GET", 1):
+            return await self._send_json(writer, 200, {"sessions": [session.describe() for session in self.pool.sessions.values()]},
+                                         request.keep_alive)
+        if route[:2] == ("POST", 1):
+            workspace = request.json().get("workspace")
+            session = self.pool.create(os.path.abspath(workspace) if workspace else None)
+            return await self._send_json(writer, 201, session.describe(), request.keep_alive)
+        if len(parts) < 2:
+            raise HTTPError(405, f"{request.method} is not allowed on /sessions.")
+
+        if route[:2] == ("DELETE", 2):
+            self.pool.close(parts[1])
+            return await self._send_json(writer, 200, {"session": parts[1], "closed": True}, request.keep_alive)
+        session = self.pool.get(parts[1])
+        if route == ("GET", 2, "sessions", None):
+            return await self._send_json(writer, 200, session.describe(), request.keep_alive)
+        if route == ("POST", 3, "sessions", "messages"):
+            return await self._stream_turn(session, request, writer)
+        if route == ("POST", 4, "sessions", "approvals"):
+            if not session.approve(parts[3], bool(request.json().get("approve"))):
+                raise HTTPError(404, f"No pending approval '{parts[3]}'.")
+            return await self._send_json(writer, 200, {"id": parts[3], "answered": True}, request.keep_alive)
+        if route == ("POST", 3, "sessions", "cancel"):
+            return await self._send_json(writer, 200, {"cancelled": session.cancel_turn()}, request.keep_alive)
+        if route == ("GET", 3, "sessions", "ws"):
+            await self._websocket(session, request, reader, writer)
+            return False
+        raise HTTPError(404, f"No route for {request.method} {request.path}.")
+
+    @staticmethod
+    def _message(payload: dict) -> str:
+        message = payload.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(400, "A non-empty 'message' string is required.")
+        return message
+
+    async def _stream_turn(self, session: ServerSession, request: Request, writer) -> bool:
+        """Run a turn and stream its events as NDJSON with chunked encoding. The turn keeps going if the client leaves."""
+        message = self._message(request.json())
+        queue = session.subscribe()
+        try:
+            session.start_turn(message)
+        except HTTPError:
+            session.unsubscribe(queue)
+            raise
+        try:
+            writer.write(response_head(200, {"Content-Type": "application/x-ndjson", "Transfer-Encoding": "chunked",
+                                             "Cache-Control": "no-cache", "Connection": "close"}))
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                line = _encode_event(event) + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+                await writer.drain()
+                if event["type"] in ("turn_finished", "session_closed"):
+                    break
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            session.unsubscribe(queue)
+        return False
+
+    async def _websocket(self, session: ServerSession, request: Request, reader, writer):
+        key = request.headers.get("sec-websocket-key")
+        if request.headers.get("upgrade", "").lower() != "websocket" or not key:
+            raise HTTPError(426, "This endpoint needs a WebSocket upgrade.")
+        writer.write(response_head(101, {"Upgrade": "websocket", "Connection": "Upgrade",
+                                         "Sec-WebSocket-Accept": WebSocket.accept_key(key)}))
+        await writer.drain()
+        socket = WebSocket(reader, writer)
+        queue = session.subscribe()
+
+        async def forward_events():
+            while True:
+                event = await queue.get()
+                if event is None:
+                    await socket.close(1008 if session.session_id in self.pool.sessions else 1001, "Stopped")
+                    return
+                await socket.send(_encode_event(event).decode("utf-8"))
+
+        forwarder = asyncio.ensure_future(forward_events())
+        try:
+            await socket.send(json.dumps(dict(session.describe(), type="session")))
+            while True:
+                text = await socket.receive()
+                if text is None:
+                    break
+                await self._handle_client_message(session, socket, text)
+        finally:
+            session.unsubscribe(queue)
+            forwarder.cancel()
+            await socket.close()
+
+    async def _handle_client_message(self, session: ServerSession, socket: WebSocket, text: str):
+        try:
+            payload = json.loads(text)
+            kind = payload.get("type") if isinstance(payload, dict) else None
+            if kind == "message":
+                session.start_turn(self._message(payload))
+            elif kind == "approval":
+                if not session.approve(str(payload.get("id")), bool(payload.get("approve"))):
+                    raise HTTPError(404, f"No pending approval '{payload.get('id')}'.")
+            elif kind == "cancel":
+                session.cancel_turn()
+            else:
+                raise HTTPError(400, "Expected a message of type 'message', 'approval' or 'cancel'.")
+        except ValueError as e:
+            await socket.send(json.dumps({"type": "error", "title": "Bad request", "message": f"Invalid JSON: {e}"}))
+        except HTTPError as e:
+            await socket.send(json.dumps({"type": "error", "title": HTTPStatus(e.status).phrase, "message": str(e)}))
+
+
+def create_client():
+    """The AsyncAnthropic client every session shares, from ANTHROPIC_API_KEY."""
+    import anthropic
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise ValueError("ANTHROPIC_API_KEY not found in environment variables. Please set it in your .env file or system environment.")
+    return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0) # Retries go through each session's ResilientCaller
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, client=None, token: str = None):
+    """Serve agent sessions until cancelled."""
+    pool = SessionPool(client or create_client())
+    server = AgentServer(pool, token if token is not None else os.getenv("AGENT_SERVER_TOKEN"))
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = SessionOutput(stdout, "stdout"), SessionOutput(stderr, "stderr")
+    listener = await server.start(host, port)
+    reaper = asyncio.ensure_future(pool.reap())
+    print(f"🌐 Serving agent sessions on http://{host}:{port}", file=stderr)
+    if not server.token and host not in ("127.0.0.1", "localhost", "::1"):
+        print("⚠️ No AGENT_SERVER_TOKEN is set: anyone who can reach this port can use the agent.", file=stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        reaper.cancel()
+        pool.close_all()
+        if pool.tracer.enabled:
+            print(pool.tracer.format_summary(), file=stderr)
+        pool.tracer.close()
+        sys.stdout, sys.stderr = stdout, stderr
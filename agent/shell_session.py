@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+import uuid
+import shlex
+import codecs
+import threading
+import subprocess
+import contextvars
+
+from .tools.run_shell_command import BoundedCapture, DEFAULT_TIMEOUT, KILL_GRACE_SECONDS, _kill_process_group
+
+
+def _pump_until(stream, marker: bytes, capture: BoundedCapture, echo_to, outcome: dict, key: str):
+    """
+    Copy a shell stream into capture (echoing it live) until marker appears.
+    Whatever follows the marker on its line is stored in outcome[key]; None means the shell exited first.
+    Bytes that could be the start of the marker are held back, so the marker itself is never echoed.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    fd = stream.fileno()
+    pending = b""
+    found = False
+
+    def emit(data):
+        if data:
+            capture.feed(data)
+            if echo_to is not None:
+                echo_to.write(decoder.decode(data))
+                echo_to.flush()
+
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            emit(pending)
+            outcome[key] = None
+            return
+        pending += chunk
+        if not found:
+            index = pending.find(marker)
+            if index == -1:
+                keep = len(marker) - 1
+                emit(pending[:-keep])
+                pending = pending[-keep:]
+                continue
+            emit(pending[:index])
+            pending = pending[index + len(marker):]
+            found = True
+        if b"\n" in pending:
+            outcome[key] = pending.split(b"\n", 1)[0].decode('utf-8', errors='replace').strip()
+            return
+
+
+class ShellSession:
+    """
+    A long-lived bash process that commands are sent to one at a time.
+    The working directory, exported variables, activated virtualenvs and shell caches persist between
+    commands. Each command is followed by a unique sentinel on both output streams, carrying its exit
+    status and the shell's working directory, which marks where its output ends.
+    If the shell exits or a command times out, the next command starts a fresh shell.
+    """
+    def __init__(self, cwd: str = None, shell: str = "/bin/bash"):
+        self.cwd = cwd
+        self.shell = shell
+        self.process = None
+        self.starts = 0
+        self.lock = threading.Lock()
+
+    def _ensure_started(self) -> bool:
+        """Start the shell if it isn't running. Returns True when a previous shell had to be replaced."""
+        if self.process is not None and self.process.poll() is None:
+            return False
+        self.starts += 1
+        self.process = subprocess.Popen(
+            [self.shell, "--noprofile", "--norc"], cwd=self.cwd,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            start_new_session=True # Own process group, so a timeout can kill the shell and its children
+        )
+        return self.starts > 1
+
+    def _discard(self):
+        """Kill the current shell (if still running) and release its pipes."""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            _kill_process_group(self.process)
+            self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        self.process = None
+
+    def close(self):
+        with self.lock:
+            self._discard()
+
+    def run(self, command: str, timeout: float = None, echo: bool = True) -> dict:
+        """Run command in the session. Returns the same fields as run_shell_command.run_command, plus cwd."""
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+        with self.lock:
+            restarted = self._ensure_started()
+            marker = f"__codeforge_done_{uuid.uuid4().hex}__".encode("ascii")
+            started = time.monotonic()
+            # eval keeps cd/export effects in this shell, and turns a syntax error into a failed command
+            # instead of leaving the shell waiting for the rest of an unterminated quote
+            script = (
+                f"eval {shlex.quote(command)} < /dev/null\n"
+                "__codeforge_status=$?\n"
+                f"printf '%s %s %s\\n' '{marker.decode()}' \"$__codeforge_status\" \"$PWD\"\n"
+                f"printf '%s\\n' '{marker.decode()}' >&2\n"
+            )
+            stdout, stderr = BoundedCapture(), BoundedCapture()
+            outcome = {}
+            pumps = [
+                threading.Thread(target=contextvars.copy_context().run, args=(_pump_until, self.process.stdout, marker, stdout, sys.stdout if echo else None, outcome, "stdout"), daemon=True),
+                threading.Thread(target=contextvars.copy_context().run, args=(_pump_until, self.process.stderr, marker, stderr, sys.stderr if echo else None, outcome, "stderr"), daemon=True),
+            ]
+            for pump in pumps:
+                pump.start()
+            try:
+                self.process.stdin.write(script.encode("utf-8"))
+                self.process.stdin.flush()
+            except BrokenPipeError:
+                pass # The shell died; the pumps will see EOF
+
+            deadline = started + timeout
+            for pump in pumps:
+                pump.join(timeout=max(0.0, deadline - time.monotonic()))
+            timed_out = any(pump.is_alive() for pump in pumps)
+            if timed_out:
+                _kill_process_group(self.process)
+                self.process.wait()
+                for pump in pumps:
+                    pump.join(timeout=KILL_GRACE_SECONDS)
+
+            status_line = outcome.get("stdout")
+            if status_line:
+                exit_code_text, _, cwd = status_line.partition(" ")
+                exit_code = int(exit_code_text)
+            else:
+                # No sentinel: the command ended the shell (e.g. `exit 3`) or was killed
+                exit_code = self.process.wait()
+                cwd = None
+                self._discard() # Start a fresh shell next time
+
+            result = {
+                "exit_code": exit_code,
+                "timed_out": timed_out,
+                "duration_seconds": round(time.monotonic() - started, 3),
+                "stdout": stdout.text(),
+                "stderr": stderr.text(),
+                "stdout_dropped_bytes": stdout.dropped,
+                "stderr_dropped_bytes": stderr.dropped,
+                "cwd": cwd,
+            }
+            if restarted:
+                # Earlier cd/export state is gone; tell the model
+                result["session_restarted"] = True
+            return result
@@ -0,0 +1,88 @@
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+
+# Tool result fields longer than this many characters are spooled to disk instead of kept in the history
+SPOOL_THRESHOLD = int(os.getenv("AGENT_SPOOL_CHARS", "20000"))
+# Characters of a spooled field kept in the history from its start and from its end
+PREVIEW_CHARS = 2000
+
+_HANDLE = re.compile(r"^[0-9a-f]{12}$")
+
+
+class OutputSpool:
+    """
+    A session's scratch directory for tool output too large to keep in the conversation.
+    spool() moves each oversized string field of a tool result into a file and leaves its head,
+    its tail and a handle in its place; read_output pages through the file by handle.
+    Handles are content hashes, so output that comes back unchanged (a cached read, a re-run
+    command) reuses its file. The directory is created on first use and removed by close(),
+    unless the session is journaled and may be resumed (see keep_in).
+    """
+    def __init__(self, directory: str = None, threshold: int = None):
+        self.directory = directory
+        self.threshold = SPOOL_THRESHOLD if threshold is None else threshold
+        self.keep = directory is not None
+
+    def keep_in(self, directory: str):
+        """Spool to directory from now on and leave the files there when the session ends."""
+        self.directory = directory
+        self.keep = True
+
+    def _write(self, text: str) -> str:
+        data = text.encode("utf-8", "surrogatepass")
+        handle = hashlib.sha256(data).hexdigest()[:12]
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="codeforge-spool-")
+        path = os.path.join(self.directory, handle)
+        if not os.path.exists(path):
+            if self.keep: # Kept with a saved session, under its spool directory: private like the journal
+                os.makedirs(os.path.dirname(self.directory), 0o700, exist_ok=True)
+            os.makedirs(self.directory, 0o700, exist_ok=True)
+            # Written under a temporary name first (mkstemp makes it private): a spool file is either complete or absent
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".spool-")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        return handle
+
+    def path(self, handle: str) -> str:
+        """The file behind handle, or None if this session never spooled it."""
+        if self.directory is None or not _HANDLE.match(handle or ""):
+            return None
+        path = os.path.join(self.directory, handle)
+        return path if os.path.isfile(path) else None
+
+    def spool(self, result):
+        """
+        result with every string field over the threshold replaced by a preview, and a "spooled"
+        entry giving each such field's handle and size. Returns result itself if nothing is spooled.
+        """
+        if not isinstance(result, dict) or self.threshold <= 0:
+            return result
+        large = [key for key, value in result.items() if isinstance(value, str) and len(value) > self.threshold]
+        if not large:
+            return result
+        result, spooled = dict(result), {}
+        keep = min(PREVIEW_CHARS, self.threshold // 2)
+        for key in large:
+            text = result[key]
+            handle = self._write(text)
+            lines = text.count("\n") + (not text.endswith("\n"))
+            result[key] = (text[:keep] +
+                           f"\n[... {len(text) - 2 * keep} characters not shown: {lines} lines in all, "
+                           f"read them with read_output(handle='{handle}') ...]\n" + text[len(text) - keep:])
+            spooled[key] = {"handle": handle, "chars": len(text), "lines": lines}
+        result["spooled"] = spooled
+        return result
+
+    def close(self):
+        if self.directory is not None and not self.keep:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
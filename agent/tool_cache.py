@@ -0,0 +1,110 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+# Upper bound on the serialized size of all cached results in one session
+DEFAULT_MAX_BYTES = int(os.getenv("AGENT_TOOL_CACHE_BYTES", "4000000"))
+CACHEABLE_TOOLS = {"read_file", "list_files"}
+
+
+def _cache_key(tool_name: str, tool_input: dict):
+    """The key for a cacheable call, or None. Recursive listings depend on too many directories to fingerprint cheaply."""
+    if tool_name not in CACHEABLE_TOOLS or (tool_name == "list_files" and tool_input.get("recursive")):
+        return None
+    path = os.path.realpath(tool_input.get("path") or ".")
+    other_arguments = json.dumps({key: value for key, value in tool_input.items() if key != "path"}, sort_keys=True)
+    return (tool_name, path, other_arguments)
+
+
+class ToolResultCache:
+    """
+    Results of read_file and list_files calls for one session, keyed by tool, real path and the
+    other arguments, and validated against the path's (mtime_ns, size, inode) on every lookup.
+    Bounded by the total serialized size of the results, evicting the least recently used.
+    Each entry also remembers the tool_use whose result last carried it into the conversation,
+    so an unchanged re-read can refer to that result instead of repeating it.
+    """
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.entries = OrderedDict() # key -> {"fingerprint", "result", "size", "tool_use_id", "content"}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def fingerprint(self, tool_name: str, tool_input: dict):
+        """
+        (mtime_ns, size, inode) of the call's path, or None if the call can't be cached.
+        Take it before running the tool, so a change made while the tool runs is never hidden.
+        """
+        key = _cache_key(tool_name, tool_input)
+        if key is None:
+            return None
+        try:
+            stat_result = os.stat(key[1])
+        except OSError:
+            return None
+        return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
+    def get(self, tool_name: str, tool_input: dict, fingerprint):
+        """The cached entry for this call if it was stored with the same fingerprint, else None."""
+        if fingerprint is None:
+            return None
+        key = _cache_key(tool_name, tool_input)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry["fingerprint"] != fingerprint:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return dict(entry)
+
+    def put(self, tool_name: str, tool_input: dict, fingerprint, result: dict, evict: bool = True) -> bool:
+        """
+        Store a successful result under the fingerprint taken before the tool ran. With evict=False
+        (speculative results) it is only stored if it fits without evicting anything. Returns whether it was stored.
+        """
+        if fingerprint is None or not isinstance(result, dict) or result.get("status") != "success":
+            return False
+        key = _cache_key(tool_name, tool_input)
+        size = len(json.dumps(result))
+        if size > self.max_bytes:
+            return False
+        with self.lock:
+            if not evict and (key in self.entries or self.total_bytes + size > self.max_bytes):
+                return False
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {"fingerprint": fingerprint, "result": result, "size": size, "tool_use_id": None, "content": None}
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+            return True
+
+    def remember(self, tool_name: str, tool_input: dict, tool_use_id: str, result: dict, content: str):
+        """Record that result was sent to the model as the tool_result of tool_use_id, with this content."""
+        key = _cache_key(tool_name, tool_input)
+        if key is None:
+            return
+        with self.lock:
+            entry = self.entries.get(key)
+            # Only the very result that was stored: the file may have changed since the call ran
+            if entry is not None and entry["result"] is result:
+                entry["tool_use_id"] = tool_use_id
+                entry["content"] = content
+
+    def invalidate(self, path: str = None):
+        """Drop what a change to path may have made stale (its reads and its directory's listing), or everything."""
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                self.total_bytes = 0
+                return
+            target = os.path.realpath(path)
+            stale = {target, os.path.dirname(target)}
+            for key in [key for key in self.entries if key[1] in stale]:
+                self._remove(key)
+
+    def _remove(self, key):
+        self.total_bytes -= self.entries.pop(key)["size"]
@@ -0,0 +1,252 @@
+import os
+import sys
+import importlib
+import threading
+from concurrent.futures import Future
+
+from .scheduler import READ_ONLY, MUTATING, INTERACTIVE
+
+# Entry point group that installed packages use to contribute tools
+ENTRY_POINT_GROUP = "codeforge.tools"
+BUILTIN_TOOLS = ("read_file", "list_files", "edit_file", "search_code", "find_relevant_code", "code_outline", "run_shell_command", "read_output")
+# A tool that doesn't say what it does could do anything: it runs alone and clears the caches after it
+DEFAULT_METADATA = {"kind": INTERACTIVE, "cost": 1.0, "timeout": None}
+
+_JSON_TYPES = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict),
+    "null": lambda value: value is None,
+}
+
+
+def _json_type(value) -> str:
+    for name in ("boolean", "integer", "number", "string", "array", "object", "null"):
+        if _JSON_TYPES[name](value):
+            return name
+    return type(value).__name__
+
+
+def _label(where: str) -> str:
+    return f"'{where}'" if where else "the input"
+
+
+def _compile(schema: dict, where: str):
+    """
+    The checks of one (sub)schema as a function value -> error message or None.
+    where is the value's path in the input, e.g. "edits[].old_str"; "" for the input itself.
+    """
+    checks = []
+    label = _label(where)
+
+    types = schema.get("type")
+    if types:
+        types = (types,) if isinstance(types, str) else tuple(types)
+        type_checks = tuple(_JSON_TYPES[name] for name in types if name in _JSON_TYPES)
+        expected = " or ".join(types)
+
+        def check_type(value):
+            if not any(check(value) for check in type_checks):
+                return f"{label} must be {'an' if expected[0] in 'aeiou' else 'a'} {expected}, got {_json_type(value)}"
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = tuple(schema["enum"])
+
+        def check_enum(value):
+            if value not in allowed:
+                return f"{label} must be one of {', '.join(repr(option) for option in allowed)}, got {value!r}"
+        checks.append(check_enum)
+
+    for keyword, compare, relation in (("minimum", lambda value, bound: value < bound, "at least"),
+                                       ("maximum", lambda value, bound: value > bound, "at most")):
+        if keyword in schema:
+            bound = schema[keyword]
+
+            def check_bound(value, bound=bound, compare=compare, relation=relation):
+                if _JSON_TYPES["number"](value) and compare(value, bound):
+                    return f"{label} must be {relation} {bound}, got {value}"
+            checks.append(check_bound)
+
+    if "items" in schema:
+        check_item = _compile(schema["items"], f"{where}[]")
+
+        def check_items(value):
+            if isinstance(value, list):
+                for index, item in enumerate(value):
+                    error = check_item(item)
+                    if error:
+                        return error.replace(f"{where}[]", f"{where}[{index}]", 1)
+        checks.append(check_items)
+
+    if "properties" in schema or "required" in schema:
+        checks.append(_compile_object(schema, where))
+
+    def validate(value):
+        for check in checks:
+            error = check(value)
+            if error:
+                return error
+        return None
+    return validate
+
+
+def _compile_object(schema: dict, where: str):
+    properties = {name: _compile(subschema, f"{where}.{name}" if where else name)
+                  for name, subschema in schema.get("properties", {}).items()}
+    required = tuple(schema.get("required", ()))
+    # Unknown arguments would fail as unexpected keyword arguments anyway, so they are rejected
+    # unless the schema explicitly allows them (and the tool takes **kwargs)
+    allow_unknown = schema.get("additionalProperties", False) is not False
+    expected = ", ".join(properties) or "none"
+
+    def check_object(value):
+        if not isinstance(value, dict):
+            return None # Reported by the type check
+        for name in required:
+            if name not in value:
+                return f"{_label(where)} is missing '{name}'" if where else f"missing required argument '{name}'"
+        for name, item in value.items():
+            check = properties.get(name)
+            if check is None:
+                if allow_unknown:
+                    continue
+                if where:
+                    return f"{_label(where)} has unknown key '{name}'"
+                return f"unknown argument '{name}' (expected: {expected})"
+            error = check(item)
+            if error:
+                return error
+        return None
+    return check_object
+
+
+def compile_validator(parameters: dict):
+    """
+    Build a validator for a tool's parameters schema once, so each call is checked by a chain of
+    precompiled closures. Supports the JSON Schema subset tool schemas use: type, properties,
+    required, additionalProperties, items, enum, minimum and maximum.
+    The validator returns a precise error message for the first problem found, or None.
+    """
+    parameters = dict(parameters or {})
+    parameters.setdefault("type", "object")
+    return _compile(parameters, "")
+
+
+_specs = {} # module name (or id of a tool object) -> spec, so each schema is built and compiled once per process
+_specs_lock = threading.Lock()
+
+
+def load_tool(module) -> dict:
+    """
+    The spec of a tool: a module (or any object) with get_tool_schema() and execute(**input), and
+    optionally TOOL_METADATA = {"kind", "cost", "timeout"}. Specs are cached per process and
+    shared by every agent, so treat them as read-only.
+    The spec holds the name, the schema (with "parameters"), the api_schema sent to the model
+    (with "input_schema"), execute, the compiled validate function and the metadata.
+    Raises ValueError for a tool that doesn't describe itself properly.
+    """
+    key = getattr(module, "__name__", None) or id(module)
+    with _specs_lock:
+        spec = _specs.get(key)
+    if spec is not None:
+        return spec
+
+    schema = dict(module.get_tool_schema())
+    if "parameters" not in schema and "input_schema" in schema:
+        schema["parameters"] = schema.pop("input_schema")
+    if not schema.get("name") or not isinstance(schema.get("parameters", {}), dict) or not callable(getattr(module, "execute", None)):
+        raise ValueError(f"{key} is not a tool: it needs get_tool_schema() with a name and parameters, and execute().")
+    schema.setdefault("parameters", {"type": "object", "properties": {}})
+
+    metadata = dict(DEFAULT_METADATA, **getattr(module, "TOOL_METADATA", {}))
+    if metadata["kind"] not in (READ_ONLY, MUTATING, INTERACTIVE):
+        raise ValueError(f"Tool '{schema['name']}' has unknown kind '{metadata['kind']}'.")
+    api_schema = dict(schema)
+    api_schema["input_schema"] = api_schema.pop("parameters")
+    spec = {
+        "name": schema["name"],
+        "schema": schema,
+        "api_schema": api_schema,
+        "execute": module.execute,
+        "validate": compile_validator(schema["parameters"]),
+        "kind": metadata["kind"],
+        "cost": metadata["cost"],
+        "timeout": metadata["timeout"],
+        "module": key,
+    }
+    with _specs_lock:
+        return _specs.setdefault(key, spec)
+
+
+def _warn(message: str):
+    print(f"⚠️ {message}", file=sys.stderr)
+
+
+def builtin_tools() -> list:
+    return [load_tool(importlib.import_module(f"{__package__}.tools.{name}")) for name in BUILTIN_TOOLS]
+
+
+def configured_tools() -> list:
+    """Tools from the modules listed in AGENT_TOOL_MODULES (comma-separated import paths)."""
+    specs = []
+    for name in filter(None, (part.strip() for part in os.getenv("AGENT_TOOL_MODULES", "").split(","))):
+        try:
+            specs.append(load_tool(importlib.import_module(name)))
+        except Exception as e: # One broken tool shouldn't take the agent down
+            _warn(f"Skipping tool module '{name}': {e}")
+    return specs
+
+
+def _entry_points() -> list:
+    import importlib.metadata # Scanning installed distributions is slow; only done in the background
+    entry_points = importlib.metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return list(entry_points.select(group=ENTRY_POINT_GROUP))
+    return list(entry_points.get(ENTRY_POINT_GROUP, [])) # Python < 3.10
+
+
+def entry_point_tools() -> list:
+    """Tools that installed packages register under the codeforge.tools entry point group."""
+    specs = []
+    try:
+        entry_points = _entry_points()
+    except Exception as e:
+        _warn(f"Could not list tool entry points: {e}")
+        return specs
+    for entry_point in entry_points:
+        try:
+            specs.append(load_tool(entry_point.load()))
+        except Exception as e:
+            _warn(f"Skipping tool entry point '{entry_point.name}': {e}")
+    return specs
+
+
+_entry_point_future = None
+_entry_point_lock = threading.Lock()
+
+
+def entry_point_tools_in_background() -> Future:
+    """entry_point_tools(), started on a background thread on first call; every caller shares the one scan."""
+    global _entry_point_future
+    with _entry_point_lock:
+        if _entry_point_future is None:
+            _entry_point_future = Future()
+            future = _entry_point_future
+
+            def scan():
+                try:
+                    future.set_result(entry_point_tools())
+                except BaseException as e:
+                    future.set_exception(e)
+
+            threading.Thread(target=scan, name="tool-discovery", daemon=True).start()
+        return _entry_point_future
+
+
+def discover_tools() -> list:
+    """The built-in tools followed by those from AGENT_TOOL_MODULES. Entry points are found separately, in the background."""
+    return builtin_tools() + configured_tools()
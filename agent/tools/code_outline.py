@@ -0,0 +1,74 @@
+import os
+
+from .. import outline
+from ..scheduler import READ_ONLY
+from .list_files import MAX_WALK_DEPTH, walk
+
+# Files outlined in one call on a directory
+DEFAULT_MAX_FILES = 200
+
+# Parses (cached) source files, a whole tree at most; submitted ahead of cheaper calls
+TOOL_METADATA = {"kind": READ_ONLY, "cost": 5, "timeout": None}
+
+def get_tool_schema():
+    return {
+        "name": "code_outline",
+        "description": (
+            "List the classes, functions and methods of a source file, or of every source file under a directory, "
+            "with their signatures and line spans, e.g. 'def run_turn(self, user_input: str)  [725-765]'. "
+            "Use this to find the code you need without reading whole files, then call read_file with start_line/end_line "
+            "set to that span. Supports Python, JavaScript/TypeScript, Go, Rust, Java, Kotlin and C#. "
+            "Directory outlines skip hidden files, .git, node_modules and files matched by .gitignore."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "The file or directory to outline."
+                },
+                "max_files": {
+                    "type": "integer",
+                    "description": f"Optional. For a directory, the maximum number of files to outline. Defaults to {DEFAULT_MAX_FILES}."
+                }
+            },
+            "required": ["path"]
+        }
+    }
+
+def execute(path: str, max_files: int = DEFAULT_MAX_FILES) -> dict:
+    """
+    Outline a file or the supported files under a directory.
+    A file's outline is indented text, one symbol per line with its 1-based inclusive line span.
+    """
+    try:
+        if not os.path.exists(path):
+            return {"status": "error", "error": f"No such file or directory: '{path}'"}
+
+        if not os.path.isdir(path):
+            if not outline.supported(path):
+                return {"status": "error", "error": f"No outline support for this file type: '{path}'"}
+            [symbols] = outline.outlines([path])
+            if isinstance(symbols, str):
+                return {"status": "error", "error": f"{symbols}: '{path}'"}
+            return {"status": "success", "outline": outline.format_outline(symbols)}
+
+        paths, truncated = [], False
+        for relative_path, entry_type, _size in walk(path, MAX_WALK_DEPTH, sizes=False):
+            if entry_type != "file" or not outline.supported(relative_path):
+                continue
+            if len(paths) >= max(1, max_files):
+                truncated = True
+                break
+            paths.append(os.path.join(path, relative_path))
+
+        paths.sort() # Files of one directory together, in a stable order
+        files = []
+        for file_path, symbols in zip(paths, outline.outlines(paths)):
+            if isinstance(symbols, str):
+                files.append({"path": file_path, "error": symbols})
+            elif symbols:
+                files.append({"path": file_path, "outline": outline.format_outline(symbols)})
+        return {"status": "success", "files": files, "truncated": truncated}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
@@ -1,9 +1,29 @@
 import os
+import stat
+import tempfile
+
+from ..file_views import unified_diff
+from ..scheduler import MUTATING
+
+# Longest diff of the change returned to the model; beyond this it can re-read the file
+MAX_DIFF_CHARS = 4000
+
+# Read once at import: os.umask can only be queried by setting it, which would race with worker threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Rewrites the file at 'path'; runs after earlier calls on the same path
+TOOL_METADATA = {"kind": MUTATING, "cost": 1, "timeout": None}
 
 def get_tool_schema():
     return {
         "name": "edit_file",
-        "description": "Make edits to a text file. Replaces 'old_str' with 'new_str' in the given file. 'old_str' and 'new_str' MUST be different from each other. If the file specified with path doesn't exist, it will be created.",
+        "description": (
+            "Make edits to a text file. Replaces 'old_str' with 'new_str' in the given file. 'old_str' and 'new_str' MUST be different from each other. "
+            "'old_str' must match exactly one place in the file; include enough surrounding context to make it unique. "
+            "An empty 'old_str' inserts 'new_str' at the start of the file, and creates the file if it doesn't exist. "
+            "To make several changes to one file, pass them all at once in 'edits'; they are applied in order, and either all of them are written or none."
+        ),
         "parameters": {
             "type": "object",
             "properties": {
@@ -18,34 +38,113 @@ def get_tool_schema():
                 "new_str": {
                     "type": "string",
                     "description": "Text to replace old_str with"
+                },
+                "edits": {
+                    "type": "array",
+                    "description": "Optional list of replacements to apply in order, instead of old_str/new_str. Each old_str must match exactly once in the file as edited so far.",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "old_str": {"type": "string"},
+                            "new_str": {"type": "string"}
+                        },
+                        "required": ["old_str", "new_str"]
+                    }
                 }
             },
-            "required": ["path", "old_str", "new_str"]
+            "required": ["path"]
         }
     }
 
-def execute(path: str, old_str: str, new_str: str) -> dict:
+def _apply_edits(content: str, edits: list):
+    """Apply edits in order. Returns (new_content, None) or (None, error_message)."""
+    for index, edit in enumerate(edits):
+        old_str, new_str = edit.get("old_str"), edit.get("new_str")
+        label = f"Edit {index + 1}" if len(edits) > 1 else "Edit"
+        if not isinstance(old_str, str) or not isinstance(new_str, str):
+            return None, f"{label}: old_str and new_str must both be strings."
+        if old_str == new_str:
+            return None, f"{label}: old_str and new_str are identical."
+        if old_str == "": # Prepending (or creating the file if it is empty)
+            content = new_str + content
+            continue
+        matches = content.count(old_str)
+        if matches == 0:
+            return None, f"{label}: old_str was not found in the file."
+        if matches > 1:
+            return None, f"{label}: old_str matches {matches} places in the file; include more surrounding text so it matches exactly one."
+        content = content.replace(old_str, new_str, 1)
+    return content, None
+
+def atomic_write(path: str, content: str):
+    """
+    Replace the file at path with content without ever leaving a partially written file:
+    write a temporary file in the same directory, fsync it, then rename it over the original.
+    Permissions of an existing file are kept, and a symlink is followed rather than replaced.
+    """
+    target = os.path.realpath(path)
+    directory = os.path.dirname(target)
+    existing_mode = stat.S_IMODE(os.stat(target).st_mode) if os.path.exists(target) else None
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(target)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if existing_mode is not None:
+            os.chmod(tmp_path, existing_mode)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_UMASK) # What a plain open(path, 'w') would have created
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if os.name == "posix": # Make the rename itself durable
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def execute(path: str, old_str: str = None, new_str: str = None, edits: list = None) -> dict:
     """
     Make edits to a text file.
-    Replaces 'old_str' with 'new_str' in the given file.
-    If the file specified with path doesn't exist, it will be created.
-    Uses str.replace(old, new, 1) to replace only the first occurrence.
+    Applies either the single old_str -> new_str replacement or the list of edits, in order, to the
+    file's content in memory. Every non-empty old_str must match exactly once; if any edit fails,
+    nothing is written. The result is committed atomically with one write, and the result
+    includes a unified diff of the change.
+    If the file specified with path doesn't exist, it can only be created with an empty old_str.
     """
     try:
+        if edits is not None and (old_str is not None or new_str is not None):
+            return {"status": "error", "error": "Provide either old_str/new_str or edits, not both."}
+        if edits is None:
+            if old_str is None or new_str is None:
+                return {"status": "error", "error": "Provide old_str and new_str, or a list of edits."}
+            edits = [{"old_str": old_str, "new_str": new_str}]
+        if not edits:
+            return {"status": "error", "error": "edits must not be empty."}
+
         content = ""
         if os.path.exists(path):
-            with open(path, 'r') as f:
+            with open(path, 'r', encoding='utf-8') as f:
                 content = f.read()
-        
-        if old_str == "" and not content: # Creating a new file with content
-            new_content = new_str
-        elif old_str == "": # Prepending to existing file if old_str is empty
-             new_content = new_str + content
-        else:
-            new_content = content.replace(old_str, new_str, 1)
+        elif edits[0].get("old_str") != "": # Only an insertion can start a new file
+            return {"status": "error", "error": f"No such file: '{path}'. Use an empty old_str to create it."}
+
+        new_content, error = _apply_edits(content, edits)
+        if error:
+            return {"status": "error", "error": error}
 
-        with open(path, 'w') as f:
-            f.write(new_content)
-        return {"status": "success", "path": path}
+        atomic_write(path, new_content)
+        result = {"status": "success", "path": path, "edits_applied": len(edits)}
+        # The changed hunks with a little context, so the model can check its work without re-reading the file
+        diff = unified_diff(content, new_content, path, path)
+        if len(diff) > MAX_DIFF_CHARS:
+            diff = diff[:MAX_DIFF_CHARS] + f"\n[... diff truncated at {MAX_DIFF_CHARS} characters ...]"
+        if diff:
+            result["diff"] = diff
+        return result
     except Exception as e:
-        return {"status": "error", "error": str(e)} 
\ No newline at end of file
+        return {"status": "error", "error": str(e)}
@@ -0,0 +1,60 @@
+import os
+
+from ..search_index import get_index
+from ..relevance_index import RelevanceIndex
+from ..scheduler import READ_ONLY
+
+# Ranks the whole tree (building the index on first use); submitted ahead of cheaper calls
+TOOL_METADATA = {"kind": READ_ONLY, "cost": 5, "timeout": None}
+
+def get_tool_schema():
+    return {
+        "name": "find_relevant_code",
+        "description": (
+            "Find the code most relevant to a description, such as 'where are retries of API requests configured', "
+            "and return the best matching snippets with their file paths and line ranges. "
+            "Ranks chunks of every text file by the identifiers and words they share with the query (BM25), "
+            "with identifiers split into words, so it finds code without knowing exact names. "
+            "Use this first to orient yourself in an unfamiliar codebase instead of listing and reading files one by one; "
+            "use search_code to find every occurrence of a known string. "
+            "Backed by a persistent index that follows file changes."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "What to look for, in words or identifiers."
+                },
+                "path": {
+                    "type": "string",
+                    "description": "Optional directory to search in. Defaults to the current working directory."
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Optional. Number of snippets to return. Defaults to 5."
+                }
+            },
+            "required": ["query"]
+        }
+    }
+
+def execute(query: str, path: str = ".", max_results: int = 5) -> dict:
+    """
+    Rank the code under path against query.
+    Returns results as {"path", "start_line", "end_line", "score", "snippet"} dicts, best first.
+    """
+    try:
+        if not query or not query.strip():
+            return {"status": "error", "error": "query must not be empty."}
+        if not path: # Handle empty string path as current directory
+            path = "."
+        if not os.path.isdir(path):
+            return {"status": "error", "error": f"Not a directory: '{path}'"}
+
+        result = get_index(path, RelevanceIndex).query(query, max_results=max(1, max_results))
+        if not result["terms"]:
+            return {"status": "error", "error": "query has no words or identifiers to look for."}
+        return {"status": "success", **result}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
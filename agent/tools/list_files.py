@@ -1,41 +1,212 @@
 import os
-import glob
+import fnmatch
+import threading
+from collections import OrderedDict, deque
+
+from ..scheduler import READ_ONLY
+
+# Directories that are never descended into in recursive mode
+ALWAYS_SKIPPED_DIRS = {".git", "node_modules"}
+DEFAULT_MAX_DEPTH = 10
+# Depth for walks over a whole workspace (the search index, outlines): deep enough for any real repository,
+# and the walk still prunes ignored directories
+MAX_WALK_DEPTH = 64
+DEFAULT_MAX_ENTRIES = 2000
+# Number of directories whose listing is kept in the index
+DIRECTORY_INDEX_SIZE = 10000
+
+# realpath -> (mtime_ns, tuple of (name, type)); type is "dir", "file" or "symlink"
+_directory_index = OrderedDict()
+_directory_index_lock = threading.Lock()
+
+# Walks a directory tree, so a little dearer than a read
+TOOL_METADATA = {"kind": READ_ONLY, "cost": 2, "timeout": None}
 
 def get_tool_schema():
     return {
         "name": "list_files",
-        "description": "List files and directories at a given path. If no path is provided, lists files in the current working directory.",
+        "description": (
+            "List files and directories at a given path. If no path is provided, lists files in the current working directory. "
+            "Set recursive to true to walk the whole tree in one call (breadth-first, with file sizes); "
+            "recursive listings skip hidden entries, .git, node_modules and anything matched by .gitignore files."
+        ),
         "parameters": {
             "type": "object",
             "properties": {
                 "path": {
                     "type": "string",
                     "description": "Optional relative or absolute path to list files from. Defaults to current working directory if not provided or empty."
+                },
+                "recursive": {
+                    "type": "boolean",
+                    "description": "Optional. List subdirectories too. Defaults to false."
+                },
+                "max_depth": {
+                    "type": "integer",
+                    "description": f"Optional. In recursive mode, how many directory levels to list (1 lists only path itself). Defaults to {DEFAULT_MAX_DEPTH}."
+                },
+                "max_entries": {
+                    "type": "integer",
+                    "description": f"Optional. In recursive mode, stop after this many entries. Defaults to {DEFAULT_MAX_ENTRIES}."
                 }
             },
             "required": [] # Path is optional
         }
     }
 
-def execute(path: str = ".") -> dict:
+def invalidate(path: str = None):
+    """Drop the cached listing of a directory, or of every directory when path is None."""
+    with _directory_index_lock:
+        if path is None:
+            _directory_index.clear()
+        else:
+            _directory_index.pop(os.path.realpath(path or "."), None)
+
+def _scan(path: str) -> tuple:
+    """
+    The (name, type) entries of one directory, served from the index while the directory's mtime is unchanged.
+    Sizes are not indexed: rewriting a file in place leaves its directory's mtime alone.
+    """
+    key = os.path.realpath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    with _directory_index_lock:
+        cached = _directory_index.get(key)
+        if cached and cached[0] == mtime_ns:
+            _directory_index.move_to_end(key)
+            return cached[1]
+
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_symlink():
+                entries.append((entry.name, "symlink"))
+            elif entry.is_dir():
+                entries.append((entry.name, "dir"))
+            else:
+                entries.append((entry.name, "file"))
+    entries = tuple(sorted(entries))
+
+    with _directory_index_lock:
+        _directory_index[key] = (mtime_ns, entries)
+        _directory_index.move_to_end(key)
+        while len(_directory_index) > DIRECTORY_INDEX_SIZE:
+            _directory_index.popitem(last=False)
+    return entries
+
+def _read_gitignore(directory: str) -> list:
+    """Parse directory/.gitignore into (pattern, negated, dir_only, anchored) rules."""
+    rules = []
+    try:
+        with open(os.path.join(directory, ".gitignore"), 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if line.startswith("**/"): # "**/name" matches at any depth, like an unanchored name
+            line, anchored = line[3:], "/" in line[3:]
+        if line:
+            rules.append((line, negated, dir_only, anchored))
+    return rules
+
+def _is_ignored(relative_path: str, name: str, is_dir: bool, ignore_rules: list) -> bool:
+    """
+    Apply gitignore rules in order; the last matching rule wins.
+    ignore_rules holds (base, rules) pairs, with base the gitignore's directory relative to the walk root.
+    """
+    ignored = False
+    for base, rules in ignore_rules:
+        if base and not relative_path.startswith(base + "/"):
+            continue
+        path_from_base = relative_path[len(base) + 1:] if base else relative_path
+        for pattern, negated, dir_only, anchored in rules:
+            if dir_only and not is_dir:
+                continue
+            target = path_from_base if anchored else name
+            if fnmatch.fnmatchcase(target, pattern):
+                ignored = not negated
+    return ignored
+
+def walk(root: str, max_depth: int, sizes: bool = True):
+    """
+    Breadth-first generator of (relative_path, type, size), pruning ignored directories.
+    Being a generator, the walk stops as soon as the caller has seen enough entries.
+    Sizes are statted fresh for files; they are None for other entries, or for all when sizes is False.
+    """
+    queue = deque([("", 0, [])])
+    while queue:
+        relative_dir, depth, ignore_rules = queue.popleft()
+        directory = os.path.join(root, relative_dir) if relative_dir else root
+        try:
+            entries = _scan(directory)
+        except OSError:
+            continue # Unreadable or vanished directory
+        if any(name == ".gitignore" for name, _type in entries):
+            ignore_rules = ignore_rules + [(relative_dir, _read_gitignore(directory))]
+        for name, entry_type in entries:
+            if name.startswith("."):
+                continue
+            relative_path = f"{relative_dir}/{name}" if relative_dir else name
+            is_dir = entry_type == "dir"
+            if is_dir and name in ALWAYS_SKIPPED_DIRS:
+                continue
+            if _is_ignored(relative_path, name, is_dir, ignore_rules):
+                continue
+            size = None
+            if sizes and entry_type == "file":
+                try:
+                    size = os.stat(os.path.join(directory, name), follow_symlinks=False).st_size
+                except OSError:
+                    continue # Removed since the directory was indexed
+            yield relative_path, entry_type, size
+            if is_dir and depth < max_depth:
+                queue.append((relative_path, depth + 1, ignore_rules))
+
+def execute(path: str = ".", recursive: bool = False, max_depth: int = DEFAULT_MAX_DEPTH, max_entries: int = DEFAULT_MAX_ENTRIES) -> dict:
     """
     List files and directories at a given path.
     If no path is provided or path is empty, lists files in the current working directory.
     Appends a '/' to directory names.
+    In recursive mode, returns entries with their type and size, breadth-first, up to max_entries.
     """
     try:
         if not path: # Handle empty string path as current directory
             path = "."
 
-        items = glob.glob(os.path.join(path, "*"))
-        
-        result_list = []
-        for item_path in items:
-            if os.path.isdir(item_path):
-                result_list.append(item_path + os.sep) # Use os.sep for platform independence
-            else:
-                result_list.append(item_path)
-        
-        return {"status": "success", "files": sorted(result_list)} # Sort for consistent output
+        if not os.path.isdir(path):
+            return {"status": "success", "files": []}
+
+        if not recursive:
+            result_list = []
+            for name, entry_type in _scan(path):
+                if name.startswith("."): # Hidden entries are left out, like a shell glob
+                    continue
+                item_path = os.path.join(path, name)
+                if entry_type == "dir" or (entry_type == "symlink" and os.path.isdir(item_path)):
+                    result_list.append(item_path + os.sep) # Use os.sep for platform independence
+                else:
+                    result_list.append(item_path)
+            return {"status": "success", "files": sorted(result_list)} # Sort for consistent output
+
+        entries = []
+        truncated = False
+        for relative_path, entry_type, size in walk(path, max(0, max_depth - 1)):
+            if len(entries) >= max_entries:
+                truncated = True
+                break
+            entry = {"path": os.path.join(path, relative_path) + (os.sep if entry_type == "dir" else ""), "type": entry_type}
+            if size is not None:
+                entry["size"] = size
+            entries.append(entry)
+        return {"status": "success", "entries": entries, "truncated": truncated}
     except Exception as e:
-        return {"status": "error", "error": str(e)} 
\ No newline at end of file
+        return {"status": "error", "error": str(e)}
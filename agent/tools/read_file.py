@@ -1,35 +1,206 @@
 import os
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+
+from ..scheduler import READ_ONLY
+
+# Content beyond this many bytes is cut off (with a marker) unless a smaller range is requested
+MAX_BYTES = int(os.getenv("AGENT_READ_MAX_BYTES", "100000"))
+# Bytes sniffed from the start of the file to detect binary content
+BINARY_SNIFF_BYTES = 8192
+# The line index keeps the start offset of every this-many-th line; reads scan forward from the nearest one
+LINE_CHECKPOINT_EVERY = 1024
+# Bytes of line indexes kept in memory, across files
+LINE_INDEX_CACHE_BYTES = 1 << 20
+
+_line_index_cache = OrderedDict() # realpath -> (mtime_ns, size, array of checkpoint offsets, total lines)
+_line_index_bytes = 0
+_line_index_lock = threading.Lock()
+
+# Reads one file; the cheapest tool, and safe alongside other reads
+TOOL_METADATA = {"kind": READ_ONLY, "cost": 1, "timeout": None}
 
 def get_tool_schema():
     return {
         "name": "read_file",
-        "description": "Read the contents of a given file path. Use this when you want to see what's inside a file. Do not use this with directory names.",
+        "description": (
+            "Read the contents of a given file path. Use this when you want to see what's inside a file. Do not use this with directory names. "
+            f"Output is capped at {MAX_BYTES} bytes; longer files are truncated and the result reports the total line count. "
+            "Use start_line/end_line (1-based, inclusive) to read a specific part of a large file, or byte_offset/byte_length for files without useful line breaks. "
+            "Binary files are refused. "
+            "Re-reading a whole file you have already read returns only a unified diff against that earlier result ('diff_since'), "
+            "or 'unchanged_since' if nothing changed, whenever that is shorter than the content."
+        ),
         "parameters": {
             "type": "object",
             "properties": {
                 "path": {
                     "type": "string",
                     "description": "The relative or absolute path of a file."
+                },
+                "start_line": {
+                    "type": "integer",
+                    "description": "Optional first line to read (1-based). Defaults to the first line."
+                },
+                "end_line": {
+                    "type": "integer",
+                    "description": "Optional last line to read (inclusive). Defaults to the last line."
+                },
+                "byte_offset": {
+                    "type": "integer",
+                    "description": "Optional byte offset to start reading at. Cannot be combined with line ranges."
+                },
+                "byte_length": {
+                    "type": "integer",
+                    "description": f"Optional number of bytes to read from byte_offset (at most {MAX_BYTES})."
                 }
             },
             "required": ["path"]
         }
     }
 
-def execute(path: str) -> dict:
+def _is_binary(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return b"\0" in f.read(BINARY_SNIFF_BYTES)
+
+def _decode(data: bytes) -> str:
+    # Same newline handling as reading the file in text mode
+    return data.decode('utf-8', errors='replace').replace("\r\n", "\n").replace("\r", "\n")
+
+def _build_line_index(path: str, size: int):
+    """(checkpoints, total_lines): the offset at which every LINE_CHECKPOINT_EVERY-th line starts, from line 1."""
+    checkpoints, total_lines = array('Q'), 0
+    if size > 0:
+        checkpoints.append(0)
+        total_lines = 1
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            position = mm.find(b"\n")
+            while position != -1 and position + 1 < size: # A trailing newline doesn't start another line
+                if total_lines % LINE_CHECKPOINT_EVERY == 0:
+                    checkpoints.append(position + 1)
+                total_lines += 1
+                position = mm.find(b"\n", position + 1)
+    return checkpoints, total_lines
+
+def _line_index(path: str, stat_result):
+    """
+    The file's sparse line index, built once with mmap and cached until its mtime or size changes.
+    Lets a read jump to the checkpoint nearest line N and scan forward from there.
+    """
+    global _line_index_bytes
+    key = os.path.realpath(path)
+    with _line_index_lock:
+        cached = _line_index_cache.get(key)
+        if cached and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size:
+            _line_index_cache.move_to_end(key)
+            return cached[2], cached[3]
+
+    checkpoints, total_lines = _build_line_index(path, stat_result.st_size)
+
+    with _line_index_lock:
+        previous = _line_index_cache.pop(key, None)
+        if previous:
+            _line_index_bytes -= previous[2].itemsize * len(previous[2])
+        _line_index_cache[key] = (stat_result.st_mtime_ns, stat_result.st_size, checkpoints, total_lines)
+        _line_index_bytes += checkpoints.itemsize * len(checkpoints)
+        while _line_index_bytes > LINE_INDEX_CACHE_BYTES and len(_line_index_cache) > 1:
+            _, (_, _, evicted, _) = _line_index_cache.popitem(last=False)
+            _line_index_bytes -= evicted.itemsize * len(evicted)
+    return checkpoints, total_lines
+
+def _line_offset(mm, checkpoints, line: int) -> int:
+    """Byte offset at which line (1-based, at most the last line) starts."""
+    checkpoint = (line - 1) // LINE_CHECKPOINT_EVERY
+    offset = checkpoints[checkpoint]
+    for _ in range(line - 1 - checkpoint * LINE_CHECKPOINT_EVERY):
+        offset = mm.find(b"\n", offset) + 1
+    return offset
+
+def _count_lines(path: str) -> int:
+    with open(path, 'rb') as f:
+        total_lines, last = 0, b""
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            total_lines += chunk.count(b"\n")
+            last = chunk
+    return total_lines + (bool(last) and not last.endswith(b"\n"))
+
+def _read_bytes(path: str, start: int, length: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(length)
+
+def _read_lines(path: str, stat_result, start_line, end_line, max_bytes: int = None) -> dict:
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    if end_line is not None and end_line < 1:
+        return {"status": "error", "error": f"end_line must be at least 1 (lines are numbered from 1), got {end_line}."}
+    if start_line is None and end_line is None:
+        # The whole file from the top: only its line count is needed, not an index
+        checkpoints, total_lines = None, _count_lines(path)
+    else:
+        checkpoints, total_lines = _line_index(path, stat_result)
+    first = max(1, start_line or 1)
+    last = total_lines if end_line is None else min(total_lines, end_line)
+    if total_lines and first > total_lines:
+        return {"status": "error", "error": f"start_line {first} is past the end of the file ({total_lines} lines): '{path}'"}
+    if first > last:
+        return {"status": "success", "content": "", "start_line": first, "end_line": last, "total_lines": total_lines, "truncated": False}
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start_offset = 0 if checkpoints is None else _line_offset(mm, checkpoints, first)
+        end_offset = _line_offset(mm, checkpoints, last + 1) if last < total_lines else stat_result.st_size
+        truncated = end_offset - start_offset > max_bytes
+        if truncated:
+            # Stop after the last complete line that fits, or mid-line if even the first line doesn't fit
+            cut = start_offset + max_bytes
+            last_newline = mm.rfind(b"\n", start_offset, cut)
+            if last_newline != -1:
+                end_offset = last_newline + 1
+                last = first + mm[start_offset:end_offset].count(b"\n") - 1
+            else:
+                last, end_offset = first, cut
+        data = mm[start_offset:end_offset]
+
+    content = _decode(data)
+    if truncated:
+        content += (f"\n[... truncated: showing lines {first}-{last} of {total_lines}. "
+                    "Use start_line/end_line to read more.]")
+    return {"status": "success", "content": content, "start_line": first, "end_line": last,
+            "total_lines": total_lines, "truncated": truncated}
+
+def execute(path: str, start_line: int = None, end_line: int = None, byte_offset: int = None, byte_length: int = None) -> dict:
     """
     Read the contents of a given file path.
     Returns the file content as a string or an error message.
+    Large files and line ranges are served through a cached line index, and output is capped at MAX_BYTES.
     """
     try:
         if not os.path.exists(path):
-            return {"status": "error", "error": f"No such file or directory: '{path}'"} 
-        
+            return {"status": "error", "error": f"No such file or directory: '{path}'"}
+
         if os.path.isdir(path):
             return {"status": "error", "error": f"Path is a directory, not a file: '{path}'"}
 
-        with open(path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return {"status": "success", "content": content}
+        if _is_binary(path):
+            return {"status": "error", "error": f"File appears to be binary, not reading it: '{path}' ({os.path.getsize(path)} bytes)"}
+
+        stat_result = os.stat(path)
+
+        if byte_offset is not None or byte_length is not None:
+            if start_line is not None or end_line is not None:
+                return {"status": "error", "error": "Use either start_line/end_line or byte_offset/byte_length, not both."}
+            offset = max(0, byte_offset or 0)
+            length = min(MAX_BYTES, byte_length if byte_length is not None else MAX_BYTES)
+            data = _read_bytes(path, offset, max(0, length))
+            return {"status": "success", "content": data.decode('utf-8', errors='replace'), "byte_offset": offset,
+                    "bytes_read": len(data), "total_bytes": stat_result.st_size}
+
+        if start_line is None and end_line is None and stat_result.st_size <= MAX_BYTES:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            return {"status": "success", "content": content}
+
+        return _read_lines(path, stat_result, start_line, end_line)
     except Exception as e:
-        return {"status": "error", "error": str(e)} 
\ No newline at end of file
+        return {"status": "error", "error": str(e)}
@@ -0,0 +1,52 @@
+import os
+
+from ..scheduler import READ_ONLY
+from .read_file import _read_lines
+
+# Reads a page of output this session already produced; as cheap as a file read
+TOOL_METADATA = {"kind": READ_ONLY, "cost": 1, "timeout": None}
+
+def get_tool_schema():
+    return {
+        "name": "read_output",
+        "description": (
+            "Read part of a tool output that was too large to show in full. Such results list a handle for each "
+            "shortened field under 'spooled' and show only the start and end of it. "
+            "Use start_line/end_line (1-based, inclusive) to page through the full output; each page is capped in size "
+            "and reports the total line count."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "handle": {
+                    "type": "string",
+                    "description": "The handle of the output, from the 'spooled' field of the earlier result."
+                },
+                "start_line": {
+                    "type": "integer",
+                    "description": "Optional first line to read (1-based). Defaults to the first line."
+                },
+                "end_line": {
+                    "type": "integer",
+                    "description": "Optional last line to read (inclusive). Defaults to the last line."
+                }
+            },
+            "required": ["handle"]
+        }
+    }
+
+def execute(handle: str, start_line: int = None, end_line: int = None, spool=None) -> dict:
+    """
+    Read lines of a spooled tool output. spool is the session's OutputSpool, supplied by the agent.
+    Pages are capped at the spool's threshold, and the agent never spools them again.
+    """
+    try:
+        path = spool.path(handle) if spool is not None else None
+        if path is None:
+            return {"status": "error", "error": f"No spooled output with handle '{handle}' in this session."}
+        result = _read_lines(path, os.stat(path), start_line, end_line, max_bytes=spool.threshold)
+        if result["status"] == "error":
+            result["error"] = result["error"].replace(f": '{path}'", f" (handle '{handle}')")
+        return result
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
@@ -1,47 +1,190 @@
+import os
+import sys
+import time
+import codecs
+import signal
+import threading
 import subprocess
+import contextvars
+
+from ..scheduler import INTERACTIVE
+
+# Commands running longer than this (in seconds) are killed, along with everything they started
+DEFAULT_TIMEOUT = float(os.getenv("AGENT_SHELL_TIMEOUT", "600"))
+# Bytes kept from the start and from the end of each output stream; the middle is dropped
+CAPTURE_HEAD_BYTES = int(os.getenv("AGENT_SHELL_CAPTURE_BYTES", "16000"))
+CAPTURE_TAIL_BYTES = CAPTURE_HEAD_BYTES
+# Seconds between asking a timed-out process group to terminate and killing it outright
+KILL_GRACE_SECONDS = 2.0
+
+# Asks for confirmation, so it must own the terminal; commands enforce their own timeout
+TOOL_METADATA = {"kind": INTERACTIVE, "cost": 10, "timeout": None}
 
 def get_tool_schema():
     return {
         "name": "run_shell_command",
-        "description": "Execute a shell command. IMPORTANT: This tool will ask for user confirmation before running any command.",
+        "description": (
+            "Execute a shell command. IMPORTANT: This tool will ask for user confirmation before running any command. "
+            f"Output is streamed to the user; the result keeps only the first and last {CAPTURE_HEAD_BYTES} bytes of stdout and stderr. "
+            f"Commands are killed after {int(DEFAULT_TIMEOUT)} seconds unless a different timeout is given. The command's stdin is empty."
+        ),
         "parameters": {
             "type": "object",
             "properties": {
                 "command": {
                     "type": "string",
                     "description": "The command to execute."
+                },
+                "timeout": {
+                    "type": "number",
+                    "description": f"Optional wall-clock limit in seconds. Defaults to {int(DEFAULT_TIMEOUT)}."
                 }
             },
             "required": ["command"]
         }
     }
 
-def execute(command: str) -> dict:
+class BoundedCapture:
+    """Keeps the first head_limit and last tail_limit bytes of a stream and counts what falls in between."""
+    def __init__(self, head_limit: int = None, tail_limit: int = None):
+        self.head_limit = CAPTURE_HEAD_BYTES if head_limit is None else head_limit
+        self.tail_limit = CAPTURE_TAIL_BYTES if tail_limit is None else tail_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def feed(self, chunk: bytes):
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if not chunk:
+            return
+        self.tail += chunk
+        overflow = len(self.tail) - self.tail_limit
+        if overflow > 0:
+            del self.tail[:overflow]
+            self.dropped += overflow
+
+    def text(self) -> str:
+        head = self.head.decode('utf-8', errors='replace')
+        if not self.dropped:
+            return head + self.tail.decode('utf-8', errors='replace')
+        return (head + f"\n[... {self.dropped} bytes dropped ...]\n" + self.tail.decode('utf-8', errors='replace'))
+
+def _pump(stream, capture: BoundedCapture, echo_to):
+    """Copy a child's output stream into capture, echoing it live as it arrives."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    fd = stream.fileno()
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        capture.feed(chunk)
+        if echo_to is not None:
+            echo_to.write(decoder.decode(chunk))
+            echo_to.flush()
+    stream.close()
+
+def _kill_process_group(process):
+    """Terminate the process and everything it started, escalating to SIGKILL after a grace period."""
+    if os.name != "posix":
+        process.kill()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            pass
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass # The whole group already exited
+
+def run_command(command: str, timeout: float = None, cwd: str = None, echo: bool = True) -> dict:
+    """
+    Run a shell command in its own process group, streaming its output live and keeping a bounded
+    head and tail of each stream. Kills the whole group when the wall-clock timeout expires.
+    """
+    if timeout is None:
+        timeout = DEFAULT_TIMEOUT
+    started = time.monotonic()
+    process = subprocess.Popen(
+        command, shell=True, cwd=cwd,
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        start_new_session=(os.name == "posix") # Own process group, so a timeout can kill all of it
+    )
+    stdout, stderr = BoundedCapture(), BoundedCapture()
+    # Pumps run in the caller's context, so a server can tell whose output they echo
+    pumps = [
+        threading.Thread(target=contextvars.copy_context().run, args=(_pump, process.stdout, stdout, sys.stdout if echo else None), daemon=True),
+        threading.Thread(target=contextvars.copy_context().run, args=(_pump, process.stderr, stderr, sys.stderr if echo else None), daemon=True),
+    ]
+    for pump in pumps:
+        pump.start()
+
+    timed_out = False
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _kill_process_group(process)
+        process.wait()
+    finally:
+        if process.poll() is None: # Interrupted (e.g. Ctrl+C): don't leave the command running
+            _kill_process_group(process)
+    for pump in pumps:
+        pump.join(timeout=KILL_GRACE_SECONDS) # A detached grandchild may still hold the pipe open
+
+    return {
+        "exit_code": process.returncode,
+        "timed_out": timed_out,
+        "duration_seconds": round(time.monotonic() - started, 3),
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "stdout_dropped_bytes": stdout.dropped,
+        "stderr_dropped_bytes": stderr.dropped,
+    }
+
+def print_confirmation_request(command: str):
+    # Signal that we're about to ask for confirmation - this will be used by the agent to stop the loading indicator
+    print("\n\033[1m🔍 CONFIRMATION REQUIRED\033[0m")
+    print(f"AI proposes to execute the following shell command: '{command}'")
+    print("Do you want to execute this command? (y/n): ", end='', flush=True)
+
+def confirm_in_terminal(command: str) -> bool:
+    """Ask the user on the terminal whether command may run."""
+    print_confirmation_request(command)
+    return input().strip().lower() == 'y'
+
+def execute(command: str, timeout: float = None, session=None, confirm=None, cwd: str = None) -> dict:
     """
     Execute a shell command after user confirmation.
-    Returns the standard output of the command or an error message.
+    Returns the (bounded) output of the command, its exit code and duration, or an error message.
+    session, confirm and cwd are supplied by the agent, not the model. session is a ShellSession that
+    keeps the working directory and environment between commands; without one, each command gets
+    a fresh shell, started in cwd. confirm(command) -> bool replaces the terminal prompt (see confirm_in_terminal).
     """
     try:
-        # Signal that we're about to ask for confirmation - this will be used by the agent to stop the loading indicator
-        print("\n\033[1m🔍 CONFIRMATION REQUIRED\033[0m")
-        print(f"AI proposes to execute the following shell command: '{command}'")
-        print("Do you want to execute this command? (y/n): ", end='', flush=True)
-        
-        response = input().strip().lower()
-
-        if response != 'y':
+        if not (confirm or confirm_in_terminal)(command):
             return {"status": "declined", "message": "User declined to execute the command."}
 
         # After confirmation, print a message indicating execution has started
         print("\n\033[1m⚙️ EXECUTING COMMAND...\033[0m")
-        
-        process = subprocess.run(command, shell=True, capture_output=True, text=True, check=False)
 
-        if process.returncode == 0:
-            return {"status": "success", "stdout": process.stdout, "stderr": process.stderr}
+        if session is not None:
+            outcome = session.run(command, timeout=timeout)
+        else:
+            outcome = run_command(command, timeout=timeout, cwd=cwd)
+
+        if outcome["timed_out"]:
+            error_message = f"Command '{command}' timed out after {outcome['duration_seconds']} seconds and was killed."
+            return {"status": "error", "error": error_message, **outcome}
+        elif outcome["exit_code"] == 0:
+            return {"status": "success", **outcome}
         else:
-            error_message = f"Command '{command}' failed with return code {process.returncode}."
-            return {"status": "error", "error": error_message, "stdout": process.stdout, "stderr": process.stderr}
+            error_message = f"Command '{command}' failed with return code {outcome['exit_code']}."
+            return {"status": "error", "error": error_message, **outcome}
 
     except Exception as e:
-        return {"status": "error", "error": str(e)} 
\ No newline at end of file
+        return {"status": "error", "error": str(e)}
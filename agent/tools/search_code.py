@@ -0,0 +1,70 @@
+import os
+import re
+
+from ..search_index import get_index
+from ..scheduler import READ_ONLY
+
+# Searches the whole tree (building the index on first use); submitted ahead of cheaper calls
+TOOL_METADATA = {"kind": READ_ONLY, "cost": 5, "timeout": None}
+
+def get_tool_schema():
+    return {
+        "name": "search_code",
+        "description": (
+            "Search the text files under a directory for a string or regular expression and return matching lines with line numbers and surrounding context. "
+            "Backed by a persistent index, so it is fast even on large repositories and does not need user confirmation. "
+            "Hidden files, .git, node_modules, files matched by .gitignore, binary files and files over 1 MB are not searched. "
+            "Prefer this over running grep through run_shell_command."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "The text to search for. Matched literally unless regex is true."
+                },
+                "path": {
+                    "type": "string",
+                    "description": "Optional directory to search in. Defaults to the current working directory."
+                },
+                "regex": {
+                    "type": "boolean",
+                    "description": "Optional. Treat query as a Python regular expression. Defaults to false."
+                },
+                "case_sensitive": {
+                    "type": "boolean",
+                    "description": "Optional. Defaults to false."
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Optional. Maximum number of matching lines to return. Defaults to 50."
+                },
+                "context_lines": {
+                    "type": "integer",
+                    "description": "Optional. Lines of context to show before and after each match. Defaults to 2."
+                }
+            },
+            "required": ["query"]
+        }
+    }
+
+def execute(query: str, path: str = ".", regex: bool = False, case_sensitive: bool = False, max_results: int = 50, context_lines: int = 2) -> dict:
+    """
+    Search the files under path for query.
+    Returns matches as {"path", "line", "snippet"} dicts, where the snippet marks the matching line with ':'.
+    """
+    try:
+        if not query:
+            return {"status": "error", "error": "query must not be empty."}
+        if not path: # Handle empty string path as current directory
+            path = "."
+        if not os.path.isdir(path):
+            return {"status": "error", "error": f"Not a directory: '{path}'"}
+
+        result = get_index(path).search(query, regex=regex, case_sensitive=case_sensitive,
+                                        max_results=max(1, max_results), context_lines=max(0, context_lines))
+        return {"status": "success", **result}
+    except re.error as e:
+        return {"status": "error", "error": f"Invalid regular expression: {e}"}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+# Attributes summed per span name in the session summary
+SUMMED_ATTRIBUTES = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens",
+                     "bytes_sent", "bytes_received", "input_bytes", "result_bytes", "retries")
+
+
+class Span:
+    """One timed operation: a turn, a model call or a tool execution."""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "started", "duration", "attributes", "error")
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.started = time.monotonic()
+        self.duration = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        record = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_ns / 1e9,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+    def to_otlp(self) -> dict:
+        """The span as an OTLP/JSON ExportTraceServiceRequest, the line format of OpenTelemetry's file exporter."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1, # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.start_ns + int(self.duration * 1e9)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "codeforge"}}]},
+            "scopeSpans": [{"scope": {"name": "codeforge.agent"}, "spans": [span]}],
+        }]}
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """
+    Records spans for model calls and tool executions, keeps per-name aggregates for the session
+    summary and, with a path, appends every finished span to a file: one JSON object per line
+    ("jsonl"), or one OTLP/JSON export request per line ("otlp").
+    Configured by AGENT_TRACE_FILE and AGENT_TRACE_FORMAT; AGENT_TRACE=1 enables the summary alone.
+    Safe to use from the tool worker threads.
+    """
+    def __init__(self, path: str = None, fmt: str = None, enabled: bool = None):
+        if path is None:
+            path = os.getenv("AGENT_TRACE_FILE") or None
+        self.path = path
+        self.format = (fmt or os.getenv("AGENT_TRACE_FORMAT") or "jsonl").lower()
+        if self.format not in ("jsonl", "otlp"):
+            raise ValueError(f"Unknown trace format '{self.format}'; use 'jsonl' or 'otlp'.")
+        if enabled is None:
+            enabled = bool(path) or os.getenv("AGENT_TRACE", "").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.aggregates = {} # span name -> {"count", "errors", "durations", and the summed attributes}
+        self.lock = threading.Lock()
+        self.file = None
+
+    @contextmanager
+    def span(self, name: str, parent: Span = None, **attributes):
+        """Time the enclosed block as a span. Exceptions (including cancellation) are recorded and re-raised."""
+        span = Span(name, parent, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            raise
+        finally:
+            span.duration = time.monotonic() - span.started
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        with self.lock:
+            aggregate = self.aggregates.setdefault(span.name, {"count": 0, "errors": 0, "durations": []})
+            aggregate["count"] += 1
+            aggregate["errors"] += 1 if span.error else 0
+            aggregate["durations"].append(span.duration)
+            for key in SUMMED_ATTRIBUTES:
+                value = span.attributes.get(key)
+                if isinstance(value, (int, float)):
+                    aggregate[key] = aggregate.get(key, 0) + value
+            if self.path:
+                if self.file is None:
+                    self.file = open(self.path, 'a', encoding='utf-8')
+                record = span.to_otlp() if self.format == "otlp" else span.to_dict()
+                self.file.write(json.dumps(record, default=str) + "\n")
+                self.file.flush()
+
+    def summary(self) -> dict:
+        """Per span name: count, errors, total/p50/max seconds and the summed attributes."""
+        with self.lock:
+            summary = {}
+            for name, aggregate in sorted(self.aggregates.items()):
+                durations = sorted(aggregate["durations"])
+                entry = {key: value for key, value in aggregate.items() if key != "durations"}
+                entry["total_seconds"] = round(sum(durations), 3)
+                entry["p50_seconds"] = round(durations[len(durations) // 2], 3)
+                entry["max_seconds"] = round(durations[-1], 3)
+                summary[name] = entry
+            return summary
+
+    def format_summary(self) -> str:
+        lines = ["📈 SESSION TRACE SUMMARY"]
+        for name, entry in self.summary().items():
+            line = (f"• {name}: {entry['count']} × (total {entry['total_seconds']}s, "
+                    f"p50 {entry['p50_seconds']}s, max {entry['max_seconds']}s)")
+            extras = [f"{key} {entry[key]}" for key in SUMMED_ATTRIBUTES if entry.get(key)]
+            if entry["errors"]:
+                extras.append(f"errors {entry['errors']}")
+            if extras:
+                line += " — " + ", ".join(extras)
+            lines.append(line)
+        if self.path:
+            lines.append(f"Spans written to {self.path} ({self.format}).")
+        return "\n".join(lines)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,153 @@
+import json
+import time
+from types import SimpleNamespace
+
+# Characters per token used to invent usage numbers when a transcript doesn't record them
+CHARS_PER_TOKEN = 4
+
+
+class MockBackendError(Exception):
+    """The agent's requests diverged from the transcript being replayed."""
+
+
+class MockBlock(SimpleNamespace):
+    """A content block with the model_dump() the agent uses to store responses in its history."""
+    def model_dump(self):
+        return dict(self.__dict__)
+
+
+def _substitute(value, variables: dict):
+    """Replace {name} placeholders in every string of a transcript response."""
+    if isinstance(value, str):
+        for name, replacement in variables.items():
+            value = value.replace("{" + name + "}", replacement)
+        return value
+    if isinstance(value, list):
+        return [_substitute(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: _substitute(item, variables) for key, item in value.items()}
+    return value
+
+
+class MockStream:
+    """The SDK's MessageStream context manager, replaying one message as stream events."""
+    def __init__(self, message, delay: float, chunk_chars: int = 64):
+        self.message = message
+        self.delay = delay
+        self.chunk_chars = chunk_chars
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _events(self):
+        for index, block in enumerate(self.message.content):
+            start = MockBlock(**{key: value for key, value in block.__dict__.items() if key not in ("text", "input")})
+            yield SimpleNamespace(type="content_block_start", index=index, content_block=start)
+            if block.type == "text":
+                text, delta_type, field = block.text, "text_delta", "text"
+            else:
+                text, delta_type, field = json.dumps(block.input), "input_json_delta", "partial_json"
+            for offset in range(0, len(text), self.chunk_chars):
+                yield SimpleNamespace(type="content_block_delta", index=index,
+                                      delta=SimpleNamespace(**{"type": delta_type, field: text[offset:offset + self.chunk_chars]}))
+            yield SimpleNamespace(type="content_block_stop", index=index)
+
+    def __iter__(self):
+        events = list(self._events())
+        # Spread the simulated generation time evenly over the events
+        pause = self.delay / len(events) if events and self.delay > 0 else 0
+        for event in events:
+            if pause:
+                time.sleep(pause)
+            yield event
+
+    def get_final_message(self):
+        return self.message
+
+
+class MockMessages:
+    """
+    A deterministic local stand-in for client.messages that replays the responses of a recorded
+    transcript in order, via create() or stream().
+    Each response is {"content": [...], "stop_reason": ..., "usage": {...}}; usage is estimated from
+    the request and response sizes when omitted. Strings may contain {name} placeholders, filled
+    from variables (e.g. the root of a synthetic repository).
+    Every call waits latency seconds, plus output_tokens / output_tokens_per_second when given.
+    In strict mode each request must carry a tool_result for every tool_use of the previous response.
+    """
+    def __init__(self, responses: list, latency: float = 0.0, output_tokens_per_second: float = None,
+                 variables: dict = None, strict: bool = True):
+        self.responses = responses
+        self.latency = latency
+        self.output_tokens_per_second = output_tokens_per_second
+        self.variables = variables or {}
+        self.strict = strict
+        self.position = 0
+        self.pending_tool_use_ids = []
+        self.requests = []
+
+    def _check_tool_results(self, messages: list):
+        if not self.pending_tool_use_ids:
+            return
+        last = messages[-1] if messages else {}
+        content = last.get("content") if last.get("role") == "user" else None
+        answered = [block.get("tool_use_id") for block in content or [] if isinstance(block, dict) and block.get("type") == "tool_result"]
+        if answered != self.pending_tool_use_ids:
+            raise MockBackendError(f"Expected tool results for {self.pending_tool_use_ids}, got {answered}.")
+
+    def _next_message(self, kwargs: dict):
+        if self.position >= len(self.responses):
+            raise MockBackendError(f"Transcript exhausted after {self.position} responses.")
+        if self.strict:
+            self._check_tool_results(kwargs.get("messages", []))
+        self.requests.append(kwargs)
+        response = _substitute(self.responses[self.position], self.variables)
+        self.position += 1
+
+        content = [MockBlock(**block) for block in response["content"]]
+        self.pending_tool_use_ids = [block.id for block in content if block.type == "tool_use"]
+        usage = {
+            "input_tokens": len(json.dumps(kwargs.get("messages", []), default=str)) // CHARS_PER_TOKEN,
+            "output_tokens": len(json.dumps(response["content"])) // CHARS_PER_TOKEN,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        }
+        usage.update(response.get("usage", {}))
+        stop_reason = response.get("stop_reason") or ("tool_use" if self.pending_tool_use_ids else "end_turn")
+        return SimpleNamespace(content=content, stop_reason=stop_reason, usage=SimpleNamespace(**usage))
+
+    def _delay(self, message) -> float:
+        delay = self.latency
+        if self.output_tokens_per_second:
+            delay += message.usage.output_tokens / self.output_tokens_per_second
+        return delay
+
+    def create(self, **kwargs):
+        message = self._next_message(kwargs)
+        delay = self._delay(message)
+        if delay > 0:
+            time.sleep(delay)
+        return message
+
+    def stream(self, **kwargs):
+        message = self._next_message(kwargs)
+        return MockStream(message, self._delay(message))
+
+
+class MockClient:
+    """Drop-in for anthropic.Anthropic(...) as far as the agent is concerned."""
+    def __init__(self, messages: MockMessages):
+        self.messages = messages
+
+
+def load_transcript(path: str) -> dict:
+    """A recorded transcript: {"name", "turns": [{"user": str, "responses": [...]}, ...]}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def transcript_responses(transcript: dict) -> list:
+    return [response for turn in transcript["turns"] for response in turn["responses"]]
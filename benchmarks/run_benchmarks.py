@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the agent's tool loop.
+
+The model is replaced by a mock Messages backend that replays recorded transcripts, so runs are
+deterministic and need no network or API key. Results are written as JSON; --compare checks them
+against an earlier run and exits with status 1 on regressions.
+
+    python -m benchmarks.run_benchmarks --sizes 1000,10000 --output results.json
+    python -m benchmarks.run_benchmarks --compare results.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from agent.agent import Agent
+from agent.tracing import Tracer
+from agent import search_index
+from agent.tools import list_files
+
+from benchmarks.mock_backend import MockClient, MockMessages, load_transcript, transcript_responses
+from benchmarks import synthetic_repo
+
+SCHEMA = "codeforge-benchmarks/1"
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_TURNS = 200
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 0.25
+# Timings below this are too noisy to flag as regressions
+MIN_COMPARED_SECONDS = 0.001
+TRANSCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts")
+BENCHMARKS = ("startup", "turn_overhead", "history_growth", "tool_throughput", "transcript_replay")
+# Top-level packages that must not be imported before they are needed; each costs tens of milliseconds or more
+HEAVY_MODULES = ("anthropic", "httpx", "pydantic", "dotenv")
+STARTUP_RUNS = 5
+PROMPT_MARKER = "YOUR INPUT".encode("utf-8")
+
+
+class BenchmarkAgent(Agent):
+    """An Agent that collects errors instead of printing them, so a diverging replay fails the run."""
+    def __init__(self, messages: MockMessages, streaming: bool = False, tracer: Tracer = None):
+        super().__init__(client=MockClient(messages), tracer=tracer)
+        self.streaming = streaming
+        self.errors = []
+
+    def _print_error(self, title: str, error: Exception):
+        self.errors.append(f"{title}: {error}")
+
+    def run_turn(self, user_input: str):
+        super().run_turn(user_input)
+        if self.errors:
+            raise RuntimeError(f"Benchmark turn failed: {self.errors[0]}")
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _timings(prefix: str, durations: list) -> dict:
+    return {
+        f"{prefix}_mean_seconds": sum(durations) / len(durations),
+        f"{prefix}_p50_seconds": _percentile(durations, 0.5),
+        f"{prefix}_p95_seconds": _percentile(durations, 0.95),
+    }
+
+
+def _history_size(agent: Agent) -> dict:
+    return {
+        "history_messages": len(agent.conversation_history),
+        "history_tokens": agent.history_manager.total_tokens(agent.conversation_history),
+        "history_bytes": len(json.dumps(agent.conversation_history, default=str)),
+    }
+
+
+@contextlib.contextmanager
+def _quiet():
+    """The agent prints its whole transcript; keep it out of the benchmark output."""
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@contextlib.contextmanager
+def _cold_caches(root: str):
+    """Fresh process-wide directory listings and a new, empty search index for root."""
+    list_files.invalidate()
+    with search_index._indexes_lock:
+        entry = search_index._indexes.pop(("search", os.path.realpath(root)), None)
+    if entry is not None:
+        entry[0].close()
+    previous = os.environ.get("AGENT_INDEX_DIR")
+    with tempfile.TemporaryDirectory() as index_dir:
+        os.environ["AGENT_INDEX_DIR"] = index_dir
+        try:
+            yield
+        finally:
+            with search_index._indexes_lock:
+                entry = search_index._indexes.pop(("search", os.path.realpath(root)), None)
+            if entry is not None:
+                entry[0].close()
+            if previous is None:
+                os.environ.pop("AGENT_INDEX_DIR", None)
+            else:
+                os.environ["AGENT_INDEX_DIR"] = previous
+
+
+def bench_turn_overhead(turns: int, streaming: bool, latency: float) -> dict:
+    """Text-only turns: what the agent itself costs per model round trip as the history grows."""
+    reply = "This is a synthetic reply. " * 20
+    responses = [{"content": [{"type": "text", "text": f"Reply {i}. {reply}"}]} for i in range(turns)]
+    agent = BenchmarkAgent(MockMessages(responses, latency=latency), streaming=streaming)
+    durations = []
+    with _quiet():
+        for i in range(turns):
+            started = time.perf_counter()
+            agent.run_turn(f"Message {i}. " + "Please keep going with the task. " * 15)
+            durations.append(time.perf_counter() - started)
+    metrics = _timings("turn", durations)
+    # The part of each turn not spent waiting for the (simulated) model
+    metrics["overhead_p50_seconds"] = max(0.0, metrics["turn_p50_seconds"] - latency)
+    metrics.update(_history_size(agent))
+    agent.end_session()
+    return metrics
+
+
+def bench_history_growth(root: str, turns: int) -> dict:
+    """Turns that each read a different file: how history tokens and bytes grow, and where compaction caps them."""
+    responses = []
+    for i in range(turns):
+        responses.append({"content": [{"type": "tool_use", "id": f"toolu_{i:05d}", "name": "read_file",
+                                       "input": {"path": os.path.join(root, synthetic_repo.module_path(i))}}]})
+        responses.append({"content": [{"type": "text", "text": f"File {i} defines handler_{i} and its helpers."}]})
+    agent = BenchmarkAgent(MockMessages(responses))
+    tokens_by_turn, bytes_by_turn, durations = [], [], []
+    with _quiet():
+        for i in range(turns):
+            started = time.perf_counter()
+            agent.run_turn(f"Summarize module {i}.")
+            durations.append(time.perf_counter() - started)
+            size = _history_size(agent)
+            tokens_by_turn.append(size["history_tokens"])
+            bytes_by_turn.append(size["history_bytes"])
+    metrics = _timings("turn", durations)
+    metrics.update(_history_size(agent))
+    metrics.update({
+        "token_budget": agent.history_manager.token_budget,
+        "max_history_tokens": max(tokens_by_turn),
+        "tokens_by_turn": tokens_by_turn,
+        "bytes_by_turn": bytes_by_turn,
+    })
+    agent.end_session()
+    return metrics
+
+
+def bench_tool_throughput(root: str, repeats: int) -> dict:
+    """
+    Each tool call through the agent's tool path. cold: empty listing and search indexes; warm: the
+    process-wide indexes are built but the session's result cache is cleared; cached: repeated
+    call within the session.
+    """
+    calls = {
+        "list_files": ("list_files", {"path": root}),
+        "list_files_recursive": ("list_files", {"path": root, "recursive": True}),
+        "search_code_literal": ("search_code", {"query": "TODO: validate", "path": root, "case_sensitive": True}),
+        "search_code_regex": ("search_code", {"query": r"def handler_\d+7\(", "path": root, "regex": True}),
+        "read_file": ("read_file", {"path": os.path.join(root, synthetic_repo.module_path(1))}),
+    }
+    metrics = {}
+    with _quiet(), _cold_caches(root):
+        agent = BenchmarkAgent(MockMessages([]))
+        for label, (tool_name, tool_input) in calls.items():
+            started = time.perf_counter()
+            result = agent._invoke_tool(tool_name, tool_input)
+            cold = time.perf_counter() - started
+            if result.get("status") != "success":
+                raise RuntimeError(f"{label} failed: {result}")
+
+            warm = []
+            for _ in range(repeats):
+                agent.tool_cache.invalidate()
+                started = time.perf_counter()
+                agent._invoke_tool(tool_name, tool_input)
+                warm.append(time.perf_counter() - started)
+            cached = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                agent._invoke_tool(tool_name, tool_input)
+                cached.append(time.perf_counter() - started)
+
+            warm_p50 = _percentile(warm, 0.5)
+            metrics[label] = {
+                "cold_seconds": cold,
+                "warm_p50_seconds": warm_p50,
+                "cached_p50_seconds": _percentile(cached, 0.5),
+                "warm_calls_per_second": 1 / warm_p50 if warm_p50 else None,
+                "result_bytes": len(json.dumps(result, default=str)),
+            }
+        agent.end_session()
+    return metrics
+
+
+def bench_transcript_replay(root: str, transcript: dict, latency: float, streaming: bool) -> dict:
+    """Replay a recorded session end to end, splitting each turn into model, tool and agent time."""
+    variables = {
+        "root": root,
+        "target": synthetic_repo.module_path(42),
+        "todo_0": synthetic_repo.module_path(0),
+        "todo_1": synthetic_repo.module_path(synthetic_repo.TODO_EVERY),
+    }
+    tracer = Tracer(enabled=True)
+    agent = BenchmarkAgent(MockMessages(transcript_responses(transcript), latency=latency, variables=variables),
+                           streaming=streaming, tracer=tracer)
+    with _quiet(), _cold_caches(root):
+        started = time.perf_counter()
+        for turn in transcript["turns"]:
+            agent.run_turn(turn["user"])
+        wall = time.perf_counter() - started
+        agent.end_session()
+
+    summary = tracer.summary()
+    turn_seconds = summary["turn"]["total_seconds"]
+    model_seconds = summary["model_call"]["total_seconds"]
+    tool_spans = {name: entry for name, entry in summary.items() if name.startswith("tool:")}
+    tool_seconds = sum(entry["total_seconds"] for entry in tool_spans.values())
+    metrics = {
+        "wall_seconds": wall,
+        "turns": summary["turn"]["count"],
+        "model_calls": summary["model_call"]["count"],
+        "tool_calls": sum(entry["count"] for entry in tool_spans.values()),
+        "model_seconds": model_seconds,
+        "tool_seconds": tool_seconds,
+        # Tools run concurrently within a batch, so this can undercount the agent's own time
+        "agent_overhead_seconds": max(0.0, turn_seconds - model_seconds - tool_seconds),
+        "tool_result_bytes": sum(entry.get("result_bytes", 0) for entry in tool_spans.values()),
+        "tools": {name[len("tool:"):]: {"count": entry["count"], "total_seconds": entry["total_seconds"]}
+                  for name, entry in tool_spans.items()},
+    }
+    metrics.update(_history_size(agent))
+    return metrics
+
+
+def import_profile(module: str = "run") -> dict:
+    """Import module in a fresh interpreter under -X importtime: its cumulative import time and every module it loaded."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=project_root,
+                               capture_output=True, text=True, timeout=120)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {completed.stderr[-2000:]}")
+    seconds, modules = None, set()
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue # The header line
+        modules.add(name.strip())
+        if name.strip() == module:
+            seconds = int(cumulative) / 1e6
+    return {"seconds": seconds, "modules": modules}
+
+
+def time_to_first_prompt() -> float:
+    """Seconds from starting run.py until it shows the input prompt; the process is killed after that."""
+    env = dict(os.environ, ANTHROPIC_API_KEY=os.getenv("ANTHROPIC_API_KEY") or "benchmark-key")
+    env.pop("AGENT_ASYNC", None)
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(project_root, "run.py")], cwd=project_root, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        output = b""
+        while PROMPT_MARKER not in output:
+            chunk = process.stdout.read1(4096) if hasattr(process.stdout, "read1") else process.stdout.read(1)
+            if not chunk:
+                raise RuntimeError(f"run.py exited before showing a prompt: {output[-2000:]!r}")
+            output += chunk
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def bench_startup(runs: int = STARTUP_RUNS) -> dict:
+    """Cold start of the CLI: import time of run.py, time until the first prompt, and heavy modules loaded eagerly."""
+    profiles = [import_profile("run") for _ in range(runs)]
+    prompts = [time_to_first_prompt() for _ in range(runs)]
+    metrics = _timings("import", [profile["seconds"] for profile in profiles])
+    metrics.update(_timings("first_prompt", prompts))
+    metrics["modules_imported"] = len(profiles[0]["modules"])
+    metrics["heavy_modules"] = sorted(name for name in profiles[0]["modules"] if name.split(".")[0] in HEAVY_MODULES
+                                      and "." not in name)
+    return metrics
+
+
+def measure(fn, memory: bool) -> dict:
+    """Run fn for its metrics; with memory, run it again under tracemalloc for the peak allocation."""
+    metrics = fn()
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            metrics["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return metrics
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=project_root, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def run_suite(sizes, turns: int = DEFAULT_TURNS, repeats: int = DEFAULT_REPEATS, latency: float = 0.0,
+              cache_dir: str = None, memory: bool = True, only=None, transcript_path: str = None, log=None) -> dict:
+    """Run the selected benchmarks and return the report: schema, environment, config and a list of results."""
+    only = set(only or BENCHMARKS)
+    cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "codeforge-benchmarks")
+    transcript_path = transcript_path or os.path.join(TRANSCRIPTS_DIR, "explore_and_edit.json")
+    transcript = load_transcript(transcript_path)
+    results = []
+
+    def record(name: str, params: dict, fn, memory: bool = memory):
+        if log:
+            print(f"[benchmarks] {name} {json.dumps(params, sort_keys=True)}", file=log, flush=True)
+        started = time.perf_counter()
+        metrics = measure(fn, memory)
+        results.append({"name": name, "params": params, "metrics": metrics,
+                        "elapsed_seconds": time.perf_counter() - started})
+
+    if "startup" in only:
+        # Measured in fresh interpreters, so there is no memory pass
+        record("startup", {"runs": STARTUP_RUNS}, bench_startup, memory=False)
+
+    if "turn_overhead" in only:
+        for streaming in (False, True):
+            record("turn_overhead", {"turns": turns, "streaming": streaming, "latency": latency},
+                   lambda streaming=streaming: bench_turn_overhead(turns, streaming, latency))
+
+    repos = {}
+    for size in sizes:
+        if only & {"history_growth", "tool_throughput", "transcript_replay"}:
+            started = time.perf_counter()
+            repos[size] = synthetic_repo.ensure_repo(cache_dir, size)
+            if log:
+                print(f"[benchmarks] repository of {size} files ready in {time.perf_counter() - started:.1f}s",
+                      file=log, flush=True)
+
+    if "history_growth" in only and sizes:
+        root, _manifest = repos[min(sizes)]
+        history_turns = min(turns, min(sizes))
+        record("history_growth", {"turns": history_turns, "files": min(sizes)},
+               lambda: bench_history_growth(root, history_turns))
+
+    for size in sizes:
+        if size not in repos:
+            continue
+        root, _manifest = repos[size]
+        if "tool_throughput" in only:
+            record("tool_throughput", {"files": size, "repeats": repeats},
+                   lambda root=root: bench_tool_throughput(root, repeats))
+        if "transcript_replay" in only:
+            record("transcript_replay", {"files": size, "transcript": transcript["name"], "latency": latency},
+                   lambda root=root: bench_transcript_replay(root, transcript, latency, streaming=False))
+
+    return {
+        "schema": SCHEMA,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": environment(),
+        "config": {"sizes": list(sizes), "turns": turns, "repeats": repeats, "latency": latency,
+                   "memory": memory, "benchmarks": sorted(only)},
+        "results": results,
+    }
+
+
+def _flatten(metrics: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Timings (*_seconds) and sizes (*_bytes, *_tokens) that grew by more than threshold relative to
+    the baseline run with the same benchmark and parameters. Returns one dict per regression.
+    """
+    baseline_results = {(result["name"], json.dumps(result["params"], sort_keys=True)): result
+                        for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        previous = baseline_results.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if previous is None:
+            continue
+        before_metrics = _flatten(previous["metrics"])
+        for key, after in _flatten(result["metrics"]).items():
+            if not key.endswith(("_seconds", "_bytes", "_tokens")) or key not in before_metrics:
+                continue
+            before = before_metrics[key]
+            if key.endswith("_seconds") and max(before, after) < MIN_COMPARED_SECONDS:
+                continue
+            if before > 0 and after > before * (1 + threshold):
+                regressions.append({"name": result["name"], "params": result["params"], "metric": key,
+                                    "baseline": before, "current": after, "ratio": after / before})
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline agent benchmarks against a mock Messages backend.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated file counts of the synthetic repositories.")
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="Turns in the overhead and history benchmarks.")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Repeats per tool call in the throughput benchmark.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per model call.")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}.")
+    parser.add_argument("--transcript", metavar="FILE", help="Recorded transcript to replay (default: transcripts/explore_and_edit.json).")
+    parser.add_argument("--cache-dir", metavar="DIR", help="Where synthetic repositories are generated and reused.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass that measures peak memory.")
+    parser.add_argument("--output", metavar="FILE", default="-", help="Where the JSON report is written (default: stdout).")
+    parser.add_argument("--compare", metavar="FILE", help="Baseline report; exit with status 1 if anything regressed.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Relative growth counted as a regression.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    only = [name.strip() for name in args.only.split(",")] if args.only else None
+    unknown = set(only or ()) - set(BENCHMARKS)
+    if unknown:
+        print(f"Unknown benchmarks: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    report = run_suite(sizes, turns=args.turns, repeats=args.repeats, latency=args.latency,
+                       cache_dir=args.cache_dir, memory=not args.no_memory, only=only,
+                       transcript_path=args.transcript, log=sys.stderr)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            report["regressions"] = compare(report, json.load(f), args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+    for regression in report.get("regressions", []):
+        print(f"[benchmarks] regression: {regression['name']} {json.dumps(regression['params'], sort_keys=True)} "
+              f"{regression['metric']} {regression['baseline']:.6g} -> {regression['current']:.6g} "
+              f"(×{regression['ratio']:.2f})", file=sys.stderr)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import os
+import json
+import random
+
+FILES_PER_DIRECTORY = 50
+DIRECTORIES_PER_LEVEL = 10
+# Every this many files carries a TODO marker, so searches have a predictable number of hits
+TODO_EVERY = 97
+MANIFEST_NAME = ".codeforge-bench.json"
+
+
+def module_path(index: int) -> str:
+    """Relative path of the index-th file: its directory is the base-10 digits of index // FILES_PER_DIRECTORY."""
+    directory = index // FILES_PER_DIRECTORY
+    parts = []
+    while True:
+        parts.append(f"pkg_{directory % DIRECTORIES_PER_LEVEL}")
+        directory //= DIRECTORIES_PER_LEVEL
+        if not directory:
+            break
+    return os.path.join(*reversed(parts), f"module_{index:06d}.py")
+
+
+def module_source(index: int, rng: random.Random) -> str:
+    lines = [f'"""Synthetic module {index}."""', "", "import os", ""]
+    for function in range(rng.randint(3, 8)):
+        name = f"handler_{index}" if function == 0 else f"helper_{index}_{function}"
+        lines.append(f"def {name}(value, scale={rng.randint(1, 9)}):")
+        if index % TODO_EVERY == 0 and function == 0:
+            lines.append("    # TODO: validate value before scaling")
+        lines.append(f"    result = value * scale + {rng.randint(0, 1000)}")
+        lines.append(f"    return os.path.join(str(result), 'item_{function}')")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate(root: str, file_count: int, seed: int = 0) -> dict:
+    """
+    Write a deterministic Python repository of file_count files under root, with a .gitignore and an
+    ignored build directory. Returns its manifest.
+    """
+    rng = random.Random(seed)
+    total_bytes = 0
+    for index in range(file_count):
+        path = os.path.join(root, module_path(index))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        source = module_source(index, rng)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(source)
+        total_bytes += len(source)
+    os.makedirs(os.path.join(root, "build"), exist_ok=True)
+    with open(os.path.join(root, "build", "artifact.py"), 'w', encoding='utf-8') as f:
+        f.write("# Ignored build output\n")
+    with open(os.path.join(root, ".gitignore"), 'w', encoding='utf-8') as f:
+        f.write("build/\n")
+
+    manifest = {"file_count": file_count, "seed": seed, "total_bytes": total_bytes,
+                "todo_files": len(range(0, file_count, TODO_EVERY))}
+    with open(os.path.join(root, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def ensure_repo(cache_dir: str, file_count: int, seed: int = 0):
+    """A synthetic repository of file_count files under cache_dir, generated only if not there yet. Returns (root, manifest)."""
+    root = os.path.join(cache_dir, f"repo-{file_count}-{seed}")
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return root, json.load(f)
+    except (OSError, ValueError):
+        pass
+    return root, generate(root, file_count, seed)
@@ -2,11 +2,14 @@
 
 import os
 import sys
+import argparse
+import contextlib
 
 project_root = os.path.dirname(os.path.abspath(__file__))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+# Only the interactive agent is imported up front; batch, server and async mode (and asyncio) load when used
 try:
     from agent.agent import Agent
 except ModuleNotFoundError as e:
@@ -15,13 +18,92 @@ except ModuleNotFoundError as e:
     print("Or that 'coding_agent_python' directory is in your PYTHONPATH.")
     sys.exit(1)
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chat with the coding agent, or run a file of tasks headlessly.")
+    parser.add_argument("--resume", metavar="SESSION", nargs="?", const="latest",
+                        help="Continue a saved chat session: its id, or the latest one if omitted.")
+    parser.add_argument("--serve", action="store_true", help="Serve many chat sessions over HTTP and WebSocket instead of the terminal.")
+    parser.add_argument("--host", help="Address the server listens on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, help="Port the server listens on (default: 8000).")
+    parser.add_argument("--batch", metavar="FILE", help="Run the tasks in a JSONL file instead of starting the chat.")
+    parser.add_argument("--workers", type=int, help="Tasks run concurrently in batch mode.")
+    parser.add_argument("--output", metavar="FILE", default="-", help="Where batch results are written as JSONL (default: stdout).")
+    parser.add_argument("--workdir", metavar="DIR", help="Parent of the per-task working directories (default: a new temporary directory).")
+    parser.add_argument("--source", metavar="DIR", help="Copy this directory into each task's working directory.")
+    parser.add_argument("--requests-per-minute", type=float, help="Limit on model requests across all batch workers.")
+    parser.add_argument("--retries", type=int, help="Retries per model request after transient API errors.")
+    parser.add_argument("--allow-shell", action="store_true", help="Approve every shell command in batch mode (declined by default).")
+    parser.add_argument("--log", metavar="FILE", help="Where the agents' transcript goes in batch mode (default: discarded).")
+    return parser.parse_args(argv)
+
+def run_batch(args):
+    """Run a task file; agent output goes to the log so only results reach the output."""
+    import asyncio
+    from agent import batch
+    workers = batch.DEFAULT_WORKERS if args.workers is None else args.workers
+    retries = batch.DEFAULT_RETRIES if args.retries is None else args.retries
+    results = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    try:
+        with open(args.log or os.devnull, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+            counts = asyncio.run(batch.run_batch(
+                args.batch, results, workers=workers, workdir=args.workdir, source=args.source,
+                requests_per_minute=args.requests_per_minute, retries=retries, allow_shell=args.allow_shell
+            ))
+    finally:
+        if results is not sys.stdout:
+            results.close()
+    print(f"Batch finished: {counts['success']} succeeded, {counts['error']} failed.", file=sys.stderr)
+    return 1 if counts["error"] else 0
+
+def run_server(args):
+    """Serve agent sessions until interrupted."""
+    import asyncio
+    from agent import server
+    host = args.host or server.DEFAULT_HOST
+    port = server.DEFAULT_PORT if args.port is None else args.port
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        print("Server stopped.", file=sys.stderr)
+    return 0
+
+def use_journal(agent, resume=None):
+    """Record the chat in a session journal (with AGENT_JOURNAL=1), or continue a saved session."""
+    from agent.journal import SessionJournal, prune_sessions
+    if resume:
+        try:
+            journal = SessionJournal.open(resume)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"📂 Resuming session {journal.session_id} ({len(journal.history)} messages).")
+    elif os.getenv("AGENT_JOURNAL", "").lower() in ("1", "true", "yes"):
+        prune_sessions()
+        journal = SessionJournal.create(agent.session_id, workspace=os.getcwd(), model=agent.model_name)
+    else:
+        return
+    agent.use_journal(journal)
+
 def main():
     """
     Main function to initialize and run the agent.
     """
+    args = parse_args()
     try:
-        agent_instance = Agent()
-        agent_instance.run()
+        if args.batch:
+            sys.exit(run_batch(args))
+        elif args.serve:
+            sys.exit(run_server(args))
+        elif os.getenv("AGENT_ASYNC", "").lower() in ("1", "true", "yes"):
+            import asyncio
+            from agent.async_agent import AsyncAgent
+            agent_instance = AsyncAgent()
+            use_journal(agent_instance, args.resume)
+            asyncio.run(agent_instance.run())
+        else:
+            agent_instance = Agent()
+            use_journal(agent_instance, args.resume)
+            agent_instance.run()
     except ValueError as e:
         print(f"Configuration Error: {e}")
         print("Please ensure your ANTHROPIC_API_KEY is set in a .env file in the project root ('coding_agent_python/.env'),")
@@ -30,4 +112,4 @@ def main():
         print(f"An unexpected error occurred during agent execution: {e}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
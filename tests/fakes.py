@@ -0,0 +1,81 @@
+# Fake Messages API responses and streams, shared by the tests that drive an agent offline, and file helpers
+
+import os
+import json
+from types import SimpleNamespace
+
+
+class FakeBlock(SimpleNamespace):
+    """A response content block; model_dump() like the SDK's blocks."""
+    def model_dump(self):
+        return dict(self.__dict__)
+
+
+def text_response(text, **fields):
+    return SimpleNamespace(content=[FakeBlock(type="text", text=text)], stop_reason="end_turn", **fields)
+
+
+def tool_use_response(tool_use_id, name, tool_input, **fields):
+    return SimpleNamespace(content=[FakeBlock(type="tool_use", id=tool_use_id, name=name, input=tool_input)], stop_reason="tool_use", **fields)
+
+
+def stream_events(message, input_chunks=None):
+    """
+    The stream events that deliver message: each block starts without its text or input, which
+    follow as deltas. input_chunks splits a tool_use's input JSON over several deltas.
+    """
+    events = []
+    for index, block in enumerate(message.content):
+        start = FakeBlock(**{key: value for key, value in block.__dict__.items() if key not in ("text", "input")})
+        events.append(SimpleNamespace(type="content_block_start", index=index, content_block=start))
+        if block.type == "text":
+            deltas = [SimpleNamespace(type="text_delta", text=block.text)]
+        else:
+            deltas = [SimpleNamespace(type="input_json_delta", partial_json=chunk) for chunk in input_chunks or [json.dumps(block.input)]]
+        events += [SimpleNamespace(type="content_block_delta", index=index, delta=delta) for delta in deltas]
+        events.append(SimpleNamespace(type="content_block_stop", index=index))
+    return events
+
+
+class FakeStream:
+    """Mimics the SDK's MessageStream context manager for a single response."""
+    def __init__(self, message, input_chunks=None):
+        self.events = stream_events(message, input_chunks)
+        self.message = message
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def get_final_message(self):
+        return self.message
+
+
+class FakeAsyncStream(FakeStream):
+    """Mimics the SDK's AsyncMessageStream."""
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+    async def get_final_message(self):
+        return self.message
+
+
+def write_file(root, relative_path, content=""):
+    """Write content to root/relative_path, creating its directories; returns the file's path."""
+    file_path = os.path.join(root, relative_path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as f:
+        f.write(content)
+    return file_path
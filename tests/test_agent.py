@@ -1 +1,292 @@
-# Placeholder for agent tests 
\ No newline at end of file
+# Tests for the agent's model/tool loop, driven by a fake Messages client
+
+import os
+import json
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+pytest.importorskip("anthropic")
+
+from agent.agent import Agent
+from agent.tools import read_file
+from fakes import FakeBlock, FakeStream, text_response, tool_use_response
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setenv("AGENT_STREAMING", "1")
+    return Agent()
+
+
+def test_streamed_tool_use_is_dispatched_when_its_block_closes(agent, tmp_path):
+    target = tmp_path / "notes.txt"
+    target.write_text("streamed content")
+
+    path_json = str(target).replace("\\", "\\\\")
+    streams = [
+        FakeStream(tool_use_response("toolu_1", "read_file", {"path": str(target)}), ['{"path": "', path_json, '"}']),
+        FakeStream(text_response("Done.")),
+    ]
+    dispatched = []
+
+    def fake_stream(**kwargs):
+        return streams.pop(0)
+
+    agent.client = SimpleNamespace(messages=SimpleNamespace(stream=fake_stream))
+    original_submit = agent.scheduler.submit
+
+    def recording_submit(fn, tool_call):
+        dispatched.append((tool_call["name"], tool_call["input"]))
+        return original_submit(fn, tool_call)
+
+    agent.scheduler.submit = recording_submit
+
+    with patch("builtins.input", side_effect=["read it", "exit"]):
+        agent.run()
+
+    assert dispatched == [("read_file", {"path": str(target)})]
+    tool_result_message = agent.conversation_history[2]
+    assert tool_result_message["content"][0]["tool_use_id"] == "toolu_1"
+    assert "streamed content" in tool_result_message["content"][0]["content"]
+    assert agent.conversation_history[-1]["content"][0]["text"] == "Done."
+
+
+def test_mutating_tools_wait_for_the_complete_response(agent, tmp_path):
+    target = tmp_path / "config.py"
+    target.write_text("DEBUG = False\n")
+
+    class BrokenStream(FakeStream):
+        def __iter__(self):
+            yield from self.events
+            raise ConnectionError("stream dropped")
+
+    edit = {"path": str(target), "old_str": "DEBUG = False", "new_str": "DEBUG = True"}
+    agent.client = SimpleNamespace(messages=SimpleNamespace(stream=lambda **kwargs: BrokenStream(tool_use_response("toolu_1", "edit_file", edit))))
+
+    with patch("builtins.input", side_effect=["turn on debugging", "exit"]):
+        agent.run()
+    agent.scheduler.pool.shutdown(wait=True)
+
+    assert target.read_text() == "DEBUG = False\n"
+    assert [message["role"] for message in agent.conversation_history] == ["user"]
+
+
+def test_interactive_tools_are_not_dispatched_early(agent):
+    streams = [
+        FakeStream(tool_use_response("toolu_1", "run_shell_command", {"command": "echo hi"}), ['{"command": "echo hi"}']),
+        FakeStream(text_response("Ran it.")),
+    ]
+
+    def fake_stream(**kwargs):
+        return streams.pop(0)
+
+    agent.client = SimpleNamespace(messages=SimpleNamespace(stream=fake_stream))
+
+    with patch("builtins.input", side_effect=["run echo", "y", "exit"]):
+        agent.run()
+
+    tool_result_message = agent.conversation_history[2]
+    assert tool_result_message["content"][0]["tool_use_id"] == "toolu_1"
+    assert "hi" in tool_result_message["content"][0]["content"]
+
+
+def _multi_tool_response(tool_calls):
+    blocks = [FakeBlock(type="tool_use", id=tool_use_id, name=name, input=tool_input) for tool_use_id, name, tool_input in tool_calls]
+    return SimpleNamespace(content=blocks, stop_reason="tool_use")
+
+
+def test_parallel_tool_results_keep_tool_use_order(monkeypatch, tmp_path):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    agent = Agent()
+
+    paths = []
+    for i in range(5):
+        target = tmp_path / f"file_{i}.txt"
+        target.write_text(f"content {i}")
+        paths.append(str(target))
+
+    responses = [
+        _multi_tool_response([(f"toolu_{i}", "read_file", {"path": path}) for i, path in enumerate(paths)]),
+        text_response("Read them all."),
+    ]
+    agent.client = SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: responses.pop(0)))
+
+    with patch("builtins.input", side_effect=["read all", "exit"]):
+        agent.run()
+
+    tool_results = agent.conversation_history[2]["content"]
+    assert [result["tool_use_id"] for result in tool_results] == [f"toolu_{i}" for i in range(5)]
+    for i, result in enumerate(tool_results):
+        assert f"content {i}" in result["content"]
+
+
+def test_unchanged_rereads_refer_back_to_the_earlier_result(monkeypatch, tmp_path):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    agent = Agent()
+    target = tmp_path / "notes.txt"
+    target.write_text("original content")
+
+    def read():
+        return _multi_tool_response([(f"toolu_{len(agent.conversation_history)}", "read_file", {"path": str(target)})])
+
+    def edit():
+        return _multi_tool_response([("toolu_edit", "edit_file", {"path": str(target), "old_str": "original", "new_str": "edited"})])
+
+    done = text_response("Done.")
+    script = [read, read, edit, read, lambda: done]
+    agent.client = SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: script.pop(0)()))
+
+    with patch("builtins.input", side_effect=["read it twice, edit, read again", "exit"]):
+        agent.run()
+
+    results = [message["content"][0]["content"] for message in agent.conversation_history[2::2][:4]]
+    assert "original content" in results[0]
+    assert '"unchanged_since": "toolu_1"' in results[1] and "original content" not in results[1]
+    assert "edited content" in results[3]
+
+
+def test_reread_sends_the_content_again_once_the_earlier_result_is_elided(monkeypatch, tmp_path):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    agent = Agent()
+    target = tmp_path / "notes.txt"
+    target.write_text("original content")
+
+    agent.tool_cache.put("read_file", {"path": str(target)}, agent.tool_cache.fingerprint("read_file", {"path": str(target)}),
+                         {"status": "success", "content": "original content"})
+    cached = agent.tool_cache.get("read_file", {"path": str(target)}, agent.tool_cache.fingerprint("read_file", {"path": str(target)}))
+    agent.tool_cache.remember("read_file", {"path": str(target)}, "toolu_1", cached["result"], "full content")
+    agent.conversation_history = [
+        {"role": "user", "content": "read"},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": "toolu_1", "name": "read_file", "input": {"path": str(target)}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "toolu_1", "content": '{"status": "success", "note": "removed"}'}]},
+    ]
+
+    assert agent._invoke_tool("read_file", {"path": str(target)})["content"] == "original content"
+
+
+def test_reread_after_an_edit_returns_a_diff(monkeypatch, tmp_path):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    agent = Agent()
+    target = tmp_path / "big.py"
+    target.write_text("".join(f"x_{i} = {i}\n" for i in range(3000)))
+
+    script = [
+        _multi_tool_response([("toolu_read", "read_file", {"path": str(target)})]),
+        _multi_tool_response([("toolu_edit", "edit_file", {"path": str(target), "old_str": "x_1500 = 1500\n", "new_str": "x_1500 = 'changed'\n"})]),
+        _multi_tool_response([("toolu_reread", "read_file", {"path": str(target)})]),
+        text_response("Checked."),
+    ]
+    agent.client = SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: script.pop(0)))
+
+    with patch("builtins.input", side_effect=["edit and check", "exit"]):
+        agent.run()
+
+    first_read, reread = agent.conversation_history[2]["content"][0]["content"], agent.conversation_history[6]["content"][0]["content"]
+    assert '"diff_since": "toolu_read"' in reread
+    assert "+x_1500 = 'changed'" in reread
+    assert len(reread) * 50 < len(first_read)
+
+
+def test_file_reads_under_the_read_cap_are_sent_in_full(monkeypatch, tmp_path):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    agent = Agent() # The default spool threshold is far below read_file's cap
+    target = tmp_path / "big.py"
+    target.write_text("".join(f"x_{i} = {i}\n" for i in range(5000)))
+    assert agent.spool.threshold < target.stat().st_size < read_file.MAX_BYTES
+
+    script = [
+        _multi_tool_response([("toolu_read", "read_file", {"path": str(target)})]),
+        _multi_tool_response([("toolu_reread", "read_file", {"path": str(target)})]),
+        text_response("Done."),
+    ]
+    agent.client = SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: script.pop(0)))
+
+    with patch("builtins.input", side_effect=["read it twice", "exit"]):
+        agent.run()
+
+    read = json.loads(agent.conversation_history[2]["content"][0]["content"])
+    reread = json.loads(agent.conversation_history[4]["content"][0]["content"])
+    assert "spooled" not in read and read["content"] == target.read_text()
+    assert reread["unchanged_since"] == "toolu_read"
+
+
+def test_turns_model_calls_and_tools_are_traced(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    trace_file = tmp_path / "trace.jsonl"
+    monkeypatch.setenv("AGENT_TRACE_FILE", str(trace_file))
+    agent = Agent()
+    target = tmp_path / "notes.txt"
+    target.write_text("traced")
+
+    usage = SimpleNamespace(input_tokens=120, output_tokens=30, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+    responses = [
+        tool_use_response("toolu_1", "read_file", {"path": str(target)}, usage=usage),
+        text_response("Done.", usage=usage),
+    ]
+    agent.client = SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: responses.pop(0)))
+
+    with patch("builtins.input", side_effect=["read it", "exit"]):
+        agent.run()
+
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert [span["name"] for span in spans] == ["model_call", "tool:read_file", "model_call", "turn"]
+    turn = spans[-1]
+    assert all(span["parent_id"] == turn["span_id"] for span in spans[:-1])
+    assert spans[0]["attributes"]["input_tokens"] == 120
+    assert spans[0]["attributes"]["stop_reason"] == "tool_use"
+    assert spans[0]["attributes"]["bytes_sent"] > 0
+    assert spans[1]["attributes"]["status"] == "success"
+    assert "SESSION TRACE SUMMARY" in capsys.readouterr().out
+
+
+def test_failed_model_call_keeps_the_turns_tool_work(monkeypatch, tmp_path):
+    import anthropic
+    from agent import resilience
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setenv("AGENT_API_RETRIES", "1")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    monkeypatch.setattr(resilience, "BASE_DELAY", 0.0)
+    agent = Agent()
+    target = tmp_path / "notes.txt"
+    target.write_text("expensive to compute")
+
+    def overloaded():
+        raise anthropic.APIConnectionError(request=None)
+
+    script = [
+        lambda: _multi_tool_response([("toolu_1", "read_file", {"path": str(target)})]),
+        overloaded, overloaded, # The first failure is retried, the second ends the turn
+        lambda: text_response("Resumed."),
+    ]
+    requests = []
+    def create(**kwargs):
+        requests.append(kwargs["messages"])
+        return script.pop(0)()
+    agent.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+
+    with patch("builtins.input", side_effect=["read it", "continue", "exit"]):
+        agent.run()
+
+    assert agent.retry_count == 1
+    # The tool result survived the failure and the next message was added after it
+    resumed = requests[-1][-1]
+    assert resumed["role"] == "user"
+    assert resumed["content"][0]["type"] == "tool_result" and "expensive to compute" in resumed["content"][0]["content"]
+    assert resumed["content"][1] == {"type": "text", "text": "continue"}
+    assert agent.conversation_history[-1]["content"][0]["text"] == "Resumed."
@@ -0,0 +1,179 @@
+# Tests for the asyncio agent, driven by a fake async Messages client
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+pytest.importorskip("anthropic")
+
+from agent.async_agent import AsyncAgent
+from fakes import FakeAsyncStream, text_response, tool_use_response
+
+
+class FakeAsyncMessages:
+    """Returns pre-built responses from an async create(), optionally waiting on an event first."""
+    def __init__(self, responses, gate=None):
+        self.responses = responses
+        self.gate = gate
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.gate is not None:
+            await self.gate.wait()
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def no_streaming(monkeypatch):
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    monkeypatch.delenv("AGENT_PERSISTENT_SHELL", raising=False)
+
+
+def test_run_turn_runs_tools_and_records_the_reply(tmp_path):
+    target = tmp_path / "notes.txt"
+    target.write_text("async content")
+    messages = FakeAsyncMessages([tool_use_response("toolu_1", "read_file", {"path": str(target)}), text_response("Read it.")])
+    agent = AsyncAgent(client=SimpleNamespace(messages=messages))
+
+    asyncio.run(agent.run_turn("read the notes"))
+
+    assert [message["role"] for message in agent.conversation_history] == ["user", "assistant", "user", "assistant"]
+    tool_result = agent.conversation_history[2]["content"][0]
+    assert tool_result["tool_use_id"] == "toolu_1"
+    assert "async content" in tool_result["content"]
+    assert agent.conversation_history[-1]["content"][0]["text"] == "Read it."
+
+
+def test_sessions_share_a_loop_and_a_client():
+    messages = FakeAsyncMessages([text_response("one"), text_response("two")])
+    client = SimpleNamespace(messages=messages)
+    first, second = AsyncAgent(client=client), AsyncAgent(client=client)
+
+    async def both():
+        await asyncio.gather(first.run_turn("hi"), second.run_turn("hello"))
+
+    asyncio.run(both())
+
+    assert len(messages.requests) == 2
+    assert len(first.conversation_history) == 2 and len(second.conversation_history) == 2
+    assert first.conversation_history[0]["content"] == "hi"
+    assert second.conversation_history[0]["content"] == "hello"
+
+
+def test_cancelling_a_turn_restores_the_history():
+    async def scenario():
+        gate = asyncio.Event() # Never set: the request stays in flight until cancelled
+        agent = AsyncAgent(client=SimpleNamespace(messages=FakeAsyncMessages([text_response("never")], gate)))
+        agent.conversation_history = [{"role": "user", "content": "earlier"}, {"role": "assistant", "content": [{"type": "text", "text": "ok"}]}]
+        turn = asyncio.ensure_future(agent.run_turn("slow question"))
+        await asyncio.sleep(0.05)
+        turn.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await turn
+        return agent
+
+    agent = asyncio.run(scenario())
+
+    assert [message["role"] for message in agent.conversation_history] == ["user", "assistant"]
+    assert agent.conversation_history[0]["content"] == "earlier"
+
+
+def test_shell_confirmation_goes_through_the_confirm_coroutine():
+    messages = FakeAsyncMessages([tool_use_response("toolu_1", "run_shell_command", {"command": "echo approved"}), text_response("Ran it.")])
+    agent = AsyncAgent(client=SimpleNamespace(messages=messages))
+    asked = []
+
+    async def confirm_command(command):
+        asked.append(command)
+        return True
+
+    agent.confirm_command = confirm_command
+
+    with patch("builtins.input", side_effect=AssertionError("input() must not be called")):
+        asyncio.run(agent.run_turn("run it"))
+
+    assert asked == ["echo approved"]
+    assert "approved" in agent.conversation_history[2]["content"][0]["content"]
+
+
+def test_streamed_response(monkeypatch, tmp_path):
+    monkeypatch.setenv("AGENT_STREAMING", "1")
+    stream = FakeAsyncStream(text_response("Streamed."))
+    agent = AsyncAgent(client=SimpleNamespace(messages=SimpleNamespace(stream=lambda **kwargs: stream)))
+
+    asyncio.run(agent.run_turn("stream please"))
+
+    assert agent.conversation_history[-1]["content"][0]["text"] == "Streamed."
+
+
+def test_slow_plugin_discovery_and_journal_writes_leave_the_loop_free(tmp_path):
+    import threading
+    from concurrent.futures import Future
+    from agent.journal import SessionJournal
+
+    agent = AsyncAgent(client=SimpleNamespace(messages=FakeAsyncMessages([text_response("Hi.")])))
+    agent._plugin_tools = plugins = Future() # Still being looked up
+    journal = SessionJournal.create(agent.session_id, str(tmp_path))
+    agent.use_journal(journal)
+    sync, sync_threads = journal.sync, []
+    journal.sync = lambda history: sync_threads.append(threading.current_thread()) or sync(history)
+
+    # If the turn blocked the loop on the lookup, this would end the wait, and the test would fail instead of hanging
+    timer = threading.Timer(5, lambda: plugins.done() or plugins.set_result([]))
+    timer.start()
+
+    async def scenario():
+        turn = asyncio.ensure_future(agent.run_turn("hi"))
+        ticks = 0
+        while ticks < 5: # The loop keeps running other tasks while the turn waits
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not turn.done()
+        plugins.set_result([])
+        await turn
+
+    asyncio.run(scenario())
+    timer.cancel()
+    agent.end_session()
+
+    assert sync_threads and threading.main_thread() not in sync_threads
+    assert SessionJournal.open(agent.session_id, str(tmp_path)).history == agent.conversation_history
+
+
+def test_a_cancelled_confirmation_is_declined_and_leaves_the_next_line_to_the_prompt(monkeypatch, tmp_path):
+    from agent import async_agent
+
+    read_end, write_end = os.pipe()
+    monkeypatch.setattr(async_agent, "stdin_reader", async_agent.StdinReader(os.fdopen(read_end)))
+    marker = tmp_path / "ran"
+    messages = FakeAsyncMessages([tool_use_response("toolu_1", "run_shell_command", {"command": f"touch {marker}"})])
+    agent = AsyncAgent(client=SimpleNamespace(messages=messages))
+
+    async def scenario():
+        turn = asyncio.ensure_future(agent.run_turn("run it"))
+        while not agent.confirmations:
+            await asyncio.sleep(0.01)
+        turn.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await turn
+        os.write(write_end, b"y\n")
+        return await asyncio.wait_for(agent.read_input("> "), 10)
+
+    with patch("builtins.input", side_effect=AssertionError("input() must not be called")):
+        next_line = asyncio.run(scenario())
+    agent.scheduler.pool.shutdown(wait=True)
+    os.close(write_end)
+
+    assert next_line == "y"
+    assert not marker.exists()
+    assert agent.conversation_history == []
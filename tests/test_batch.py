@@ -0,0 +1,155 @@
+# Tests for headless batch mode, driven by a fake async Messages client
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+anthropic = pytest.importorskip("anthropic")
+
+from agent import batch, resilience
+from fakes import text_response, tool_use_response
+
+
+class ScriptedMessages:
+    """Answers each task's prompt with a script: every prompt writes a file named after itself, then replies."""
+    def __init__(self, failures_before_success=0):
+        self.failures_left = failures_before_success
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.failures_left:
+            self.failures_left -= 1
+            raise anthropic.APIConnectionError(request=None)
+        messages = kwargs["messages"]
+        prompt = messages[0]["content"]
+        if len(messages) == 1:
+            return tool_use_response("toolu_1", "edit_file", {"path": "out.txt", "old_str": "", "new_str": prompt})
+        return text_response(f"wrote {prompt}")
+
+
+@pytest.fixture(autouse=True)
+def quiet_env(monkeypatch):
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    monkeypatch.delenv("AGENT_PERSISTENT_SHELL", raising=False)
+    monkeypatch.setattr(resilience, "BASE_DELAY", 0.0)
+
+
+def _write_tasks(tmp_path, lines):
+    tasks_path = tmp_path / "requests.jsonl"
+    tasks_path.write_text("\n".join(lines) + "\n")
+    return str(tasks_path)
+
+
+def test_tasks_run_in_isolated_workspaces(tmp_path):
+    tasks_path = _write_tasks(tmp_path, [
+        json.dumps({"request_id": "req-1", "title": "first", "body": "task"}),
+        json.dumps({"id": "req-2", "prompt": "second"}),
+        json.dumps({"prompt": "third"}),
+    ])
+    output = io.StringIO()
+    client = SimpleNamespace(messages=ScriptedMessages())
+
+    counts = asyncio.run(batch.run_batch(tasks_path, output, workers=2, workdir=str(tmp_path / "work"), client=client))
+
+    assert counts == {"success": 3, "error": 0}
+    results = {result["id"]: result for result in map(json.loads, output.getvalue().splitlines())}
+    assert set(results) == {"req-1", "req-2", "3"}
+    assert results["req-1"]["reply"] == "wrote first\n\ntask"
+    for result in results.values():
+        assert result["status"] == "success"
+        # Each task's relative path landed in its own workspace, not the process's cwd
+        with open(os.path.join(result["workspace"], "out.txt")) as f:
+            assert result["reply"] == f"wrote {f.read()}"
+    assert not os.path.exists("out.txt")
+
+
+def test_each_task_releases_its_tool_threads(tmp_path, monkeypatch):
+    agents = []
+    original_init = batch.BatchAgent.__init__
+    monkeypatch.setattr(batch.BatchAgent, "__init__", lambda self, *args, **kwargs: agents.append(self) or original_init(self, *args, **kwargs))
+    tasks_path = _write_tasks(tmp_path, [json.dumps({"prompt": "first"}), json.dumps({"prompt": "second"})])
+
+    asyncio.run(batch.run_batch(tasks_path, io.StringIO(), workers=1, workdir=str(tmp_path / "work"),
+                                client=SimpleNamespace(messages=ScriptedMessages())))
+
+    assert len(agents) == 2
+    for agent in agents:
+        with pytest.raises(RuntimeError): # A shut down pool refuses new work
+            agent.scheduler.pool.submit(lambda: None)
+
+
+def test_invalid_lines_are_reported_without_stopping_the_batch(tmp_path):
+    tasks_path = _write_tasks(tmp_path, ["not json", json.dumps({"title": ""}), json.dumps({"prompt": "fine"})])
+    output = io.StringIO()
+
+    counts = asyncio.run(batch.run_batch(tasks_path, output, workers=1, workdir=str(tmp_path / "work"),
+                                         client=SimpleNamespace(messages=ScriptedMessages())))
+
+    assert counts == {"success": 1, "error": 2}
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [result["status"] for result in results] == ["error", "error", "success"]
+    assert results[0]["id"] == "line 1"
+
+
+def test_transient_errors_are_retried_a_bounded_number_of_times(tmp_path):
+    tasks_path = _write_tasks(tmp_path, [json.dumps({"prompt": "retry me"})])
+
+    output = io.StringIO()
+    messages = ScriptedMessages(failures_before_success=2)
+    asyncio.run(batch.run_batch(tasks_path, output, workers=1, workdir=str(tmp_path / "ok"), retries=2,
+                                client=SimpleNamespace(messages=messages)))
+    result = json.loads(output.getvalue())
+    assert result["status"] == "success" and result["retries"] == 2
+
+    output = io.StringIO()
+    messages = ScriptedMessages(failures_before_success=5)
+    asyncio.run(batch.run_batch(tasks_path, output, workers=1, workdir=str(tmp_path / "failed"), retries=2,
+                                client=SimpleNamespace(messages=messages)))
+    result = json.loads(output.getvalue())
+    assert result["status"] == "error"
+    assert messages.calls == 3
+    assert "Connection error" in result["error"]
+
+
+def test_shell_commands_follow_the_batch_policy(tmp_path):
+    class ShellMessages:
+        async def create(self, **kwargs):
+            if len(kwargs["messages"]) == 1:
+                return tool_use_response("toolu_1", "run_shell_command", {"command": "pwd"})
+            return text_response(kwargs["messages"][-1]["content"][0]["content"])
+
+    tasks_path = _write_tasks(tmp_path, [json.dumps({"id": "shell", "prompt": "where am I"})])
+
+    output = io.StringIO()
+    asyncio.run(batch.run_batch(tasks_path, output, workdir=str(tmp_path / "declined"), client=SimpleNamespace(messages=ShellMessages())))
+    assert json.loads(json.loads(output.getvalue())["reply"])["status"] == "declined"
+
+    output = io.StringIO()
+    asyncio.run(batch.run_batch(tasks_path, output, workdir=str(tmp_path / "allowed"), allow_shell=True,
+                                client=SimpleNamespace(messages=ShellMessages())))
+    result = json.loads(output.getvalue())
+    assert json.loads(result["reply"])["stdout"].strip() == os.path.realpath(result["workspace"])
+
+
+def test_token_bucket_limits_the_rate():
+    async def acquire_all():
+        bucket = batch.TokenBucket(rate=20.0, capacity=1)
+        started = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # One token is available immediately; the other three arrive at 20 per second
+    assert asyncio.run(acquire_all()) >= 0.14
@@ -0,0 +1,71 @@
+# Smoke tests for the offline benchmark harness and its mock Messages backend
+
+import os
+import sys
+import pytest
+
+# Ensure the agent and benchmarks packages can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+pytest.importorskip("anthropic")
+
+from benchmarks.mock_backend import MockBackendError, MockMessages
+from benchmarks import run_benchmarks, synthetic_repo
+
+
+def test_mock_backend_replays_responses_and_checks_tool_results():
+    messages = MockMessages([
+        {"content": [{"type": "tool_use", "id": "toolu_1", "name": "read_file", "input": {"path": "{root}/a.py"}}]},
+        {"content": [{"type": "text", "text": "done"}]},
+    ], variables={"root": "/repo"})
+
+    first = messages.create(messages=[{"role": "user", "content": "hi"}])
+    assert first.stop_reason == "tool_use"
+    assert first.content[0].model_dump()["input"] == {"path": "/repo/a.py"}
+    assert first.usage.input_tokens > 0
+
+    # The next request has to answer the tool_use
+    with pytest.raises(MockBackendError):
+        messages.create(messages=[{"role": "user", "content": "ignored the tool"}])
+    with messages.stream(messages=[{"role": "user", "content": [{"type": "tool_result", "tool_use_id": "toolu_1", "content": "{}"}]}]) as stream:
+        events = list(stream)
+        final = stream.get_final_message()
+    assert final.stop_reason == "end_turn"
+    assert "".join(event.delta.text for event in events if event.type == "content_block_delta") == "done"
+
+
+def test_synthetic_repo_is_deterministic_and_reused(tmp_path):
+    root, manifest = synthetic_repo.ensure_repo(str(tmp_path), 120)
+    assert manifest["file_count"] == 120 and manifest["todo_files"] == 2
+    with open(os.path.join(root, synthetic_repo.module_path(42)), 'r', encoding='utf-8') as f:
+        assert "def handler_42(" in f.read()
+
+    assert synthetic_repo.ensure_repo(str(tmp_path), 120) == (root, manifest)
+
+
+def test_suite_produces_a_machine_readable_report(tmp_path):
+    report = run_benchmarks.run_suite([120], turns=3, repeats=1, cache_dir=str(tmp_path), memory=False)
+
+    assert report["schema"] == run_benchmarks.SCHEMA
+    by_name = {}
+    for result in report["results"]:
+        by_name.setdefault(result["name"], []).append(result)
+    assert set(by_name) == set(run_benchmarks.BENCHMARKS)
+    assert len(by_name["turn_overhead"]) == 2 # Streaming and not
+    assert len(by_name["history_growth"][0]["metrics"]["tokens_by_turn"]) == 3
+    replay = by_name["transcript_replay"][0]["metrics"]
+    assert replay["turns"] == 3 and replay["tool_calls"] == 11
+    # The transcript reverts its own edit
+    with open(os.path.join(str(tmp_path), "repo-120-0", synthetic_repo.module_path(42)), 'r', encoding='utf-8') as f:
+        assert "def handler_42(" in f.read()
+
+    # Comparing a run against itself finds nothing; a slower run is flagged
+    assert run_benchmarks.compare(report, report) == []
+    baseline = {"results": [dict(result, metrics=dict(result["metrics"])) for result in report["results"]]}
+    overhead = next(result for result in baseline["results"] if result["name"] == "turn_overhead")
+    overhead["metrics"]["turn_p50_seconds"] /= 2
+    regressions = run_benchmarks.compare(report, baseline)
+    assert [regression["metric"] for regression in regressions] == ["turn_p50_seconds"]
+    assert by_name["startup"][0]["metrics"]["heavy_modules"] == []
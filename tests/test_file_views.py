@@ -0,0 +1,54 @@
+# Tests for tracking the file contents the model has seen
+
+import os
+import sys
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent import file_views
+from agent.file_views import FileViewTracker, unified_diff
+
+
+def test_unified_diff_shows_only_the_changed_hunk():
+    old = "".join(f"line {i}\n" for i in range(1, 3001))
+    new = old.replace("line 1500\n", "line fifteen hundred\n")
+
+    diff = unified_diff(old, new, "a.py (before)", "a.py")
+
+    assert diff.startswith("--- a.py (before)\n+++ a.py\n@@ -1497,7 +1497,7 @@")
+    assert "-line 1500\n+line fifteen hundred" in diff
+    assert "line 1000" not in diff
+    assert len(diff) < len(new) / 100
+
+
+def test_unified_diff_of_identical_or_oversized_texts_is_empty(monkeypatch):
+    assert unified_diff("same\n", "same\n", "a", "b") == ""
+    monkeypatch.setattr(file_views, "MAX_DIFF_INPUT_BYTES", 10)
+    assert unified_diff("a long old text\n", "a long new text\n", "a", "b") == ""
+
+
+def test_tracker_keeps_the_latest_view_per_file(tmp_path):
+    tracker = FileViewTracker()
+    path = str(tmp_path / "a.txt")
+    tracker.record(path, "one", "toolu_1", '{"content": "one"}')
+    tracker.record(os.path.join(str(tmp_path), ".", "a.txt"), "two", "toolu_2", '{"content": "two"}')
+
+    assert tracker.view(path) == {"content": "two", "tool_use_id": "toolu_2", "sent": '{"content": "two"}'}
+    assert tracker.total_bytes == 3
+
+
+def test_tracker_evicts_least_recently_used_views_by_size(tmp_path):
+    tracker = FileViewTracker(max_bytes=10)
+    tracker.record(str(tmp_path / "a"), "aaaa", "toolu_a", "")
+    tracker.record(str(tmp_path / "b"), "bbbb", "toolu_b", "")
+    tracker.view(str(tmp_path / "a"))
+    tracker.record(str(tmp_path / "c"), "cccc", "toolu_c", "")
+
+    assert tracker.view(str(tmp_path / "b")) is None
+    assert tracker.view(str(tmp_path / "a"))["tool_use_id"] == "toolu_a"
+    assert tracker.total_bytes == 8
+    tracker.record(str(tmp_path / "d"), "d" * 11, "toolu_d", "") # Larger than the whole budget
+    assert tracker.view(str(tmp_path / "d")) is None
@@ -0,0 +1,79 @@
+# Tests for token-budget history compaction
+
+import os
+import sys
+import json
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent.history import HistoryManager, estimate_tokens
+
+
+def _turn(n, result_chars):
+    """One user turn: a question, a tool call, its (large) result and a final answer."""
+    tool_use_id = f"toolu_{n}"
+    return [
+        {"role": "user", "content": f"question {n}"},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": tool_use_id, "name": "read_file", "input": {"path": f"f{n}"}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": tool_use_id,
+                                      "content": json.dumps({"status": "success", "content": "x" * result_chars})}]},
+        {"role": "assistant", "content": [{"type": "text", "text": f"answer {n}"}]},
+    ]
+
+
+def _assert_pairs_intact(history):
+    tool_use_ids = set()
+    for message in history:
+        if isinstance(message["content"], str):
+            continue
+        for block in message["content"]:
+            if block["type"] == "tool_use":
+                tool_use_ids.add(block["id"])
+            elif block["type"] == "tool_result":
+                assert block["tool_use_id"] in tool_use_ids
+
+
+def test_history_under_budget_is_untouched():
+    history = _turn(1, 100)
+    assert HistoryManager(token_budget=10_000).compact(history) is history
+
+
+def test_old_large_tool_results_are_elided_first():
+    history = _turn(1, 40_000) + _turn(2, 400)
+    manager = HistoryManager(token_budget=2_000)
+
+    compacted = manager.compact(history)
+
+    assert len(compacted) == len(history) # No turn had to be dropped
+    old_result = json.loads(compacted[2]["content"][0]["content"])
+    assert old_result["status"] == "success"
+    assert "removed from the conversation" in old_result["note"]
+    assert compacted[6] == history[6] # The current turn's result is kept
+    assert manager.total_tokens(compacted) <= 2_000
+    assert history[2]["content"][0]["content"].endswith('x"}') # The input history is not modified
+
+
+def test_whole_turns_are_dropped_without_breaking_tool_pairs():
+    history = []
+    for n in range(20):
+        history += _turn(n, 100)
+    manager = HistoryManager(token_budget=500)
+
+    compacted = manager.compact(history)
+
+    assert manager.total_tokens(compacted) <= 500
+    assert compacted[0]["role"] == "user" and isinstance(compacted[0]["content"], str)
+    assert compacted[-1] == history[-1]
+    _assert_pairs_intact(compacted)
+
+
+def test_current_turn_results_are_elided_as_a_last_resort():
+    history = _turn(1, 40_000)
+    compacted = HistoryManager(token_budget=500).compact(history)
+
+    assert len(compacted) == 4
+    assert estimate_tokens(compacted[2]) < 200
+    _assert_pairs_intact(compacted)
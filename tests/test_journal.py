@@ -0,0 +1,204 @@
+# Tests for the on-disk session journal and resuming sessions
+
+import os
+import sys
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent import journal
+from agent.journal import SessionJournal, find_session, prune_sessions
+from agent.spool import OutputSpool
+from fakes import text_response, tool_use_response
+
+
+def _tool_exchange(tool_use_id, content):
+    return [
+        {"role": "assistant", "content": [{"type": "tool_use", "id": tool_use_id, "name": "read_file", "input": {"path": "a.py"}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": tool_use_id, "content": content}]},
+    ]
+
+
+def _blob_count(directory):
+    return sum(len(files) for _, _, files in os.walk(os.path.join(directory, "blobs")))
+
+
+def test_history_round_trips_with_large_payloads_stored_once(tmp_path):
+    big = json.dumps({"status": "success", "content": "x = 1\n" * 5000})
+    history = [{"role": "user", "content": "read a.py twice"}] + _tool_exchange("toolu_1", big) + _tool_exchange("toolu_2", big)
+
+    writer = SessionJournal.create("abc123", str(tmp_path), workspace="/repo")
+    writer.sync(history[:3])
+    writer.sync(history)
+    writer.close()
+
+    assert os.path.getsize(tmp_path / "abc123.journal") < 2000 # The tool output lives in the blob store
+    assert _blob_count(tmp_path) == 1
+
+    resumed = SessionJournal.open("abc123", str(tmp_path))
+    assert resumed.history == history
+    assert resumed.session_id == "abc123" and resumed.meta["workspace"] == "/repo"
+
+
+def test_replaced_dropped_and_truncated_messages_replay(tmp_path):
+    history = [{"role": "user", "content": f"message {i}"} for i in range(6)]
+    writer = SessionJournal.create("edits", str(tmp_path))
+    writer.sync(history)
+
+    history = history[2:] # Compaction dropped the first turns
+    history[1] = {"role": "user", "content": "elided"}
+    writer.sync(history)
+    writer.sync(history[:3]) # A cancelled turn was rolled back
+    writer.close()
+
+    records, _ = journal.read_records(str(tmp_path / "edits.journal"))
+    assert [record["type"] for record in records] == ["session"] + ["append"] * 6 + ["drop", "set", "truncate"]
+    assert SessionJournal.open("edits", str(tmp_path)).history == [
+        {"role": "user", "content": "message 2"}, {"role": "user", "content": "elided"}, {"role": "user", "content": "message 4"}]
+
+
+def test_a_record_torn_by_a_crash_is_dropped(tmp_path):
+    writer = SessionJournal.create("torn", str(tmp_path))
+    writer.sync([{"role": "user", "content": "kept"}])
+    writer.file.write(journal._frame({"type": "append", "message": {"role": "user", "content": "lost"}})[:-3])
+    writer.close()
+
+    resumed = SessionJournal.open("torn", str(tmp_path))
+    assert resumed.history == [{"role": "user", "content": "kept"}]
+    resumed.sync(resumed.history + [{"role": "assistant", "content": "after"}])
+    resumed.close()
+    assert [message["content"] for message in SessionJournal.open("torn", str(tmp_path)).history] == ["kept", "after"]
+
+
+def test_journal_is_rewritten_when_mostly_superseded(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "REWRITE_SLACK", 0)
+    writer = SessionJournal.create("churn", str(tmp_path))
+    for i in range(10):
+        writer.sync([{"role": "user", "content": f"draft {i}"}])
+    writer.close()
+
+    resumed = SessionJournal.open("churn", str(tmp_path))
+    assert resumed.history == [{"role": "user", "content": "draft 9"}]
+    assert len(journal.read_records(str(tmp_path / "churn.journal"))[0]) == 2
+
+
+def test_old_sessions_are_pruned_with_their_spool_and_unshared_blobs(tmp_path):
+    shared, only_old = "shared " * 1000, "old " * 1000
+    for session_id, content in (("old", only_old), ("new", "new")):
+        writer = SessionJournal.create(session_id, str(tmp_path))
+        writer.sync([{"role": "user", "content": shared}, {"role": "user", "content": content}])
+        writer.close()
+    os.makedirs(tmp_path / "spool" / "old")
+    for name in ["old.journal"] + [os.path.join(parent, name) for parent, _, names in os.walk(tmp_path / "blobs") for name in names]:
+        os.utime(tmp_path / name, (0, 0))
+
+    assert prune_sessions(str(tmp_path), max_age_days=1) == 1
+    assert sorted(os.listdir(tmp_path)) == ["blobs", "new.journal", "spool"]
+    assert os.listdir(tmp_path / "spool") == []
+    assert _blob_count(tmp_path) == 1
+    assert SessionJournal.open("new", str(tmp_path)).history[0]["content"] == shared
+    assert prune_sessions(str(tmp_path), max_age_days=0) == 0
+
+
+def test_sessions_are_found_by_prefix_or_as_the_latest(tmp_path):
+    for session_id in ("aaa111", "aab222"):
+        writer = SessionJournal.create(session_id, str(tmp_path))
+        writer.sync([{"role": "user", "content": session_id}])
+        writer.close()
+    os.utime(tmp_path / "aaa111.journal", (0, 0))
+
+    assert find_session("aab", str(tmp_path)).endswith("aab222.journal")
+    assert find_session("latest", str(tmp_path)).endswith("aab222.journal")
+    with pytest.raises(FileNotFoundError):
+        find_session("aa", str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        find_session("zzz", str(tmp_path))
+
+
+def test_session_ids_are_looked_up_in_the_session_directory(tmp_path, monkeypatch):
+    sessions = tmp_path / "sessions"
+    writer = SessionJournal.create("abc123", str(sessions))
+    writer.sync([{"role": "user", "content": "saved"}])
+    writer.close()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "abc123").write_text("not a journal")
+
+    assert find_session("abc123", str(sessions)) == str(sessions / "abc123.journal")
+    assert find_session(os.path.join(".", "abc123"), str(sessions)) == os.path.join(".", "abc123")
+    with pytest.raises(FileNotFoundError):
+        find_session(os.path.join(".", "missing"), str(sessions))
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_saved_sessions_are_private(tmp_path):
+    sessions = tmp_path / "sessions"
+    writer = SessionJournal.create("abc123", str(sessions))
+    writer.sync([{"role": "user", "content": "x" * journal.BLOB_MIN_CHARS}])
+    writer.close()
+    spool = OutputSpool(threshold=10)
+    spool.keep_in(str(sessions / "spool" / "abc123"))
+    handle = spool.spool({"stdout": "y" * 100})["spooled"]["stdout"]["handle"]
+
+    blob_dir = next((sessions / "blobs").iterdir())
+    for path in [sessions, sessions / "blobs", blob_dir, sessions / "spool", sessions / "spool" / "abc123"]:
+        assert path.stat().st_mode & 0o777 == 0o700, path
+    for path in [sessions / "abc123.journal", next(blob_dir.iterdir()), sessions / "spool" / "abc123" / handle]:
+        assert path.stat().st_mode & 0o777 == 0o600, path
+
+
+def test_agent_session_is_resumed_with_its_history(monkeypatch, tmp_path, capsys):
+    pytest.importorskip("anthropic")
+    from agent.agent import Agent
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    target = tmp_path / "notes.txt"
+    target.write_text("remember me")
+    responses = [
+        tool_use_response("toolu_1", "read_file", {"path": str(target)}),
+        text_response("Read it."),
+    ]
+    agent = Agent(client=SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: responses.pop(0))))
+    agent.use_journal(SessionJournal.create(agent.session_id, str(tmp_path / "sessions")))
+    with patch("builtins.input", side_effect=["read notes", "exit"]):
+        agent.run()
+    assert f"--resume {agent.session_id}" in capsys.readouterr().out
+
+    resumed = Agent(client=SimpleNamespace())
+    resumed.use_journal(SessionJournal.open(agent.session_id, str(tmp_path / "sessions")))
+    assert resumed.session_id == agent.session_id
+    assert resumed.conversation_history == agent.conversation_history
+    assert "remember me" in resumed.conversation_history[2]["content"][0]["content"]
+
+
+def test_a_turn_that_raised_resumes_without_its_unanswered_tool_use(monkeypatch, tmp_path):
+    pytest.importorskip("anthropic")
+    from agent.agent import Agent
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    responses = [
+        text_response("Hello."),
+        tool_use_response("toolu_1", "read_file", {"path": "a.py"}),
+    ]
+    agent = Agent(client=SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: responses.pop(0))))
+    agent.use_journal(SessionJournal.create(agent.session_id, str(tmp_path)))
+    agent.run_turn("hi")
+
+    def fail(tool_calls, early_results):
+        raise RuntimeError("tool runner crashed")
+    monkeypatch.setattr(agent, "_run_tool_calls", fail)
+    agent.run_turn("read a.py")
+    agent.end_session()
+
+    history = SessionJournal.open(agent.session_id, str(tmp_path)).history
+    assert history == agent.conversation_history
+    assert [message["role"] for message in history] == ["user", "assistant", "user"]
+    assert history[-1] == {"role": "user", "content": "read a.py"}
@@ -0,0 +1,100 @@
+# Tests for prefetching the files the model is likely to read next
+
+import os
+import sys
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent.prefetch import Prefetcher, python_imports, script_imports
+from agent.tool_cache import ToolResultCache
+from fakes import text_response, tool_use_response, write_file
+
+
+def _wait(prefetcher):
+    prefetcher.executor.submit(lambda: None).result() # One worker: everything submitted before has finished
+
+
+def test_imports_are_resolved_to_files(tmp_path):
+    root = str(tmp_path)
+    main = write_file(root, "pkg/main.py")
+    expected = [write_file(root, "pkg/util.py"), write_file(root, "pkg/sub/__init__.py"), write_file(root, "pkg/sub/mod.py"), write_file(root, "lib.py")]
+    content = "import os\nfrom .util import helper\nfrom .sub import mod, missing as other\nimport lib, json\n"
+    assert python_imports(main, content, [root]) == expected
+
+    app = write_file(root, "web/app.ts")
+    expected = [write_file(root, "web/api.ts"), write_file(root, "web/components/index.js")]
+    assert script_imports(app, "import { get } from './api';\nconst c = require('./components');\nimport x from 'react';\n") == expected
+
+
+def test_signals_are_read_into_the_cache_most_telling_first(tmp_path):
+    root = str(tmp_path)
+    mentioned = write_file(root, "docs/guide.md", "guide")
+    imported = write_file(root, "pkg/util.py", "def helper(): pass\n")
+    listed = [write_file(root, f"data/{i}.txt", str(i)) for i in range(3)]
+    cache = ToolResultCache()
+    prefetcher = Prefetcher(cache, root, max_files=3)
+
+    prefetcher.observe_message("Please check docs/guide.md and missing.md")
+    prefetcher.observe_result("read_file", {"path": os.path.join(root, "pkg/main.py")},
+                              {"status": "success", "content": "from .util import helper\n"})
+    prefetcher.observe_result("list_files", {"path": os.path.join(root, "data")}, {"status": "success", "files": listed})
+    prefetcher.start()
+    _wait(prefetcher)
+
+    cached = [path for path in [mentioned, imported] + listed
+              if cache.get("read_file", {"path": path}, cache.fingerprint("read_file", {"path": path}))]
+    assert cached == [mentioned, imported, listed[-1]]
+    assert prefetcher.prefetched == 3
+    prefetcher.start() # The signals were used up
+    _wait(prefetcher)
+    assert prefetcher.prefetched == 3
+    prefetcher.close()
+
+
+def test_prefetched_results_never_evict_real_ones(tmp_path):
+    real, guess = write_file(str(tmp_path), "real.txt", "x" * 500), write_file(str(tmp_path), "guess.txt", "y" * 500)
+    cache = ToolResultCache(max_bytes=800)
+    cache.put("read_file", {"path": real}, cache.fingerprint("read_file", {"path": real}), {"status": "success", "content": "x" * 500})
+    prefetcher = Prefetcher(cache, str(tmp_path))
+    prefetcher.observe_message("guess.txt")
+    prefetcher.start()
+    _wait(prefetcher)
+    assert prefetcher.prefetched == 0
+    assert cache.get("read_file", {"path": real}, cache.fingerprint("read_file", {"path": real})) is not None
+    prefetcher.close()
+
+
+def test_a_predicted_read_is_served_from_the_cache(monkeypatch, tmp_path):
+    pytest.importorskip("anthropic")
+    from agent.agent import Agent
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    write_file(str(tmp_path), "notes/todo.txt", "buy milk")
+    agent = Agent(workspace=str(tmp_path))
+    script = [
+        tool_use_response("toolu_1", "read_file", {"path": "notes/todo.txt"}),
+        text_response("Milk."),
+    ]
+
+    def create(**kwargs):
+        _wait(agent.prefetcher) # The model takes longer to answer than the prefetch takes to finish
+        return script.pop(0)
+
+    agent.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    reads = []
+    execute = agent.tools["read_file"]["execute"]
+    agent.tools["read_file"]["execute"] = lambda **kwargs: reads.append(kwargs) or execute(**kwargs)
+    with patch("builtins.input", side_effect=["what is in notes/todo.txt?", "exit"]):
+        agent.run()
+
+    assert reads == [] # Answered from the prefetched entry
+    assert json.loads(agent.conversation_history[2]["content"][0]["content"]) == {"status": "success", "content": "buy milk"}
@@ -0,0 +1,54 @@
+# Tests for prompt-cache breakpoint placement
+
+import os
+import sys
+from types import SimpleNamespace
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent import prompt_cache
+
+
+def test_breakpoints_on_system_tools_and_last_message():
+    tools = [{"name": "a", "input_schema": {}}, {"name": "b", "input_schema": {}}]
+    messages = [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": [{"type": "text", "text": "hello"}]},
+        {"role": "user", "content": "read it"},
+    ]
+
+    system = prompt_cache.cached_system("be helpful")
+    cached_tools = prompt_cache.cached_tools(tools)
+    cached_messages = prompt_cache.cached_messages(messages)
+
+    assert system == [{"type": "text", "text": "be helpful", "cache_control": {"type": "ephemeral"}}]
+    assert "cache_control" not in cached_tools[0]
+    assert cached_tools[1]["cache_control"] == {"type": "ephemeral"}
+    assert cached_messages[:2] == messages[:2]
+    assert cached_messages[2]["content"] == [{"type": "text", "text": "read it", "cache_control": {"type": "ephemeral"}}]
+    # The originals (the agent's history) are left untouched
+    assert "cache_control" not in tools[1]
+    assert messages[2]["content"] == "read it"
+
+
+def test_breakpoint_goes_on_the_last_block_of_a_tool_result_message():
+    messages = [{"role": "user", "content": [
+        {"type": "tool_result", "tool_use_id": "1", "content": "{}"},
+        {"type": "tool_result", "tool_use_id": "2", "content": "{}"},
+    ]}]
+    blocks = prompt_cache.cached_messages(messages)[0]["content"]
+    assert "cache_control" not in blocks[0]
+    assert blocks[1]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_usage_summary_reports_cache_tokens():
+    usage = SimpleNamespace(input_tokens=12, output_tokens=34, cache_read_input_tokens=1000, cache_creation_input_tokens=None)
+    assert prompt_cache.usage_summary(usage) == {
+        "input_tokens": 12,
+        "output_tokens": 34,
+        "cache_read_input_tokens": 1000,
+        "cache_creation_input_tokens": 0,
+    }
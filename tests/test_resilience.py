@@ -0,0 +1,142 @@
+# Tests for retries, backoff, concurrency limiting and hedging of model requests
+
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+anthropic = pytest.importorskip("anthropic")
+
+from agent.resilience import ConcurrencyLimiter, ResilientCaller, backoff_delay, is_transient, retry_after
+
+
+class HeaderError(Exception):
+    """Stands in for an APIStatusError: only the response headers matter to retry_after()."""
+    def __init__(self, headers):
+        super().__init__("overloaded")
+        self.response = SimpleNamespace(headers=headers)
+
+
+def test_backoff_is_jittered_and_honors_retry_after():
+    rng = random.Random(1)
+    delays = [backoff_delay(3, base_delay=1.0, max_delay=5.0, rng=rng) for _ in range(50)]
+    assert all(0 <= delay <= 5.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+    assert retry_after(HeaderError({"retry-after": "7"})) == 7.0
+    assert retry_after(HeaderError({"retry-after-ms": "250"})) == 0.25
+    assert retry_after(HeaderError({"retry-after": "soon"})) is None
+    assert backoff_delay(0, HeaderError({"retry-after": "7"}), base_delay=0.1, rng=rng) == 7.0
+
+    assert is_transient(anthropic.APIConnectionError(request=None))
+    assert not is_transient(ValueError("bad input"))
+
+
+def test_transient_failures_are_retried_and_others_are_not():
+    failures = [anthropic.APIConnectionError(request=None), anthropic.APIConnectionError(request=None)]
+    retries = []
+
+    def request():
+        if failures:
+            raise failures.pop()
+        return "ok"
+
+    caller = ResilientCaller(retries=3, hedge_after=0, limiter=None, base_delay=0)
+    assert caller.call(request, on_retry=lambda attempt, delay, error: retries.append(attempt)) == "ok"
+    assert retries == [1, 2]
+
+    calls = []
+    def broken():
+        calls.append(1)
+        raise ValueError("not transient")
+    with pytest.raises(ValueError):
+        caller.call(broken)
+    assert len(calls) == 1
+
+    # retryable() can veto a retry, e.g. once a stream has shown output
+    calls.clear()
+    def dropped():
+        calls.append(1)
+        raise anthropic.APIConnectionError(request=None)
+    with pytest.raises(anthropic.APIConnectionError):
+        caller.call(dropped, retryable=lambda error: False)
+    assert len(calls) == 1
+
+
+def test_slow_requests_are_hedged():
+    calls = []
+    def request():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(1.0) # The first request is stuck
+            return "slow"
+        return "fast"
+
+    caller = ResilientCaller(retries=0, hedge_after=0.05, limiter=None)
+    started = time.monotonic()
+    assert caller.call(request) == "fast"
+    assert time.monotonic() - started < 0.5
+    assert caller.hedged_requests == 1
+
+    async def scenario():
+        count = []
+        async def async_request():
+            count.append(1)
+            await asyncio.sleep(1.0 if len(count) == 1 else 0)
+            return len(count)
+        return await caller.call_async(async_request)
+    assert asyncio.run(scenario()) == 2
+    assert caller.hedged_requests == 2
+
+
+def test_limiter_bounds_requests_across_threads_and_coroutines():
+    limiter = ConcurrencyLimiter(2)
+    caller = ResilientCaller(retries=0, hedge_after=0, limiter=limiter)
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def enter():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+
+    def leave():
+        with lock:
+            in_flight[0] -= 1
+
+    def request():
+        enter()
+        time.sleep(0.02)
+        leave()
+
+    async def async_request():
+        enter()
+        await asyncio.sleep(0.02)
+        leave()
+
+    async def scenario():
+        waiting = asyncio.ensure_future(asyncio.gather(*(caller.call_async(async_request) for _ in range(6))))
+        # A cancelled waiter gives up its place without leaking a slot
+        cancelled = asyncio.ensure_future(caller.call_async(async_request))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await waiting
+
+    threads = [threading.Thread(target=caller.call, args=(request,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    asyncio.run(scenario())
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert limiter.in_flight == 0 and not limiter.waiters
@@ -0,0 +1,76 @@
+# Tests for concurrent tool-call scheduling
+
+import os
+import sys
+import threading
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent.scheduler import READ_ONLY, MUTATING, INTERACTIVE, ToolScheduler, plan_batches
+
+KINDS = {
+    "read_file": READ_ONLY,
+    "list_files": READ_ONLY,
+    "edit_file": MUTATING,
+    "run_shell_command": INTERACTIVE,
+}
+
+
+def _call(tool_use_id, name, **tool_input):
+    return {"id": tool_use_id, "name": name, "input": tool_input}
+
+
+def _batch_ids(batches):
+    return [[tool_call["id"] for tool_call in batch] for batch in batches]
+
+
+def test_independent_reads_share_one_batch():
+    calls = [_call(str(i), "read_file", path=f"file_{i}.txt") for i in range(5)]
+    assert _batch_ids(plan_batches(calls, KINDS.get)) == [["0", "1", "2", "3", "4"]]
+
+
+def test_reads_of_the_same_path_may_overlap():
+    calls = [_call("a", "read_file", path="same.txt"), _call("b", "read_file", path="same.txt")]
+    assert _batch_ids(plan_batches(calls, KINDS.get)) == [["a", "b"]]
+
+
+def test_edit_and_read_of_the_same_path_are_serialized():
+    calls = [
+        _call("a", "read_file", path="one.txt"),
+        _call("b", "edit_file", path="one.txt", old_str="x", new_str="y"),
+        _call("c", "read_file", path="one.txt"),
+        _call("d", "read_file", path="two.txt"),
+    ]
+    assert _batch_ids(plan_batches(calls, KINDS.get)) == [["a"], ["b"], ["c", "d"]]
+
+
+def test_edits_of_different_paths_share_a_batch():
+    calls = [
+        _call("a", "edit_file", path="one.txt", old_str="x", new_str="y"),
+        _call("b", "edit_file", path="two.txt", old_str="x", new_str="y"),
+    ]
+    assert _batch_ids(plan_batches(calls, KINDS.get)) == [["a", "b"]]
+
+
+def test_interactive_calls_always_run_alone():
+    calls = [
+        _call("a", "read_file", path="one.txt"),
+        _call("b", "run_shell_command", command="make"),
+        _call("c", "read_file", path="two.txt"),
+    ]
+    assert _batch_ids(plan_batches(calls, KINDS.get)) == [["a"], ["b"], ["c"]]
+
+
+def test_scheduler_runs_calls_concurrently():
+    scheduler = ToolScheduler(max_workers=4)
+    barrier = threading.Barrier(4, timeout=5)
+
+    def tool(name, tool_input):
+        barrier.wait() # Deadlocks (and times out) unless all four calls run at once
+        return tool_input["path"]
+
+    futures = [scheduler.submit(tool, _call(str(i), "read_file", path=str(i))) for i in range(4)]
+    assert [future.result() for future in futures] == ["0", "1", "2", "3"]
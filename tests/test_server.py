@@ -0,0 +1,233 @@
+# Tests for the HTTP/WebSocket server: sessions, streamed events, approvals and limits
+
+import os
+import sys
+import json
+import base64
+import struct
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+pytest.importorskip("anthropic")
+
+from agent.server import AgentServer, SessionPool, SessionOutput, WebSocket
+from fakes import FakeAsyncStream, text_response, tool_use_response
+
+
+class FakeMessages:
+    def __init__(self, responses):
+        self.responses = responses
+
+    def stream(self, **kwargs):
+        return FakeAsyncStream(self.responses.pop(0))
+
+
+@pytest.fixture(autouse=True)
+def plain_environment(monkeypatch):
+    monkeypatch.delenv("AGENT_PERSISTENT_SHELL", raising=False)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+
+async def _start(responses, token=None, **pool_options):
+    pool = SessionPool(SimpleNamespace(messages=FakeMessages(responses)), journal=False, **pool_options)
+    listener = await AgentServer(pool, token).start("127.0.0.1", 0)
+    return pool, listener, listener.sockets[0].getsockname()[1]
+
+
+async def _http(port, method, path, payload=None, headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    head = [f"{method} {path} HTTP/1.1", "Host: localhost", "Connection: close", f"Content-Length: {len(body)}"]
+    head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ")[1])
+    if b"chunked" in head.lower():
+        chunks = b""
+        while body:
+            size, _, rest = body.partition(b"\r\n")
+            size = int(size, 16)
+            chunks, body = chunks + rest[:size], rest[size + 2:]
+        return status, [json.loads(line) for line in chunks.splitlines()]
+    return status, json.loads(body)
+
+
+def test_a_turn_streams_its_events_over_http(tmp_path):
+    target = tmp_path / "notes.txt"
+    target.write_text("served content")
+
+    async def scenario():
+        pool, listener, port = await _start([tool_use_response("toolu_1", "read_file", {"path": str(target)}), text_response("Read it.")])
+        async with listener:
+            status, created = await _http(port, "POST", "/sessions", {})
+            assert status == 201
+            status, events = await _http(port, "POST", f"/sessions/{created['session']}/messages", {"message": "read the notes"})
+            _, listed = await _http(port, "GET", "/sessions")
+            pool.close_all()
+            return status, events, listed
+
+    status, events, listed = asyncio.run(scenario())
+    assert status == 200
+    kinds = [event["type"] for event in events]
+    assert kinds[0] == "turn_started" and kinds[-1] == "turn_finished"
+    assert {"tool_call", "tool_result", "text"} <= set(kinds)
+    tool_result = next(event for event in events if event["type"] == "tool_result")
+    assert tool_result["result"]["content"] == "served content"
+    assert events[-1]["status"] == "success" and events[-1]["reply"] == "Read it."
+    assert listed["sessions"][0]["messages"] == 4
+
+
+async def _ws_connect(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write((f"GET {path} HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    assert b" 101 " in head and WebSocket.accept_key(key).encode() in head
+    return reader, writer
+
+
+def _ws_send(writer, payload):
+    data, mask = json.dumps(payload).encode(), os.urandom(4)
+    writer.write(struct.pack(">BB", 0x81, 0x80 | len(data)) + mask + WebSocket._unmask(data, mask))
+
+
+async def _ws_receive(reader):
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", await reader.readexactly(8))[0]
+    return json.loads(await reader.readexactly(length))
+
+
+def test_shell_commands_wait_for_an_approval_over_websocket(monkeypatch, tmp_path):
+    monkeypatch.setattr(sys, "stdout", SessionOutput(sys.stdout))
+
+    async def scenario():
+        pool, listener, port = await _start([tool_use_response("toolu_1", "run_shell_command", {"command": "echo approved-output"}),
+                                             text_response("Ran it.")])
+        async with listener:
+            session = pool.create(str(tmp_path))
+            reader, writer = await _ws_connect(port, f"/sessions/{session.session_id}/ws")
+            events = [await _ws_receive(reader)]
+            _ws_send(writer, {"type": "message", "message": "run it"})
+            while events[-1]["type"] != "turn_finished":
+                events.append(await asyncio.wait_for(_ws_receive(reader), 10))
+                if events[-1]["type"] == "approval_request":
+                    _ws_send(writer, {"type": "approval", "id": events[-1]["id"], "approve": True})
+            writer.close()
+            pool.close_all()
+            return events
+
+    events = asyncio.run(scenario())
+    assert events[0]["type"] == "session"
+    assert [event["approved"] for event in events if event["type"] == "approval_result"] == [True]
+    assert "approved-output" in "".join(event["text"] for event in events if event["type"] == "output")
+    assert events[-1]["status"] == "success" and events[-1]["reply"] == "Ran it."
+
+
+def test_a_cancelled_turn_declines_its_pending_approvals(monkeypatch, tmp_path):
+    monkeypatch.setattr(sys, "stdout", SessionOutput(sys.stdout))
+    marker = tmp_path / "ran"
+
+    async def scenario():
+        pool, listener, port = await _start([tool_use_response("toolu_1", "run_shell_command", {"command": f"touch {marker}"})])
+        async with listener:
+            session = pool.create(str(tmp_path))
+            events = session.subscribe()
+            turn = session.start_turn("run it")
+            request = await asyncio.wait_for(events.get(), 10)
+            while request["type"] != "approval_request":
+                request = await asyncio.wait_for(events.get(), 10)
+            cancelled = session.cancel_turn()
+            stale_approval = session.approve(request["id"], True)
+            with pytest.raises(asyncio.CancelledError):
+                await turn
+            result = await asyncio.wait_for(events.get(), 10)
+            while result["type"] != "approval_result":
+                result = await asyncio.wait_for(events.get(), 10)
+            pool.close_all()
+            return cancelled, stale_approval, result
+
+    cancelled, stale_approval, result = asyncio.run(scenario())
+    assert cancelled and not stale_approval
+    assert result["approved"] is False
+    assert not marker.exists()
+
+
+def test_unmasked_client_frames_close_the_websocket_with_a_protocol_error():
+    async def scenario():
+        pool, listener, port = await _start([])
+        async with listener:
+            session = pool.create()
+            reader, writer = await _ws_connect(port, f"/sessions/{session.session_id}/ws")
+            await _ws_receive(reader) # The session event
+            data = json.dumps({"type": "cancel"}).encode()
+            writer.write(struct.pack(">BB", 0x81, len(data)) + data)
+            first, second = await asyncio.wait_for(reader.readexactly(2), 10)
+            close_frame = first, await reader.readexactly(second & 0x7F)
+            writer.close()
+            pool.close_all()
+            return close_frame
+
+    first, payload = asyncio.run(scenario())
+    assert first & 0x0F == 0x8
+    assert struct.unpack(">H", payload[:2])[0] == 1002
+
+
+def test_token_and_session_limits_are_enforced():
+    async def scenario():
+        pool, listener, port = await _start([], token="secret", max_sessions=1)
+        async with listener:
+            unauthorized = await _http(port, "GET", "/health")
+            auth = {"Authorization": "Bearer secret"}
+            first = await _http(port, "POST", "/sessions", {}, auth)
+            pool.sessions[first[1]["session"]].subscribe() # A connected client keeps it from being evicted
+            full = await _http(port, "POST", "/sessions", {}, auth)
+            missing = await _http(port, "POST", "/sessions/000000000000/messages", {"message": "hi"}, auth)
+            pool.close_all()
+            return unauthorized, full, missing
+
+    unauthorized, full, missing = asyncio.run(scenario())
+    assert unauthorized[0] == 401
+    assert full[0] == 503
+    assert missing[0] == 404
+
+
+def test_idle_sessions_are_evicted_to_make_room():
+    async def scenario():
+        pool, listener, port = await _start([], max_sessions=1)
+        async with listener:
+            first = pool.create()
+            second = pool.create()
+            open_ids = list(pool.sessions)
+            pool.close_all()
+            return first.session_id, second.session_id, open_ids
+
+    first, second, open_ids = asyncio.run(scenario())
+    assert open_ids == [second] and first != second
+
+
+def test_sessions_are_built_with_their_own_limits():
+    async def scenario():
+        pool = SessionPool(SimpleNamespace(messages=FakeMessages([])), journal=False, tool_workers=3, token_budget=5000, cache_bytes=1234)
+        session = pool.create()
+        pool.close_all()
+        return session
+
+    session = asyncio.run(scenario())
+    assert session.scheduler.pool._max_workers == 3
+    assert session.history_manager.token_budget == 5000
+    assert session.tool_cache.max_bytes == 1234
+    assert session.prefetcher.tool_cache is session.tool_cache
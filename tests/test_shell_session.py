@@ -0,0 +1,71 @@
+# Tests for the persistent shell session
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent.shell_session import ShellSession
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/bin/bash"), reason="needs bash")
+
+
+@pytest.fixture
+def session():
+    shell = ShellSession()
+    yield shell
+    shell.close()
+
+
+def test_working_directory_and_environment_persist(session):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        assert session.run(f"cd {tmp_dir} && export GREETING=hello", echo=False)["exit_code"] == 0
+
+        result = session.run("pwd; echo $GREETING", echo=False)
+
+        assert result["exit_code"] == 0
+        printed_cwd, greeting = result["stdout"].splitlines()
+        assert os.path.realpath(printed_cwd) == os.path.realpath(tmp_dir)
+        assert greeting == "hello"
+        assert os.path.realpath(result["cwd"]) == os.path.realpath(tmp_dir)
+
+
+def test_exit_codes_and_streams_are_separated(session):
+    result = session.run("echo out; echo err >&2; false", echo=False)
+
+    assert result["exit_code"] == 1
+    assert result["stdout"] == "out\n"
+    assert result["stderr"] == "err\n"
+
+
+def test_output_without_trailing_newline_and_syntax_errors(session):
+    assert session.run("printf no-newline", echo=False)["stdout"] == "no-newline"
+    broken = session.run("echo 'unterminated", echo=False)
+    assert broken["exit_code"] != 0
+    # The session is still usable afterwards
+    assert session.run("echo still here", echo=False)["stdout"] == "still here\n"
+
+
+def test_exit_ends_the_session_and_the_next_command_restarts_it(session):
+    session.run("export MARKER=1", echo=False)
+
+    ended = session.run("exit 3", echo=False)
+    assert ended["exit_code"] == 3
+
+    result = session.run("echo ${MARKER:-unset}", echo=False)
+    assert result["stdout"] == "unset\n"
+    assert result["session_restarted"] is True
+
+
+def test_timeout_kills_the_command_and_resets_the_session(session):
+    result = session.run("sleep 30", timeout=0.5, echo=False)
+
+    assert result["timed_out"] is True
+    assert result["duration_seconds"] < 10
+    assert session.run("echo alive", echo=False)["stdout"] == "alive\n"
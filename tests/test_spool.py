@@ -0,0 +1,83 @@
+# Tests for spooling large tool output to disk and paging through it
+
+import os
+import sys
+import json
+import hashlib
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent.spool import OutputSpool
+from fakes import text_response, tool_use_response
+
+
+def test_large_fields_are_replaced_by_a_preview_and_a_handle(tmp_path):
+    spool = OutputSpool(threshold=1000)
+    stdout = "".join(f"line {i}\n" for i in range(500))
+    result = {"status": "success", "exit_code": 0, "stdout": stdout, "stderr": "warning\n"}
+
+    spooled = spool.spool(result)
+    assert result["stdout"] == stdout # The caller's result is left alone
+    assert spooled["stderr"] == "warning\n" and spooled["exit_code"] == 0
+    entry = spooled["spooled"]["stdout"]
+    assert entry["chars"] == len(stdout) and entry["lines"] == 500
+    assert spooled["stdout"].startswith("line 0\n") and spooled["stdout"].endswith("line 499\n")
+    assert f"read_output(handle='{entry['handle']}')" in spooled["stdout"]
+    assert len(spooled["stdout"]) < 1200
+    with open(spool.path(entry["handle"]), encoding="utf-8") as f:
+        assert f.read() == stdout
+
+    assert spool.spool(result)["spooled"] == spooled["spooled"] # Same content, same file
+    assert len(os.listdir(spool.directory)) == 1
+    small = {"status": "success", "content": "short"}
+    assert spool.spool(small) is small
+    assert spool.path("../../etc/passwd") is None
+
+    directory = spool.directory
+    spool.close()
+    assert not os.path.exists(directory)
+
+
+def test_a_kept_spool_survives_the_session(tmp_path):
+    spool = OutputSpool(threshold=10)
+    spool.keep_in(str(tmp_path / "spool" / "abc123"))
+    handle = spool.spool({"content": "x" * 100})["spooled"]["content"]["handle"]
+    spool.close()
+    assert os.path.isfile(tmp_path / "spool" / "abc123" / handle)
+
+
+def test_agent_keeps_a_preview_in_history_and_pages_on_demand(monkeypatch, tmp_path):
+    pytest.importorskip("anthropic")
+    from agent.agent import Agent
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("AGENT_STREAMING", raising=False)
+    text = "".join(f"event {i}\n" for i in range(2000)) # Within what the shell captures
+    target = tmp_path / "big.log"
+    target.write_text(text)
+    monkeypatch.delenv("AGENT_PERSISTENT_SHELL", raising=False)
+    handle = hashlib.sha256(text.encode()).hexdigest()[:12] # Handles are content hashes
+    script = [
+        tool_use_response("toolu_cat", "run_shell_command", {"command": f"cat {target}"}),
+        tool_use_response("toolu_page", "read_output", {"handle": handle, "start_line": 1000, "end_line": 1002}),
+        text_response("Paged."),
+    ]
+    agent = Agent(client=SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: script.pop(0))))
+    agent.spool.threshold = 5000
+    with patch("builtins.input", side_effect=["print the log", "y", "exit"]):
+        agent.run()
+
+    output = json.loads(agent.conversation_history[2]["content"][0]["content"])
+    assert output["spooled"]["stdout"] == {"handle": handle, "chars": len(text), "lines": 2000}
+    assert len(agent.conversation_history[2]["content"][0]["content"]) < 5000
+    page = json.loads(agent.conversation_history[4]["content"][0]["content"])
+    assert page["content"] == "event 999\nevent 1000\nevent 1001\n"
+    assert page["total_lines"] == 2000
+    assert agent.spool.directory is None # Removed when the session ended
@@ -0,0 +1,47 @@
+# Startup regression checks: importing the CLI stays cheap and the client is built off the main thread
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from benchmarks.run_benchmarks import HEAVY_MODULES, import_profile
+
+
+def test_importing_run_py_does_not_load_heavy_modules():
+    profile = import_profile("run")
+
+    assert "agent.agent" in profile["modules"]
+    loaded = sorted(name for name in profile["modules"] if name.split(".")[0] in HEAVY_MODULES)
+    assert loaded == [], f"Imported at startup: {loaded}"
+
+
+def test_client_is_created_in_the_background(monkeypatch):
+    pytest.importorskip("anthropic")
+    from agent.agent import Agent
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    release = threading.Event()
+    created = []
+
+    def slow_create_client(self, api_key):
+        release.wait(5)
+        created.append(api_key)
+        return "client"
+
+    monkeypatch.setattr(Agent, "_create_client", slow_create_client)
+    started = time.monotonic()
+    agent = Agent()
+    assert time.monotonic() - started < 2 # The constructor didn't wait for the client
+    assert agent.tool_schemas and all("input_schema" in schema for schema in agent.tool_schemas)
+    assert agent._tool_schemas() is agent.tool_schemas # Built once, not per request
+
+    release.set()
+    assert agent.client == "client" and created == ["test-key"]
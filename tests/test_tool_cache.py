@@ -0,0 +1,123 @@
+# Tests for the session-level tool result cache
+
+import os
+import sys
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent.tool_cache import ToolResultCache
+
+
+def _store(cache, tool_name, tool_input, result):
+    cache.put(tool_name, tool_input, cache.fingerprint(tool_name, tool_input), result)
+
+
+def _lookup(cache, tool_name, tool_input):
+    return cache.get(tool_name, tool_input, cache.fingerprint(tool_name, tool_input))
+
+
+def test_hit_while_the_file_is_unchanged(tmp_path):
+    target = tmp_path / "a.txt"
+    target.write_text("one")
+    cache = ToolResultCache()
+    result = {"status": "success", "content": "one"}
+    _store(cache, "read_file", {"path": str(target)}, result)
+
+    assert _lookup(cache, "read_file", {"path": str(target)})["result"] is result
+    # The same file through a different spelling of its path
+    assert _lookup(cache, "read_file", {"path": str(tmp_path / "." / "a.txt")})["result"] is result
+    # Different arguments are a different call
+    assert _lookup(cache, "read_file", {"path": str(target), "start_line": 1}) is None
+
+
+def test_a_changed_file_misses(tmp_path):
+    target = tmp_path / "a.txt"
+    target.write_text("one")
+    cache = ToolResultCache()
+    _store(cache, "read_file", {"path": str(target)}, {"status": "success", "content": "one"})
+
+    target.write_text("three")
+
+    assert _lookup(cache, "read_file", {"path": str(target)}) is None
+    assert cache.total_bytes == 0
+
+
+def test_a_replaced_file_misses_even_with_the_same_mtime_and_size(tmp_path):
+    target = tmp_path / "a.txt"
+    target.write_text("one")
+    cache = ToolResultCache()
+    _store(cache, "read_file", {"path": str(target)}, {"status": "success", "content": "one"})
+
+    replacement = tmp_path / "b.txt"
+    replacement.write_text("two")
+    stat_result = os.stat(target)
+    os.utime(replacement, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+    os.replace(replacement, target)
+
+    assert _lookup(cache, "read_file", {"path": str(target)}) is None
+
+
+def test_only_successful_reads_and_flat_listings_are_cached(tmp_path):
+    cache = ToolResultCache()
+    _store(cache, "list_files", {"path": str(tmp_path)}, {"status": "success", "files": []})
+    _store(cache, "list_files", {"path": str(tmp_path), "recursive": True}, {"status": "success", "entries": []})
+    _store(cache, "read_file", {"path": str(tmp_path)}, {"status": "error", "error": "Is a directory"})
+    _store(cache, "search_code", {"query": "x", "path": str(tmp_path)}, {"status": "success", "matches": []})
+
+    assert len(cache.entries) == 1
+    assert _lookup(cache, "list_files", {"path": str(tmp_path)}) is not None
+
+
+def test_lru_is_bounded_by_bytes(tmp_path):
+    paths = []
+    for i in range(3):
+        target = tmp_path / f"{i}.txt"
+        target.write_text("x" * 100)
+        paths.append(str(target))
+    result_size = len('{"status": "success", "content": "' + "x" * 100 + '"}')
+    cache = ToolResultCache(max_bytes=2 * result_size)
+
+    _store(cache, "read_file", {"path": paths[0]}, {"status": "success", "content": "x" * 100})
+    _store(cache, "read_file", {"path": paths[1]}, {"status": "success", "content": "x" * 100})
+    _lookup(cache, "read_file", {"path": paths[0]}) # Now the most recently used
+    _store(cache, "read_file", {"path": paths[2]}, {"status": "success", "content": "x" * 100})
+
+    assert _lookup(cache, "read_file", {"path": paths[0]}) is not None
+    assert _lookup(cache, "read_file", {"path": paths[1]}) is None
+    assert _lookup(cache, "read_file", {"path": paths[2]}) is not None
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_invalidate_drops_the_file_and_its_directory_listing(tmp_path):
+    target = tmp_path / "a.txt"
+    target.write_text("one")
+    other = tmp_path / "sub"
+    other.mkdir()
+    cache = ToolResultCache()
+    _store(cache, "read_file", {"path": str(target)}, {"status": "success", "content": "one"})
+    _store(cache, "list_files", {"path": str(tmp_path)}, {"status": "success", "files": [str(target)]})
+    _store(cache, "list_files", {"path": str(other)}, {"status": "success", "files": []})
+
+    cache.invalidate(str(target))
+
+    assert [key[1] for key in cache.entries] == [str(other.resolve())]
+    cache.invalidate()
+    assert not cache.entries and cache.total_bytes == 0
+
+
+def test_remember_only_tags_the_result_that_was_stored(tmp_path):
+    target = tmp_path / "a.txt"
+    target.write_text("one")
+    cache = ToolResultCache()
+    result = {"status": "success", "content": "one"}
+    _store(cache, "read_file", {"path": str(target)}, result)
+
+    cache.remember("read_file", {"path": str(target)}, "toolu_old", {"status": "success", "content": "stale"}, "{}")
+    assert _lookup(cache, "read_file", {"path": str(target)})["tool_use_id"] is None
+
+    cache.remember("read_file", {"path": str(target)}, "toolu_1", result, '{"content": "one"}')
+    entry = _lookup(cache, "read_file", {"path": str(target)})
+    assert entry["tool_use_id"] == "toolu_1" and entry["content"] == '{"content": "one"}'
@@ -0,0 +1,147 @@
+# Tests for tool discovery, precompiled input validation and tool metadata
+
+import os
+import sys
+import time
+import types
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent import tool_registry
+from agent.scheduler import READ_ONLY, INTERACTIVE
+from agent.tools import edit_file
+
+
+def _tool_module(name, execute, parameters=None, metadata=None):
+    module = types.ModuleType(name)
+    module.get_tool_schema = lambda: {"name": name.rsplit(".", 1)[-1], "description": "A test tool.",
+                                      "parameters": parameters or {"type": "object", "properties": {}}}
+    module.execute = execute
+    if metadata is not None:
+        module.TOOL_METADATA = metadata
+    return module
+
+
+def test_validator_reports_the_first_problem_precisely():
+    validate = tool_registry.compile_validator(edit_file.get_tool_schema()["parameters"])
+    assert validate({"path": "a.py", "old_str": "x", "new_str": "y"}) is None
+    assert validate({}) == "missing required argument 'path'"
+    assert validate({"path": 3}) == "'path' must be a string, got integer"
+    assert validate({"path": "a.py", "colour": 1}).startswith("unknown argument 'colour' (expected: path,")
+    assert validate({"path": "a.py", "edits": [{"old_str": "x", "new_str": "y"}, {"old_str": "x"}]}) == "'edits[1]' is missing 'new_str'"
+    assert validate({"path": "a.py", "edits": [{"old_str": "x", "new_str": None}]}) == "'edits[0].new_str' must be a string, got null"
+    assert validate("a.py") == "the input must be an object, got string"
+
+
+def test_validator_checks_enums_and_bounds():
+    validate = tool_registry.compile_validator({
+        "properties": {"mode": {"type": "string", "enum": ["fast", "full"]}, "depth": {"type": "integer", "minimum": 1}},
+        "additionalProperties": True,
+    })
+    assert validate({"mode": "full", "depth": 2, "extra": True}) is None
+    assert validate({"mode": "slow"}) == "'mode' must be one of 'fast', 'full', got 'slow'"
+    assert validate({"depth": 0}) == "'depth' must be at least 1, got 0"
+    assert validate({"depth": True}) == "'depth' must be an integer, got boolean"
+
+
+def test_specs_are_built_once_and_carry_metadata():
+    calls = []
+    module = _tool_module("registry_test_once", lambda: {"status": "success"}, metadata={"kind": READ_ONLY, "cost": 3})
+    get_tool_schema = module.get_tool_schema
+    module.get_tool_schema = lambda: calls.append(1) or get_tool_schema()
+
+    spec = tool_registry.load_tool(module)
+    assert tool_registry.load_tool(module) is spec and calls == [1]
+    assert spec["kind"] == READ_ONLY and spec["cost"] == 3 and spec["timeout"] is None
+    assert "input_schema" in spec["api_schema"] and "parameters" not in spec["api_schema"]
+
+    undeclared = tool_registry.load_tool(_tool_module("registry_test_undeclared", lambda: {}))
+    assert undeclared["kind"] == INTERACTIVE # Could do anything, so it runs alone
+
+    with pytest.raises(ValueError):
+        tool_registry.load_tool(_tool_module("registry_test_bad_kind", lambda: {}, metadata={"kind": "sometimes"}))
+
+
+def test_configured_tool_modules_are_loaded_and_broken_ones_skipped(monkeypatch, tmp_path, capsys):
+    (tmp_path / "registry_plugin_tool.py").write_text(
+        "TOOL_METADATA = {'kind': 'read_only'}\n"
+        "def get_tool_schema():\n"
+        "    return {'name': 'shout', 'description': 'Upper-case text.',\n"
+        "            'parameters': {'type': 'object', 'properties': {'text': {'type': 'string'}}, 'required': ['text']}}\n"
+        "def execute(text):\n"
+        "    return {'status': 'success', 'text': text.upper()}\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setenv("AGENT_TOOL_MODULES", "registry_plugin_tool, registry_missing_tool")
+
+    names = [spec["name"] for spec in tool_registry.discover_tools()]
+    assert names == list(tool_registry.BUILTIN_TOOLS) + ["shout"]
+    assert "Skipping tool module 'registry_missing_tool'" in capsys.readouterr().err
+
+
+def test_entry_point_tools_are_loaded(monkeypatch):
+    module = _tool_module("registry_test_entry_point", lambda: {"status": "success"})
+    monkeypatch.setattr(tool_registry, "_entry_points", lambda: [SimpleNamespace(name="entry", load=lambda: module)])
+    assert [spec["name"] for spec in tool_registry.entry_point_tools()] == ["registry_test_entry_point"]
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    pytest.importorskip("anthropic")
+    from agent.agent import Agent
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    return Agent(client=SimpleNamespace())
+
+
+def test_agent_rejects_invalid_input_without_running_the_tool(agent, tmp_path):
+    calls = []
+    agent.tools["read_file"]["execute"] = lambda **kwargs: calls.append(kwargs)
+
+    result = agent._run_tool("read_file", {"path": str(tmp_path / "a.txt"), "lines": 3})
+    assert result["status"] == "error"
+    assert result["error"].startswith("Invalid input for read_file: unknown argument 'lines' (expected: path, start_line,")
+    assert agent._run_tool("read_file", {})["error"] == "Invalid input for read_file: missing required argument 'path'"
+    assert calls == []
+
+
+def test_agent_adds_installed_tools_before_the_first_request(agent, monkeypatch):
+    future = Future()
+    future.set_result([tool_registry.load_tool(_tool_module("registry_test_installed", lambda: {"status": "success"}))])
+    agent._plugin_tools = future
+
+    names = [schema["name"] for schema in agent._tool_schemas()]
+    assert names[-1] == "registry_test_installed" and "registry_test_installed" in agent.tools
+    assert agent._tool_schemas() is agent.tool_schemas
+
+
+def test_declared_timeout_abandons_a_slow_tool(agent):
+    spec = tool_registry.load_tool(_tool_module("registry_test_slow", lambda: time.sleep(2) or {"status": "success"},
+                                                metadata={"kind": READ_ONLY, "timeout": 0.05}))
+    agent._add_tool(spec)
+    started = time.monotonic()
+    result = agent._run_tool("registry_test_slow", {})
+    assert time.monotonic() - started < 1
+    assert result == {"status": "error", "error": "Tool 'registry_test_slow' did not finish within 0.05 seconds."}
+
+
+def test_batches_are_submitted_costliest_first(agent, monkeypatch):
+    submitted = []
+
+    def submit(fn, tool_call):
+        submitted.append(tool_call['id'])
+        future = Future()
+        future.set_result(tool_call['id'])
+        return future
+
+    monkeypatch.setattr(agent.scheduler, "submit", submit)
+    tool_calls = [{"id": "read", "name": "read_file", "input": {}}, {"id": "search", "name": "search_code", "input": {}},
+                  {"id": "list", "name": "list_files", "input": {}}]
+    futures = agent._submit_batch(tool_calls, {})
+    assert submitted == ["search", "list", "read"]
+    assert [future.result() for future in futures] == ["read", "search", "list"]
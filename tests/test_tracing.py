@@ -0,0 +1,86 @@
+# Tests for spans, trace export and the session summary
+
+import os
+import sys
+import json
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent.tracing import Tracer
+
+
+def test_child_spans_share_the_trace_of_their_parent():
+    tracer = Tracer(enabled=True)
+    with tracer.span("turn") as turn:
+        with tracer.span("tool:read_file", parent=turn, tool="read_file") as tool:
+            tool.set(result_bytes=10)
+
+    assert tool.trace_id == turn.trace_id and tool.parent_id == turn.span_id
+    assert turn.parent_id is None
+    assert turn.duration >= tool.duration >= 0
+
+
+def test_errors_are_recorded_and_re_raised():
+    tracer = Tracer(enabled=True)
+    with pytest.raises(RuntimeError):
+        with tracer.span("model_call") as span:
+            raise RuntimeError("overloaded")
+
+    assert span.error == "RuntimeError: overloaded"
+    assert tracer.summary()["model_call"]["errors"] == 1
+
+
+def test_summary_aggregates_durations_and_counters():
+    tracer = Tracer(enabled=True)
+    for tokens in (100, 250):
+        with tracer.span("model_call") as span:
+            span.set(input_tokens=tokens, output_tokens=10, stop_reason="end_turn")
+
+    summary = tracer.summary()["model_call"]
+    assert summary["count"] == 2
+    assert summary["input_tokens"] == 350 and summary["output_tokens"] == 20
+    assert summary["max_seconds"] >= summary["p50_seconds"] >= 0
+    assert "model_call: 2 ×" in tracer.format_summary()
+
+
+def test_jsonl_export(tmp_path):
+    trace_file = tmp_path / "trace.jsonl"
+    tracer = Tracer(path=str(trace_file))
+    assert tracer.enabled
+    with tracer.span("turn", session="abc") as turn:
+        with tracer.span("model_call", parent=turn):
+            pass
+    tracer.close()
+
+    records = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert [record["name"] for record in records] == ["model_call", "turn"]
+    assert records[0]["parent_id"] == records[1]["span_id"]
+    assert records[1]["attributes"] == {"session": "abc"}
+    assert records[1]["duration_ms"] >= records[0]["duration_ms"]
+
+
+def test_otlp_export(tmp_path):
+    trace_file = tmp_path / "trace.otlp.jsonl"
+    tracer = Tracer(path=str(trace_file), fmt="otlp")
+    with tracer.span("tool:edit_file", tool="edit_file", result_bytes=42, streaming=False):
+        pass
+    tracer.close()
+
+    request = json.loads(trace_file.read_text())
+    span = request["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "tool:edit_file"
+    assert len(span["traceId"]) == 32 and len(span["spanId"]) == 16
+    assert int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"])
+    assert {"key": "result_bytes", "value": {"intValue": "42"}} in span["attributes"]
+    assert {"key": "streaming", "value": {"boolValue": False}} in span["attributes"]
+    assert span["status"] == {"code": 1}
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        Tracer(fmt="xml")
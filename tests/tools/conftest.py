@@ -0,0 +1,20 @@
+# Fixtures shared by the tool tests
+
+import os
+import sys
+
+import pytest
+
+# Ensure the agent package can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent import search_index
+
+
+@pytest.fixture
+def isolated_index_dir(tmp_path, monkeypatch):
+    """Search indexes in a temporary directory, with none cached from an earlier test."""
+    monkeypatch.setenv("AGENT_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(search_index, "_indexes", {})
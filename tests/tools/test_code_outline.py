@@ -0,0 +1,107 @@
+# Tests for the code_outline tool and its cached parsers
+
+import os
+
+import pytest
+
+# Ensure the agent tools can be imported
+import sys
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+# ...and the helpers shared with the other tests
+tests_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if tests_dir not in sys.path:
+    sys.path.insert(0, tests_dir)
+
+from agent.tools import code_outline
+from agent import outline
+from fakes import write_file
+
+@pytest.fixture(autouse=True)
+def empty_outline_cache(monkeypatch):
+    monkeypatch.setattr(outline, "_outline_cache", outline.OrderedDict())
+
+PYTHON_SOURCE = '''import os
+
+class Cache(dict):
+    """Docstring."""
+
+    @property
+    def size(self) -> int:
+        def helper():
+            pass
+        return len(self)
+
+    async def load(self, key, *, timeout: float = 1.0):
+        return None
+
+def main(argv=None):
+    pass
+'''
+
+def test_python_outline_has_signatures_and_line_spans(tmp_path):
+    path = write_file(str(tmp_path), "cache.py", PYTHON_SOURCE)
+    result = code_outline.execute(path=path)
+    assert result == {"status": "success", "outline": (
+        "class Cache(dict)  [3-13]\n"
+        "    def size(self) -> int  [6-10]\n"
+        "    async def load(self, key, *, timeout: float=1.0)  [12-13]\n"
+        "def main(argv=None)  [15-16]")}
+
+def test_python_outline_without_ast_unparse_uses_declaration_lines(tmp_path, monkeypatch):
+    monkeypatch.delattr(outline.ast, "unparse", raising=False) # As on Python 3.8
+    path = write_file(str(tmp_path), "cache.py", PYTHON_SOURCE)
+    assert code_outline.execute(path=path)["outline"] == (
+        "class Cache(dict)  [3-13]\n"
+        "    def size(self) -> int  [6-10]\n"
+        "    async def load(self, key, *, timeout: float = 1.0)  [12-13]\n"
+        "def main(argv=None)  [15-16]")
+
+def test_unparsable_python_is_outlined_line_by_line(tmp_path):
+    path = write_file(str(tmp_path), "legacy.py", PYTHON_SOURCE + "\nprint 'python 2'\n")
+    assert code_outline.execute(path=path)["outline"] == (
+        "class Cache(dict)  [3-13]\n"
+        "    def size(self) -> int  [6-10]\n"
+        "    async def load(self, key, *, timeout: float = 1.0)  [12-13]\n"
+        "def main(argv=None)  [15-16]")
+
+def test_brace_languages_span_to_the_closing_brace(tmp_path):
+    path = write_file(str(tmp_path), "store.ts", (
+        "export class Store {\n"
+        "  load(id: number): string {\n"
+        "    const s = \"}\"; // }\n"
+        "    return s;\n"
+        "  }\n"
+        "}\n"
+        "\n"
+        "export const add = (a, b) => {\n"
+        "  return a + b;\n"
+        "};\n"))
+    assert code_outline.execute(path=path)["outline"] == (
+        "export class Store  [1-6]\n"
+        "    load(id: number): string  [2-5]\n"
+        "export const add = (a, b) =>  [8-10]")
+
+def test_directories_are_outlined_from_the_cache(tmp_path, monkeypatch):
+    workspace = str(tmp_path)
+    good = write_file(workspace, "pkg/good.py", "def ok():\n    pass\n")
+    broken = write_file(workspace, "pkg/broken.py", "def broken():\n    print 'python 2'\n")
+    write_file(workspace, "notes.txt", "def not_code():\n")
+    write_file(workspace, "pkg/empty.py", "x = 1\n")
+
+    result = code_outline.execute(path=workspace)
+    assert result["files"] == [{"path": broken, "outline": "def broken()  [1-2]"},
+                               {"path": good, "outline": "def ok()  [1-2]"}]
+    assert not result["truncated"]
+    assert code_outline.execute(path=workspace, max_files=1)["truncated"]
+
+    monkeypatch.setattr(outline, "parse_file", lambda path: pytest.fail(f"{path} was parsed again"))
+    assert code_outline.execute(path=workspace)["files"] == result["files"]
+    assert code_outline.execute(path=os.path.join(workspace, "notes.txt"))["status"] == "error"
+
+def test_many_files_are_parsed_in_a_process_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(outline, "PARALLEL_MIN_FILES", 2)
+    paths = [write_file(str(tmp_path), f"m{i}.py", f"def f{i}():\n    pass\n") for i in range(3)]
+    assert outline.outlines(paths) == [[{"kind": "function", "name": f"f{i}", "signature": f"def f{i}()",
+                                         "start_line": 1, "end_line": 2, "children": []}] for i in range(3)]
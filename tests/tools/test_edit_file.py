@@ -54,7 +54,7 @@ def test_creating_a_new_file_with_empty_old_str():
         if os.path.exists(file_path):
             os.remove(file_path)
 
-def test_editing_non_existent_file_creates_it_with_no_change_if_old_str_not_empty():
+def test_editing_non_existent_file_with_non_empty_old_str_is_an_error():
     tf_descriptor, file_path = tempfile.mkstemp(suffix=".txt")
     os.close(tf_descriptor)
     os.remove(file_path)
@@ -62,14 +62,10 @@ def test_editing_non_existent_file_creates_it_with_no_change_if_old_str_not_empt
     assert not os.path.exists(file_path), f"File {file_path} should not exist before test"
 
     try:
-        # If old_str is non-empty and file is new, content is "". 
-        # "".replace("abc", "def", 1) is "". This matches Ruby `"".sub("abc", "def")`.
         result = edit_file.execute(path=file_path, old_str="should_not_be_found", new_str="new text")
-        assert result.get("status") == "success"
-        
-        with open(file_path, 'r') as f_check:
-            content = f_check.read()
-        assert content == "" # old_str was not found in the (newly created) empty file
+        assert result.get("status") == "error"
+        assert "No such file" in result.get("error")
+        assert not os.path.exists(file_path) # Nothing is created
     finally:
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -83,7 +79,8 @@ def test_old_str_not_found_in_existing_file():
         tmp_file.close()
         
         result = edit_file.execute(path=file_path, old_str="non_existent_string", new_str="replacement")
-        assert result.get("status") == "success"
+        assert result.get("status") == "error"
+        assert "not found" in result.get("error")
         
         with open(file_path, 'r') as f_check:
             content = f_check.read()
@@ -135,4 +132,76 @@ def test_tool_returns_error_on_exception():
         assert result.get("status") == "error"
         error_msg = result.get("error", "").lower()
         # Check for common phrases in "Is a directory" errors or permission errors across platforms
-        assert "is a directory" in error_msg or "permission denied" in error_msg or "access is denied" in error_msg 
\ No newline at end of file
+        assert "is a directory" in error_msg or "permission denied" in error_msg or "access is denied" in error_msg 
+
+def test_ambiguous_old_str_is_rejected():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "dup.txt")
+        with open(file_path, "w") as f:
+            f.write("x = 1\nx = 1\n")
+
+        result = edit_file.execute(path=file_path, old_str="x = 1", new_str="x = 2")
+
+        assert result.get("status") == "error"
+        assert "matches 2 places" in result.get("error")
+        with open(file_path) as f_check:
+            assert f_check.read() == "x = 1\nx = 1\n"
+
+def test_batch_of_edits_is_applied_in_order():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "batch.py")
+        with open(file_path, "w") as f:
+            f.write("def a():\n    return 1\n\ndef b():\n    return 2\n")
+
+        result = edit_file.execute(path=file_path, edits=[
+            {"old_str": "return 1", "new_str": "return 10"},
+            {"old_str": "def b():\n    return 2", "new_str": "def b():\n    return 20"},
+            {"old_str": "return 10", "new_str": "return 100"}, # Sees the result of the first edit
+        ])
+
+        assert result.get("status") == "success"
+        assert result.get("edits_applied") == 3
+        with open(file_path) as f_check:
+            assert f_check.read() == "def a():\n    return 100\n\ndef b():\n    return 20\n"
+
+def test_failing_edit_in_batch_writes_nothing():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "batch.txt")
+        with open(file_path, "w") as f:
+            f.write("alpha beta")
+
+        result = edit_file.execute(path=file_path, edits=[
+            {"old_str": "alpha", "new_str": "ALPHA"},
+            {"old_str": "gamma", "new_str": "GAMMA"},
+        ])
+
+        assert result.get("status") == "error"
+        assert result.get("error").startswith("Edit 2:")
+        with open(file_path) as f_check:
+            assert f_check.read() == "alpha beta"
+
+def test_atomic_write_keeps_permissions_and_leaves_no_temp_files():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "script.sh")
+        with open(file_path, "w") as f:
+            f.write("echo old\n")
+        os.chmod(file_path, 0o755)
+
+        result = edit_file.execute(path=file_path, old_str="old", new_str="new")
+
+        assert result.get("status") == "success"
+        assert os.stat(file_path).st_mode & 0o777 == 0o755
+        assert os.listdir(tmp_dir) == ["script.sh"]
+
+
+def test_result_includes_the_diff_of_the_change():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "big.py")
+        with open(file_path, "w") as f:
+            f.write("".join(f"x_{i} = {i}\n" for i in range(3000)))
+
+        result = edit_file.execute(path=file_path, old_str="x_1500 = 1500\n", new_str="x_1500 = 'changed'\n")
+
+        assert result.get("status") == "success"
+        assert "-x_1500 = 1500\n+x_1500 = 'changed'" in result.get("diff")
+        assert result.get("diff").count("\n") < 12
@@ -0,0 +1,62 @@
+# Tests for the find_relevant_code tool and its BM25 chunk index
+
+import os
+import time
+
+import pytest
+
+# Ensure the agent tools can be imported
+import sys
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+# ...and the helpers shared with the other tests
+tests_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if tests_dir not in sys.path:
+    sys.path.insert(0, tests_dir)
+
+from agent.tools import find_relevant_code
+from agent.relevance_index import RelevanceIndex, chunk_lines, terms
+from fakes import write_file
+
+pytestmark = pytest.mark.usefixtures("isolated_index_dir")
+
+def test_identifiers_are_split_into_words():
+    assert terms("class FileViewTracker: parse_HTTPResponse(x)") == [
+        "class", "fileviewtracker", "file", "view", "tracker", "parse_httpresponse", "parse", "http", "response"]
+
+def test_chunks_break_before_top_level_definitions():
+    lines = ["import os", ""] + ["x = 1"] * 12 + ["", "def f():", "    return 1"] + ["y = 2"] * 50
+    assert list(chunk_lines(lines)) == [(0, 15), (15, 55), (55, 67)]
+
+def test_best_matching_chunks_come_first(tmp_path):
+    workspace = str(tmp_path / "repo")
+    write_file(workspace, "agent/retry.py", "def backoff_delay(attempt):\n    return min(60, 2 ** attempt)\n\n"
+                                        "def send_with_retries(request):\n    for attempt in range(3):\n        pass\n")
+    write_file(workspace, "agent/render.py", "def render_markdown(text):\n    return text\n")
+    write_file(workspace, "docs/notes.md", "Retries happen after a delay.\n")
+
+    result = find_relevant_code.execute(query="retry backoff delay", path=workspace, max_results=2)
+
+    assert result["status"] == "success"
+    assert [os.path.relpath(hit["path"], workspace) for hit in result["results"]] == ["agent/retry.py", "docs/notes.md"]
+    best = result["results"][0]
+    assert (best["start_line"], best["end_line"]) == (1, 6)
+    assert best["snippet"].startswith("def backoff_delay(attempt):")
+    assert find_relevant_code.execute(query="?!", path=workspace)["status"] == "error"
+
+def test_index_follows_changed_and_removed_files(tmp_path):
+    workspace = str(tmp_path / "repo")
+    old_file = write_file(workspace, "a.py", "def parse_config():\n    pass\n")
+    write_file(workspace, "b.py", "def unrelated():\n    pass\n")
+    index = RelevanceIndex(workspace)
+    assert index.update() == {"indexed": 2, "removed": 0}
+    assert [hit["path"] for hit in index.query("config parser")["results"]] == [old_file]
+
+    os.remove(old_file)
+    time.sleep(0.01)
+    new_file = write_file(workspace, "b.py", "class ConfigParser:\n    pass\n")
+    assert index.update() == {"indexed": 1, "removed": 1}
+    assert [hit["path"] for hit in index.query("config parser")["results"]] == [new_file]
+    assert index.db.execute("SELECT COUNT(*) FROM terms WHERE term = 'unrelated'").fetchone()[0] == 0
+    index.close()
@@ -71,4 +71,74 @@ def test_list_files_non_existent_path():
 
     result = list_files.execute(path=non_existent_path)
     assert result.get("status") == "success" 
-    assert result.get("files", []) == [] 
\ No newline at end of file
+    assert result.get("files", []) == [] 
+
+def _make_tree(root):
+    os.makedirs(os.path.join(root, "src", "pkg"))
+    os.makedirs(os.path.join(root, "node_modules", "dep"))
+    os.makedirs(os.path.join(root, ".git"))
+    os.makedirs(os.path.join(root, "build"))
+    files = {
+        ".gitignore": "build/\n*.log\n!keep.log\n",
+        "README.md": "readme",
+        "debug.log": "ignored",
+        "keep.log": "kept",
+        os.path.join("src", "main.py"): "print('hi')\n",
+        os.path.join("src", "pkg", "mod.py"): "x = 1\n",
+        os.path.join("src", "pkg", ".gitignore"): "generated_*\n",
+        os.path.join("src", "pkg", "generated_table.py"): "ignored",
+        os.path.join("node_modules", "dep", "index.js"): "ignored",
+        os.path.join("build", "out.bin"): "ignored",
+    }
+    for relative_path, content in files.items():
+        with open(os.path.join(root, relative_path), "w") as f:
+            f.write(content)
+
+def test_recursive_listing_prunes_ignored_entries_and_reports_sizes():
+    with tempfile.TemporaryDirectory() as tmp_root_dir:
+        _make_tree(tmp_root_dir)
+
+        result = list_files.execute(path=tmp_root_dir, recursive=True)
+
+        assert result.get("status") == "success"
+        assert result.get("truncated") is False
+        entries = {os.path.relpath(entry["path"], tmp_root_dir) + ("/" if entry["type"] == "dir" else ""): entry for entry in result["entries"]}
+        assert sorted(entries) == sorted(["README.md", "keep.log", "src/", "src/main.py", "src/pkg/", "src/pkg/mod.py"])
+        assert entries["README.md"]["size"] == len("readme")
+        assert entries["src/"]["type"] == "dir"
+
+def test_recursive_listing_respects_depth_and_entry_limits():
+    with tempfile.TemporaryDirectory() as tmp_root_dir:
+        _make_tree(tmp_root_dir)
+
+        shallow = list_files.execute(path=tmp_root_dir, recursive=True, max_depth=1)
+        assert sorted(os.path.relpath(entry["path"], tmp_root_dir) for entry in shallow["entries"]) == ["README.md", "keep.log", "src"]
+
+        limited = list_files.execute(path=tmp_root_dir, recursive=True, max_entries=2)
+        assert len(limited["entries"]) == 2
+        assert limited["truncated"] is True
+
+def test_listing_index_picks_up_changes():
+    with tempfile.TemporaryDirectory() as tmp_root_dir:
+        with open(os.path.join(tmp_root_dir, "a.txt"), "w") as f:
+            f.write("a")
+        assert list_files.execute(path=tmp_root_dir)["files"] == [os.path.join(tmp_root_dir, "a.txt")]
+
+        with open(os.path.join(tmp_root_dir, "b.txt"), "w") as f:
+            f.write("b")
+        list_files.invalidate(tmp_root_dir) # Same-tick mtimes are possible on coarse file systems
+        assert list_files.execute(path=tmp_root_dir)["files"] == [os.path.join(tmp_root_dir, "a.txt"), os.path.join(tmp_root_dir, "b.txt")]
+
+def test_recursive_listing_reports_sizes_of_files_rewritten_in_place():
+    with tempfile.TemporaryDirectory() as tmp_root_dir:
+        os.makedirs(os.path.join(tmp_root_dir, "sub"))
+        file_path = os.path.join(tmp_root_dir, "sub", "f.txt")
+        with open(file_path, "w") as f:
+            f.write("ab")
+        assert list_files.execute(path=tmp_root_dir, recursive=True)["entries"][1]["size"] == 2
+
+        directory_mtime = os.stat(os.path.join(tmp_root_dir, "sub")).st_mtime_ns
+        with open(file_path, "a") as f:
+            f.write("x" * 15)
+        assert os.stat(os.path.join(tmp_root_dir, "sub")).st_mtime_ns == directory_mtime
+        assert list_files.execute(path=tmp_root_dir, recursive=True)["entries"][1]["size"] == 17
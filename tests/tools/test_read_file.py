@@ -43,4 +43,116 @@ def test_read_directory_returns_error():
     with tempfile.TemporaryDirectory() as tmp_dir_path:
         result = read_file.execute(path=tmp_dir_path)
         assert result.get("status") == "error"
-        assert f"Path is a directory, not a file: '{tmp_dir_path}'" == result.get("error") 
\ No newline at end of file
+        assert f"Path is a directory, not a file: '{tmp_dir_path}'" == result.get("error") 
+
+def _write_lines(directory, count, name="lines.txt"):
+    file_path = os.path.join(directory, name)
+    with open(file_path, "w", encoding="utf-8") as f:
+        for i in range(1, count + 1):
+            f.write(f"line {i}\n")
+    return file_path
+
+def test_read_line_range():
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        file_path = _write_lines(tmp_dir_path, 100)
+
+        result = read_file.execute(path=file_path, start_line=10, end_line=12)
+
+        assert result.get("status") == "success"
+        assert result.get("content") == "line 10\nline 11\nline 12\n"
+        assert result.get("total_lines") == 100
+        assert result.get("truncated") is False
+
+def test_large_file_is_truncated_with_marker_and_line_count(monkeypatch):
+    monkeypatch.setattr(read_file, "MAX_BYTES", 50)
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        file_path = _write_lines(tmp_dir_path, 1000)
+
+        result = read_file.execute(path=file_path)
+
+        assert result.get("status") == "success"
+        assert result.get("truncated") is True
+        assert result.get("total_lines") == 1000
+        assert result.get("content").startswith("line 1\nline 2\n")
+        assert f"showing lines 1-{result.get('end_line')} of 1000" in result.get("content")
+        # Only whole lines that fit under the cap are returned
+        shown = result.get("content").split("\n[... truncated")[0]
+        assert len(shown.encode("utf-8")) <= 50
+        assert shown.endswith("\n")
+
+def test_line_index_is_rebuilt_when_file_changes():
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        file_path = _write_lines(tmp_dir_path, 10)
+        assert read_file.execute(path=file_path, start_line=10).get("content") == "line 10\n"
+
+        _write_lines(tmp_dir_path, 20)
+        result = read_file.execute(path=file_path, start_line=20)
+        assert result.get("content") == "line 20\n"
+        assert result.get("total_lines") == 20
+
+def test_line_ranges_are_found_from_sparse_checkpoints(monkeypatch):
+    monkeypatch.setattr(read_file, "LINE_CHECKPOINT_EVERY", 8)
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        file_path = _write_lines(tmp_dir_path, 100, name="sparse.txt")
+
+        for first, last in [(1, 1), (8, 9), (9, 17), (50, 64), (97, 100), (99, None)]:
+            result = read_file.execute(path=file_path, start_line=first, end_line=last)
+            expected = "".join(f"line {i}\n" for i in range(first, (last or 100) + 1))
+            assert result.get("content") == expected, (first, last)
+
+        checkpoints, total_lines = read_file._line_index_cache[os.path.realpath(file_path)][2:]
+        assert total_lines == 100
+        assert len(checkpoints) == 13 # Lines 1, 9, 17, ..., 97
+
+def test_whole_file_reads_build_no_line_index(monkeypatch):
+    monkeypatch.setattr(read_file, "MAX_BYTES", 50)
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        file_path = _write_lines(tmp_dir_path, 1000, name="unindexed.txt")
+
+        assert read_file.execute(path=file_path).get("total_lines") == 1000
+        assert os.path.realpath(file_path) not in read_file._line_index_cache
+
+def test_end_line_zero_is_an_error():
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        file_path = _write_lines(tmp_dir_path, 10)
+
+        result = read_file.execute(path=file_path, end_line=0)
+
+        assert result.get("status") == "error"
+        assert "end_line" in result.get("error")
+
+def test_line_index_cache_is_capped_in_bytes(monkeypatch):
+    monkeypatch.setattr(read_file, "LINE_CHECKPOINT_EVERY", 1)
+    monkeypatch.setattr(read_file, "LINE_INDEX_CACHE_BYTES", 8 * 150)
+    monkeypatch.setattr(read_file, "_line_index_cache", read_file.OrderedDict())
+    monkeypatch.setattr(read_file, "_line_index_bytes", 0)
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        paths = [_write_lines(tmp_dir_path, 100, name=f"file_{i}.txt") for i in range(3)]
+        for path in paths:
+            assert read_file.execute(path=path, start_line=50, end_line=50).get("content") == "line 50\n"
+
+        assert list(read_file._line_index_cache) == [os.path.realpath(paths[2])]
+        assert read_file._line_index_bytes == 8 * 100
+
+def test_read_byte_range():
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        file_path = os.path.join(tmp_dir_path, "bundle.min.js")
+        with open(file_path, "w") as f:
+            f.write("abcdefghijklmnopqrstuvwxyz")
+
+        result = read_file.execute(path=file_path, byte_offset=5, byte_length=3)
+
+        assert result.get("status") == "success"
+        assert result.get("content") == "fgh"
+        assert result.get("total_bytes") == 26
+
+def test_binary_file_is_refused():
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        file_path = os.path.join(tmp_dir_path, "image.bin")
+        with open(file_path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR")
+
+        result = read_file.execute(path=file_path)
+
+        assert result.get("status") == "error"
+        assert "binary" in result.get("error")
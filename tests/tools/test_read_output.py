@@ -0,0 +1,33 @@
+# Tests for the read_output tool: paging through spooled tool output
+
+import os
+import sys
+
+# Ensure the agent tools can be imported
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+
+from agent.spool import OutputSpool
+from agent.tools import read_output
+
+
+def test_pages_are_capped_at_the_spool_threshold(tmp_path):
+    spool = OutputSpool(str(tmp_path), threshold=100)
+    text = "".join(f"{i:04d}\n" for i in range(200))
+    handle = spool.spool({"stdout": text})["spooled"]["stdout"]["handle"]
+
+    page = read_output.execute(handle, start_line=11, spool=spool)
+    assert page["status"] == "success" and page["truncated"]
+    assert page["content"].startswith("0010\n0011\n")
+    assert (page["start_line"], page["end_line"], page["total_lines"]) == (11, 30, 200)
+
+    assert read_output.execute(handle, start_line=500, spool=spool)["error"] == \
+        f"start_line 500 is past the end of the file (200 lines) (handle '{handle}')"
+
+
+def test_unknown_handles_are_rejected(tmp_path):
+    spool = OutputSpool(str(tmp_path))
+    assert read_output.execute("0123456789ab", spool=spool) == {
+        "status": "error", "error": "No spooled output with handle '0123456789ab' in this session."}
+    assert read_output.execute("0123456789ab")["status"] == "error"
@@ -2,6 +2,8 @@
 
 import os
 import sys
+import time
+import tempfile
 import unittest
 from unittest.mock import patch
 
@@ -43,17 +45,59 @@ class TestRunShellCommand(unittest.TestCase):
         self.assertTrue(len(result.get("stderr", "")) > 0 or len(result.get("error", "")) > 0)
 
     @patch('builtins.input', return_value='y')
-    @patch('agent.tools.run_shell_command.subprocess.run')
-    def test_subprocess_exception_returns_error(self, mock_subprocess_run, mock_input):
-        mock_subprocess_run.side_effect = Exception("Subprocess boom!")
+    @patch('agent.tools.run_shell_command.subprocess.Popen')
+    def test_subprocess_exception_returns_error(self, mock_subprocess_popen, mock_input):
+        mock_subprocess_popen.side_effect = Exception("Subprocess boom!")
         command_to_run = "echo this_will_be_mocked"
         
         result = run_shell_command.execute(command=command_to_run)
         
         mock_input.assert_called_once()
-        mock_subprocess_run.assert_called_once()
+        mock_subprocess_popen.assert_called_once()
         self.assertEqual(result.get("status"), "error")
         self.assertEqual(result.get("error"), "Subprocess boom!")
 
+    @patch('builtins.input', return_value='y')
+    def test_result_reports_exit_code_and_duration(self, mock_input):
+        result = run_shell_command.execute(command="echo out; echo err 1>&2; exit 3")
+
+        self.assertEqual(result.get("status"), "error")
+        self.assertEqual(result.get("exit_code"), 3)
+        self.assertEqual(result.get("stdout"), "out\n")
+        self.assertEqual(result.get("stderr"), "err\n")
+        self.assertGreaterEqual(result.get("duration_seconds"), 0)
+
+    @unittest.skipUnless(os.name == "posix", "process groups are POSIX-only")
+    @patch('builtins.input', return_value='y')
+    def test_timeout_kills_the_whole_process_group(self, mock_input):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            marker = os.path.join(tmp_dir, "survived")
+            # The background child would create the marker if it outlived the timeout
+            command = f"(sleep 2; touch {marker}) & sleep 30"
+
+            result = run_shell_command.execute(command=command, timeout=0.5)
+
+            self.assertEqual(result.get("status"), "error")
+            self.assertTrue(result.get("timed_out"))
+            self.assertIn("timed out", result.get("error"))
+            self.assertLess(result.get("duration_seconds"), 10)
+            time.sleep(2.5)
+            self.assertFalse(os.path.exists(marker))
+
+    @patch('builtins.input', return_value='y')
+    @patch('agent.tools.run_shell_command.CAPTURE_HEAD_BYTES', 100)
+    @patch('agent.tools.run_shell_command.CAPTURE_TAIL_BYTES', 100)
+    def test_large_output_keeps_head_and_tail(self, mock_input):
+        command = f"{sys.executable} -c \"print('START'); print('x' * 100000); print('END')\""
+
+        result = run_shell_command.execute(command=command)
+
+        self.assertEqual(result.get("status"), "success")
+        stdout = result.get("stdout")
+        self.assertTrue(stdout.startswith("START"))
+        self.assertTrue(stdout.rstrip().endswith("END"))
+        self.assertIn("bytes dropped", stdout)
+        self.assertEqual(result.get("stdout_dropped_bytes"), len("START\n") + 100001 + len("END\n") - 200)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,100 @@
+# Tests for the search_code tool and its trigram index
+
+import os
+import time
+import tempfile
+
+import pytest
+
+# Ensure the agent tools can be imported
+import sys
+project_root_for_tests = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root_for_tests not in sys.path:
+    sys.path.insert(0, project_root_for_tests)
+# ...and the helpers shared with the other tests
+tests_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if tests_dir not in sys.path:
+    sys.path.insert(0, tests_dir)
+
+from agent.tools import search_code
+from agent import search_index
+from fakes import write_file
+
+pytestmark = pytest.mark.usefixtures("isolated_index_dir")
+
+def test_search_returns_matches_with_line_numbers_and_context():
+    with tempfile.TemporaryDirectory() as workspace:
+        write_file(workspace, "src/app.py", "import os\n\ndef handle_request(req):\n    return req\n")
+        write_file(workspace, "src/other.py", "nothing to see\n")
+
+        result = search_code.execute(query="handle_request", path=workspace, context_lines=1)
+
+        assert result.get("status") == "success"
+        assert result.get("candidate_files") == 1 # The trigram index ruled out other.py
+        [match] = result.get("matches")
+        assert match["path"] == os.path.join(workspace, "src/app.py")
+        assert match["line"] == 3
+        assert match["snippet"] == "2- \n3: def handle_request(req):\n4-     return req"
+
+def test_search_is_case_insensitive_by_default_and_supports_regex():
+    with tempfile.TemporaryDirectory() as workspace:
+        write_file(workspace, "notes.txt", "TODO: first\ntodo: second\nfixme\n")
+
+        assert len(search_code.execute(query="todo", path=workspace)["matches"]) == 2
+        assert len(search_code.execute(query="todo", path=workspace, case_sensitive=True)["matches"]) == 1
+        assert [m["line"] for m in search_code.execute(query=r"^(todo|fixme)", path=workspace, regex=True)["matches"]] == [1, 2, 3]
+
+def test_index_picks_up_changed_added_and_removed_files():
+    with tempfile.TemporaryDirectory() as workspace:
+        old_file = write_file(workspace, "a.py", "value = 'needle'\n")
+        assert len(search_code.execute(query="needle", path=workspace)["matches"]) == 1
+
+        os.remove(old_file)
+        write_file(workspace, "b.py", "other = 'needle'\nmore = 'needle'\n")
+        search_index.invalidate()
+        matches = search_code.execute(query="needle", path=workspace)["matches"]
+        assert [(os.path.basename(m["path"]), m["line"]) for m in matches] == [("b.py", 1), ("b.py", 2)]
+
+def test_index_is_persistent_and_incremental():
+    with tempfile.TemporaryDirectory() as workspace:
+        for i in range(5):
+            write_file(workspace, f"file_{i}.py", f"x = {i}\n")
+        index = search_index.SearchIndex(workspace)
+        assert index.update() == {"indexed": 5, "removed": 0}
+        index.close()
+
+        reopened = search_index.SearchIndex(workspace)
+        assert reopened.update() == {"indexed": 0, "removed": 0}
+        time.sleep(0.01)
+        write_file(workspace, "file_0.py", "x = 'changed'\n")
+        assert reopened.update() == {"indexed": 1, "removed": 0}
+        reopened.close()
+
+def test_results_are_capped_and_ignored_files_skipped():
+    with tempfile.TemporaryDirectory() as workspace:
+        write_file(workspace, "many.txt", "match\n" * 20)
+        write_file(workspace, ".gitignore", "ignored/\n")
+        write_file(workspace, "ignored/hidden.txt", "match\n")
+        write_file(workspace, "node_modules/dep/index.js", "match\n")
+
+        result = search_code.execute(query="match", path=workspace, max_results=5)
+
+        assert len(result["matches"]) == 5
+        assert result["truncated"] is True
+        assert {os.path.basename(m["path"]) for m in result["matches"]} == {"many.txt"}
+
+def test_invalid_regex_returns_error():
+    with tempfile.TemporaryDirectory() as workspace:
+        result = search_code.execute(query="(", path=workspace, regex=True)
+        assert result.get("status") == "error"
+        assert "Invalid regular expression" in result.get("error")
+
+def test_file_index_subclasses_must_implement_its_hooks(tmp_path):
+    class Incomplete(search_index.FileIndex):
+        NAME = "incomplete"
+
+        def _create_tables(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete(str(tmp_path))